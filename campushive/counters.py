@@ -0,0 +1,21 @@
+# campushive/counters.py
+"""
+冗余计数字段 (Course.enrollment_count、Class.student_count、Department.employee_count 等) 的原子增减，
+供各应用的信号和批量导入命令共用。
+"""
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+
+def adjust_count(model, pk, field, delta):
+    """在数据库中原子地增减一个计数字段 (UPDATE ... SET field = field + delta)，不会减到负数。"""
+    if pk is None or not delta:
+        return
+    model.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def move_count(model, field, old_pk, new_pk):
+    """对象从 old_pk 挪到 new_pk (任一可为 None) 时调整两边的计数。"""
+    if old_pk != new_pk:
+        adjust_count(model, old_pk, field, -1)
+        adjust_count(model, new_pk, field, 1)
@@ -0,0 +1,106 @@
+# campushive/reference_data.py
+"""
+跨请求共享的参考数据 (筛选表单的下拉选项等) 缓存，以及配套的筛选器和部件：
+    - ReferenceList：缓存一份 (pk, label) 列表，对应模型增删改后失效；
+    - CachedModelChoiceFilter：下拉选项取自 ReferenceList，渲染表单不再查询数据库；
+    - RemoteSelect：只渲染已选中的选项，其余选项在输入时从 JSON 接口按需加载 (例如教师很多的授课教师筛选)。
+各应用在自己的 reference_data 模块中定义具体的 ReferenceList (例如 users.reference_data.DEPARTMENT_CHOICES)。
+"""
+from django import forms
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+import django_filters
+from django_filters.fields import ModelChoiceField
+
+REFERENCE_TIMEOUT = 600 # 秒
+
+
+class ReferenceList:
+    """
+    一份缓存的 (pk, label) 列表，保存在 Django cache 中 (键 reference:<key>)。
+    model 保存/删除时在事务提交后删除缓存，下次读取时由 loader 重新加载。配置共享缓存 (如 Redis) 时
+    所有进程一起失效；默认的进程内缓存下，其他进程最多在 timeout 秒后读到新数据。
+    """
+    def __init__(self, key, model, loader, timeout=REFERENCE_TIMEOUT):
+        self.key = f'reference:{key}'
+        self.loader = loader
+        self.timeout = timeout
+        post_save.connect(self._model_changed, sender=model, weak=False, dispatch_uid=self.key)
+        post_delete.connect(self._model_changed, sender=model, weak=False, dispatch_uid=self.key)
+
+    def choices(self):
+        choices = cache.get(self.key)
+        if choices is None:
+            choices = list(self.loader())
+            cache.set(self.key, choices, self.timeout)
+        return choices
+
+    def invalidate(self):
+        cache.delete(self.key)
+
+    def _model_changed(self, sender, **kwargs):
+        # 提交前失效的话，并发请求可能把旧数据重新放进缓存
+        transaction.on_commit(self.invalidate)
+
+
+class CachedModelChoiceField(ModelChoiceField):
+    """选项来自 ReferenceList 而不是每次遍历 queryset；提交的值仍由 queryset 校验。"""
+    def __init__(self, queryset, *, reference, **kwargs):
+        self.reference = reference
+        super().__init__(queryset, **kwargs)
+
+    def _get_choices(self):
+        if hasattr(self, '_choices'):
+            return self._choices
+        choices = list(self.reference.choices())
+        if self.empty_label is not None:
+            choices.insert(0, ('', self.empty_label))
+        return choices
+
+    choices = property(_get_choices, forms.ChoiceField.choices.fset)
+
+
+class CachedModelChoiceFilter(django_filters.ModelChoiceFilter):
+    field_class = CachedModelChoiceField
+
+    def __init__(self, *args, reference, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.extra['reference'] = reference
+
+
+class RemoteSelect(forms.Select):
+    """
+    远程搜索的下拉框：只渲染空选项和当前选中的对象 (最多一次按主键查询)，
+    页面上输入关键字时从 url 返回的 JSON ({"results": [{"id": ..., "text": ...}]}) 加载候选项。
+    """
+    template_name = 'users/widgets/remote_select.html' # 部件模板只从已安装的应用中查找，campushive 不是应用
+
+    def __init__(self, url, attrs=None, min_chars=1):
+        super().__init__(attrs)
+        self.url = url
+        self.min_chars = min_chars
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['url'] = str(self.url)
+        context['widget']['min_chars'] = self.min_chars
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        field = self.choices.field
+        options = [('', field.empty_label)] if field.empty_label is not None else []
+        selected = [v for v in value if v not in ('', None)]
+        if selected:
+            try:
+                objects = list(field.queryset.filter(pk__in=selected))
+            except (ValueError, ValidationError): # 地址栏里的非法值，表单校验会报错
+                objects = []
+            options.extend((obj.pk, field.label_from_instance(obj)) for obj in objects)
+        all_choices = self.choices
+        self.choices = options
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = all_choices
@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     'courses.apps.CoursesConfig',
     'equipment.apps.EquipmentConfig',
     'venues.apps.VenuesConfig', 
+    'search.apps.SearchConfig',
     # Third-party apps
     'django_filters',
     'crispy_forms',
@@ -122,6 +123,20 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# 课程资料、作业附件和作业提交只能通过 courses:download_file 下载 (检查权限)，MEDIA_URL 不应直接对外提供。
+# MEDIA_SERVE_BACKEND 选择检查权限后由谁发送文件 (见 courses.downloads)：
+#   'python'   Django 流式发送，支持 Range 和条件请求，适合本地开发；
+#   'nginx'    X-Accel-Redirect，需要配置 location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+#   'sendfile' X-Sendfile (Apache mod_xsendfile、lighttpd)
+MEDIA_SERVE_BACKEND = config('MEDIA_SERVE_BACKEND', default='python')
+MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected-media/')
+
+# 分片上传 (courses.uploads)：未完成的分片写在 UPLOAD_SESSION_ROOT 下，不放在 MEDIA_ROOT 中以免被直接访问
+UPLOAD_SESSION_ROOT = config('UPLOAD_SESSION_ROOT', default=str(BASE_DIR / 'upload_sessions'))
+UPLOAD_PART_SIZE = 5 * 1024 * 1024 # 5 MB
+UPLOAD_MAX_SIZE = config('UPLOAD_MAX_SIZE', default=2 * 1024 ** 3, cast=int) # 2 GB
+UPLOAD_SESSION_TTL = 24 # 小时，超过后由 cleanup_upload_sessions 删除
+
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
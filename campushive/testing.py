@@ -0,0 +1,38 @@
+# campushive/testing.py
+"""各应用测试共用的辅助函数。"""
+import os
+import shutil
+import tempfile
+from django.test import override_settings
+
+
+def temp_csv(testcase, header, rows):
+    """
+    把表头和数据行写入临时 CSV 文件并返回路径，测试结束时删除。
+    导入命令按文件路径打开 CSV，所以这里写真实文件而不是 io.StringIO。
+    """
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as tmp:
+        tmp.write(header + ''.join(rows))
+    testcase.addCleanup(os.remove, tmp.name)
+    return tmp.name
+
+
+class TemporaryMediaMixin:
+    """
+    整个测试类在临时目录 cls.tmp 中读写文件 (默认 MEDIA_ROOT=cls.tmp)，避免写进仓库里的 media/。
+    设置在 super().setUpClass() 之前生效，所以 setUpTestData 保存的文件也落在临时目录；类结束时恢复设置并删除目录。
+    需要其他设置 (或不同的目录布局) 时重写 temporary_settings。
+    """
+
+    @classmethod
+    def temporary_settings(cls, tmp):
+        return {'MEDIA_ROOT': tmp}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.tmp, ignore_errors=True)
+        settings_override = override_settings(**cls.temporary_settings(cls.tmp))
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+        super().setUpClass()
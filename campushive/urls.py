@@ -2,8 +2,6 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
-from django.conf import settings
-from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -23,10 +21,10 @@ urlpatterns = [
     # App URLs
     path('courses/', include('courses.urls')), # 移除了 namespace，因为它会从 courses.urls 的 app_name 获取
     path('equipment/', include('equipment.urls')),
+    path('venues/', include('venues.urls')),
+    path('search/', include('search.urls')),
     # Home page
     path('', TemplateView.as_view(template_name="home.html"), name='home'),
 ]
 
-# Media files serving in development
-if settings.DEBUG: # Important: only in development
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# 上传的文件不再直接按 MEDIA_URL 提供 (开发环境也一样)，统一通过 courses:download_file 检查权限后下载
\ No newline at end of file
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'campushive.settings')
 
 application = get_wsgi_application()
+
+# worker 启动时预先构建课程自动补全索引，第一个请求不必等待；数据库尚未就绪时留到第一次查询再构建
+from django.db import DatabaseError  # noqa: E402
+from courses.search import course_index  # noqa: E402
+
+try:
+    course_index.ensure_built()
+except DatabaseError:
+    pass
@@ -1,8 +1,8 @@
 # courses/admin.py
 from django.contrib import admin
 # Register your models here.
-from django.utils.translation import gettext_lazy as _ # 导入翻译函数
-from .models import Class, Course, Enrollment # 导入所有需要管理的模型
+from .models import Class, Course, Enrollment, ScheduleSlot, WaitlistEntry # 导入所有需要管理的模型
+from .services import promote_waitlist
 from users.models import StudentProfile
 
 # 定义 StudentProfile 的内联管理类
@@ -18,7 +18,7 @@ class StudentInClassInline(admin.TabularInline): # TabularInline 适合表格形
 
 @admin.register(Class) # 注册 Class 模型
 class ClassAdmin(admin.ModelAdmin):
-    list_display = ('name', 'academic_year', 'advisor', 'get_student_count') # 列表页显示的字段
+    list_display = ('name', 'academic_year', 'advisor', 'student_count') # 列表页显示的字段 (人数为冗余存储字段，不再逐行 COUNT)
     search_fields = ('name', 'academic_year', 'advisor__username') # 可搜索的字段
     list_filter = ('academic_year',) # 可筛选的字段
     autocomplete_fields = ['advisor'] # 为 'advisor' (班主任) 字段启用自动完成
@@ -26,28 +26,31 @@ class ClassAdmin(admin.ModelAdmin):
     # 添加内联
     inlines = [StudentInClassInline]
 
-    # def get_student_count(self, obj):
-    #     # 假设 StudentProfile 中有 class_assigned 字段，并且 related_name='students'
-    #     if hasattr(obj, 'students'): # 检查是否存在 'students' 反向关联
-    #          return obj.students.count()
-    #     return 0 # 如果没有，返回0
-    # get_student_count.short_description = _('Number of Students') # 列的显示名称
+class ScheduleSlotInline(admin.TabularInline):
+    # 上课时间段由 schedule_information 自动解析生成，这里只读展示，方便核对解析结果
+    model = ScheduleSlot
+    extra = 0
+    can_delete = False
+    fields = ('weekday', 'start_time', 'end_time', 'venue', 'location')
+    readonly_fields = fields
 
-    def get_student_count(self, obj):
-        # 这个方法现在将正确地通过 related_name='students' 来计数关联的学生
-        return obj.students.count()
-    get_student_count.short_description = _('Number of Students')
+    def has_add_permission(self, request, obj=None):
+        return False
 
 @admin.register(Course) # 注册 Course 模型
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ('code', 'title', 'department', 'instructor', 'credits', 'schedule_information', 'get_enrollment_count') # 列表页显示的字段
+    list_display = ('code', 'title', 'department', 'instructor', 'credits', 'schedule_information', 'enrollment_count', 'capacity') # 列表页显示的字段
     search_fields = ('code', 'title', 'instructor__username', 'department__name') # 可搜索的字段
     list_filter = ('department', 'credits', 'instructor') # 可筛选的字段
     autocomplete_fields = ['department', 'instructor'] # 为 'department' 和 'instructor' 字段启用自动完成
-    def get_enrollment_count(self, obj):
-        # Enrollment 模型中 course 字段的 related_name 默认为 'enrollment_set' 或你自定义的 'enrollments'
-        return obj.enrollments.count()
-    get_enrollment_count.short_description = _('Enrolled Students') # 列的显示名称
+    list_select_related = ('department', 'instructor') # 避免列表页逐行查询院系和教师
+    inlines = [ScheduleSlotInline]
+    # 选课人数使用 Course.enrollment_count (由信号增量维护)，不再逐行 obj.enrollments.count()
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'capacity' in form.changed_data:
+            promote_waitlist(obj.pk) # 扩容后按顺序递补候补学生
 
 @admin.register(Enrollment) # 注册 Enrollment 模型
 class EnrollmentAdmin(admin.ModelAdmin):
@@ -55,4 +58,12 @@ class EnrollmentAdmin(admin.ModelAdmin):
     search_fields = ('student__username', 'student__student_profile__student_id_number', 'course__title', 'course__code') # 可搜索的字段
     list_filter = ('enrollment_date', 'course__department') # 可筛选的字段
     autocomplete_fields = ['student', 'course'] # 为 'student' 和 'course' 字段启用自动完成
-    date_hierarchy = 'enrollment_date' # 在列表页顶部添加日期层级导航
\ No newline at end of file
+    date_hierarchy = 'enrollment_date' # 在列表页顶部添加日期层级导航
+
+@admin.register(WaitlistEntry) # 注册候补名单
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('course', 'student', 'created_at')
+    search_fields = ('student__username', 'course__code', 'course__title')
+    list_filter = ('course',)
+    autocomplete_fields = ['student', 'course']
+    list_select_related = ('course', 'student')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courses'
+
+    def ready(self):
+        # 注册选课记录增删时维护 Course.enrollment_count 的信号
+        from . import signals  # noqa: F401
@@ -0,0 +1,194 @@
+# courses/downloads.py
+"""
+受保护文件 (课程资料、作业附件、作业提交) 的发送。视图检查完权限后调用 serve_file，按
+settings.MEDIA_SERVE_BACKEND 选择发送方式：
+    - 'nginx'：返回 X-Accel-Redirect，由 nginx 从 internal 的 MEDIA_ACCEL_PREFIX 位置发送文件；
+    - 'sendfile'：返回 X-Sendfile (Apache mod_xsendfile、lighttpd)；
+    - 'python' (默认)：Django 自己按 64 KB 分块流式发送，支持单个 Range 区间和条件请求
+      (If-None-Match / If-Modified-Since / If-Range)，用于本地开发和测试。
+前两种方式中 Range、条件请求由前端服务器处理，Python 进程不传输文件内容。
+
+submissions_zip 把一个作业的全部提交打包成 ZIP，边读文件边输出 (不在内存或临时文件中生成整个压缩包)。
+"""
+import mimetypes
+import os
+import re
+import zipfile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+from .models import Submission
+from .storage import is_blob
+
+STREAM_BLOCK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# 去重存储中的文件内容永不改变，浏览器可以一直缓存 (仍然是 private，因为需要权限)
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'private, no-cache'
+
+
+def serve_file(request, field_file, filename):
+    """发送 FileField 中的文件，filename 是浏览器保存时使用的文件名。文件不存在时 404。"""
+    name = field_file.name
+    try:
+        path = field_file.storage.path(name)
+        stat = os.stat(path)
+    except (FileNotFoundError, NotImplementedError, ValueError):
+        raise Http404("File not found.")
+    if is_blob(name):
+        etag = quote_etag(os.path.splitext(os.path.basename(name))[0]) # 内容的 SHA-256
+    else:
+        etag = quote_etag(f'{int(stat.st_mtime):x}-{stat.st_size:x}')
+    last_modified = int(stat.st_mtime)
+
+    backend = getattr(settings, 'MEDIA_SERVE_BACKEND', 'python')
+    if backend == 'nginx':
+        response = HttpResponse()
+        prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = quote(prefix.rstrip('/') + '/' + name)
+    elif backend == 'sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = path
+    else:
+        response = _python_response(request, path, stat.st_size, etag, last_modified)
+
+    content_type, encoding = mimetypes.guess_type(filename or name)
+    if encoding: # 例如 .gz：按原样下载，不让浏览器解压
+        content_type = 'application/octet-stream'
+    response['Content-Type'] = content_type or 'application/octet-stream'
+    response['Content-Disposition'] = content_disposition_header(False, filename or os.path.basename(name))
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if is_blob(name) else DEFAULT_CACHE_CONTROL
+    response['X-Content-Type-Options'] = 'nosniff'
+    if backend == 'python':
+        # 前端服务器方式中条件请求由服务器处理
+        return get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+    return response
+
+
+def parse_range(header, size):
+    """
+    解析 Range 请求头，返回 (start, end) (包含 end)。没有 Range、格式不支持 (包括多个区间) 时返回 None，
+    表示发送整个文件；区间超出文件时返回 False (416)。
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first: # bytes=-500：最后 500 字节
+        length = int(last)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None # 语法无效，忽略
+    if start >= size:
+        return False
+    return start, end
+
+
+def _range_applies(request, etag, last_modified):
+    """If-Range：资源已改变 (ETag 或日期不一致) 时忽略 Range，发送整个文件。"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag # 只允许强比较
+    date = parse_http_date_safe(if_range)
+    return date is not None and date == last_modified
+
+
+def _python_response(request, path, size, etag, last_modified):
+    byte_range = None
+    if 'Range' in request.headers and request.method in ('GET', 'HEAD') and _range_applies(request, etag, last_modified):
+        byte_range = parse_range(request.headers['Range'], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    body = () if request.method == 'HEAD' else _read_blocks(path, start, length)
+    response = StreamingHttpResponse(body, status=206 if byte_range else 200)
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _read_blocks(path, start, length):
+    # 生成器：第一次迭代时才打开文件，条件请求直接返回 304 时不会打开
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+class _ZipSink:
+    """
+    zipfile 的输出目标，只收集写入的数据，由生成器取走。没有 seek / tell，zipfile 因此按流式方式写入
+    (每个文件的 CRC 和大小写在文件数据之后的数据描述符中)。
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def submissions_zip(assignment):
+    """
+    逐块生成作业全部提交的 ZIP，每个文件以学生用户名命名 (保留扩展名)。提交的文件多为 PDF、docx 等已压缩格式，
+    直接存储不再压缩。文件丢失的提交记录在压缩包的 missing_files.txt 中。
+    """
+    sink = _ZipSink()
+    missing = []
+    submissions = (
+        Submission.objects.filter(assignment=assignment).order_by('student__username')
+        .only('submitted_file', 'submitted_at', 'student__username').select_related('student')
+    )
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for submission in submissions.iterator(chunk_size=500):
+            username = submission.student.username
+            field_file = submission.submitted_file
+            try:
+                size = field_file.storage.size(field_file.name)
+                source = field_file.storage.open(field_file.name, 'rb')
+            except (FileNotFoundError, ValueError):
+                missing.append(username)
+                continue
+            info = zipfile.ZipInfo(username + os.path.splitext(field_file.name)[1],
+                                   timezone.localtime(submission.submitted_at).timetuple()[:6])
+            info.file_size = size # 超过 4 GB 的文件由此启用 ZIP64
+            with source, archive.open(info, 'w') as target:
+                for block in iter(lambda: source.read(STREAM_BLOCK_SIZE), b''):
+                    target.write(block)
+                    yield sink.drain()
+            yield sink.drain()
+        if missing:
+            archive.writestr('missing_files.txt', '\n'.join(missing) + '\n')
+    yield sink.drain()
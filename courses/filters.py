@@ -5,6 +5,9 @@ from .models import Course
 from users.models import Department # 假设 Department 模型在 users 应用中
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.urls import reverse_lazy
+from campushive.reference_data import CachedModelChoiceFilter, RemoteSelect
+from users.reference_data import DEPARTMENT_CHOICES
 
 User = get_user_model()
 
@@ -22,25 +25,22 @@ class CourseFilter(django_filters.FilterSet):
         label='Course Code Contains',
         widget=forms.TextInput(attrs={'class': 'form-control form-control-sm'})
     )
-    # department 字段，使用 ModelChoiceFilter 生成下拉选择框
+    # department 字段：下拉选项来自跨请求共享的缓存 (部门增删改时失效)，渲染表单不查询部门表
     # 并添加 Bootstrap class
-    department = django_filters.ModelChoiceFilter(
-        queryset=Department.objects.all(), # 确保 Department 模型已定义且可访问
+    department = CachedModelChoiceFilter(
+        queryset=Department.objects.all(), # 用于校验提交的值
+        reference=DEPARTMENT_CHOICES,
         label='Department',
         empty_label='All Departments', # 添加一个“全部”选项
         widget=forms.Select(attrs={'class': 'form-select form-select-sm'})
     )
-    # instructor 字段，同样使用 ModelChoiceFilter
-    # 限制 queryset 只选择教师角色的用户
+    # instructor 字段：教师可能有成千上万，不再全部放进下拉框；
+    # RemoteSelect 只渲染已选中的教师，其余在输入时从 users:teacher_lookup 接口搜索
     instructor = django_filters.ModelChoiceFilter(
         queryset=User.objects.filter(role='teacher'), # 假设你的 User 模型有 'role' 字段，并且 'teacher' 是一个有效值
         label='Instructor',
         empty_label='All Instructors',
-        widget=forms.Select(attrs={'class': 'form-select form-select-sm'})
-        # 你可能想自定义下拉框中教师的显示方式，
-        # 默认使用 User 模型的 __str__ 方法。如果 __str__ 是 username，
-        # 你可能想显示全名。这可以通过自定义 ModelChoiceFilter 的 to_field_name 或 label_from_instance 实现，
-        # 但对于初学者，默认行为通常足够。
+        widget=RemoteSelect(reverse_lazy('users:teacher_lookup'), attrs={'class': 'form-select form-select-sm'})
     )
     # 假设你想根据学分进行筛选 (例如，大于等于某个值)
     # credits_min = django_filters.NumberFilter(field_name='credits', lookup_expr='gte', label='Min. Credits')
@@ -23,9 +23,11 @@ class CourseCreationForm(forms.ModelForm):
                   'title', 
                   'description', 
                   'credits', 
+                  'capacity',
                   'department', 
                   'instructor',
                   'schedule_information',
+                  'drop_lowest',
                   ]
         # You can customize widgets here if needed, e.g., for description:
         # widgets = {
@@ -75,6 +77,13 @@ EnrollmentGradeFormSet = inlineformset_factory(
     # readonly_fields=('student',) # Make student field read-only in the form
 )
 
+class GradeUploadForm(forms.Form):
+    """批量录入成绩的上传表单，文件格式见 courses.grading"""
+    grades_file = forms.FileField(
+        label="Grade file",
+        help_text="CSV or XLSX with a student column (username, email or student ID) and a grade column.",
+    )
+
 # If Enrollment.student is a ForeignKey to User, not StudentProfile:
 # We might need a custom formset or a different approach if 'student' is not directly editable.
 # A simpler approach for now: iterate enrollments and create individual forms.
@@ -95,7 +104,7 @@ class AssignmentForm(forms.ModelForm):
     )
     class Meta:
         model = Assignment
-        fields = ['title', 'description', 'due_date', 'assignment_file']
+        fields = ['title', 'description', 'due_date', 'assignment_file', 'max_score', 'weight', 'category']
         widgets = {
             'description': forms.Textarea(attrs={'rows': 5}),
         }
@@ -116,7 +125,7 @@ class SubmissionForm(forms.ModelForm):
 class GradeSubmissionForm(forms.ModelForm):
     class Meta:
         model = Submission
-        fields = ['grade', 'feedback']
+        fields = ['score', 'grade', 'feedback']
         widgets = {
             'feedback': forms.Textarea(attrs={'rows': 4}),
         }
\ No newline at end of file
@@ -0,0 +1,68 @@
+# courses/grade_scale.py
+"""
+成绩 → 绩点的换算 (4.0 制)。Enrollment.grade 是自由文本，这里统一解释：
+    - 字母成绩 A+ ... F 按 LETTER_POINTS 换算，F 不获得学分；
+    - 百分制成绩 (0-100) 按 PERCENT_POINTS 分段换算，60 分以下不获得学分；
+    - P (通过) 获得学分但不计入 GPA，NP (不通过) 既不获得学分也不计入 GPA；
+    - 空值和其他无法识别的成绩 (例如 W 退课、I 未完成) 视为尚无成绩，不计入。
+本模块不依赖模型。迁移 0007 的回填保留了一份当时的换算，修改这里的规则后运行 rebuild_transcripts 重算。
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+LETTER_POINTS = {
+    'A+': Decimal('4.0'), 'A': Decimal('4.0'), 'A-': Decimal('3.7'),
+    'B+': Decimal('3.3'), 'B': Decimal('3.0'), 'B-': Decimal('2.7'),
+    'C+': Decimal('2.3'), 'C': Decimal('2.0'), 'C-': Decimal('1.7'),
+    'D+': Decimal('1.3'), 'D': Decimal('1.0'), 'D-': Decimal('0.7'),
+    'F': Decimal('0.0'),
+}
+# (最低分, 绩点)，从高到低
+PERCENT_POINTS = [
+    (90, Decimal('4.0')), (85, Decimal('3.7')), (82, Decimal('3.3')), (78, Decimal('3.0')),
+    (75, Decimal('2.7')), (72, Decimal('2.3')), (68, Decimal('2.0')), (64, Decimal('1.5')),
+    (60, Decimal('1.0')), (0, Decimal('0.0')),
+]
+PASS_GRADES = {'P', 'PASS'}
+NO_PASS_GRADES = {'NP', 'FAIL'}
+
+# points 为 None 表示不计入 GPA
+GradeValue = namedtuple('GradeValue', ['points', 'earns_credit'])
+# 一条选课记录对成绩单的贡献：绩点 × 学分、计入 GPA 的学分、获得的学分
+Contribution = namedtuple('Contribution', ['quality_points', 'gpa_credits', 'credits_earned'])
+NO_CONTRIBUTION = Contribution(Decimal('0'), 0, 0)
+
+
+def grade_value(grade):
+    grade = (grade or '').strip().upper()
+    if grade in LETTER_POINTS:
+        points = LETTER_POINTS[grade]
+        return GradeValue(points, points > 0)
+    if grade in PASS_GRADES:
+        return GradeValue(None, True)
+    if grade in NO_PASS_GRADES:
+        return GradeValue(None, False)
+    try:
+        score = Decimal(grade)
+    except ArithmeticError: # decimal.InvalidOperation
+        return GradeValue(None, False)
+    if not score.is_finite() or not 0 <= score <= 100:
+        return GradeValue(None, False)
+    points = next(points for minimum, points in PERCENT_POINTS if score >= minimum)
+    return GradeValue(points, score >= 60)
+
+
+def contribution(grade, credits):
+    if not grade or not credits:
+        return NO_CONTRIBUTION
+    value = grade_value(grade)
+    if value.points is None:
+        return Contribution(Decimal('0'), 0, credits if value.earns_credit else 0)
+    return Contribution(value.points * credits, credits, credits if value.earns_credit else 0)
+
+
+def compute_gpa(quality_points, gpa_credits):
+    """学分加权 GPA，保留两位小数；没有计入 GPA 的学分时返回 None。"""
+    if not gpa_credits:
+        return None
+    return (Decimal(quality_points) / gpa_credits).quantize(Decimal('0.01'))
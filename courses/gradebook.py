@@ -0,0 +1,118 @@
+# courses/gradebook.py
+"""
+按作业分数计算整门课程的总评成绩。
+
+三条查询读出作业、选课学生和提交分数，放进 (学生 × 作业) 的 NumPy 矩阵，然后整体计算：
+    - 每个分数换算成得分率 score / max_score；没有提交的作业截止后记 0 分，截止前不计入；
+    - 同一类别 (Assignment.category) 中去掉每个学生最低的 Course.drop_lowest 个得分率，
+      但每类至少保留一个成绩；没有类别的作业不参与去掉最低分；
+    - 总评 = Σ(得分率 × 权重) / Σ(计入的权重) × 100。
+结果写回 Enrollment.grade (百分制，保留一位小数，GPA 按 courses.grade_scale 的百分制换算)。
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.utils import timezone
+
+from .grading import save_grades
+from .models import Assignment, Enrollment, Submission
+
+
+def score_matrix(course, now=None):
+    """
+    返回 (选课记录列表, 作业列表, 得分率矩阵)，矩阵的行、列与两个列表一一对应。
+    矩阵中 NaN 表示不计入 (尚未截止且未提交，或已提交未评分)。
+    """
+    now = now or timezone.now()
+    assignments = list(Assignment.objects.filter(course=course).order_by('due_date', 'pk').only(
+        'pk', 'max_score', 'weight', 'category', 'due_date'))
+    enrollments = list(Enrollment.objects.filter(course=course).order_by('student_id').only('student_id', 'grade'))
+    student_ids = np.fromiter((enrollment.student_id for enrollment in enrollments), dtype=np.int64, count=len(enrollments))
+    matrix = np.full((len(enrollments), len(assignments)), np.nan)
+    if not assignments or not enrollments:
+        return enrollments, assignments, matrix
+
+    # 已截止的作业缺交记 0 分
+    past_due = np.array([assignment.due_date <= now for assignment in assignments])
+    matrix[:, past_due] = 0.0
+
+    columns = {assignment.pk: i for i, assignment in enumerate(assignments)}
+    submitted = list(
+        Submission.objects.filter(assignment__course=course, student__enrollments__course=course)
+        .values_list('student_id', 'assignment_id', 'score')
+    )
+    if submitted:
+        students, assignment_ids, scores = zip(*submitted)
+        rows = np.searchsorted(student_ids, np.array(students, dtype=np.int64))
+        cols = np.array([columns[pk] for pk in assignment_ids])
+        # 已提交但未评分的作业不计入 (NaN)，不当作 0 分
+        matrix[rows, cols] = np.array([np.nan if score is None else float(score) for score in scores])
+    max_scores = np.array([float(assignment.max_score) for assignment in assignments])
+    return enrollments, assignments, matrix / max_scores
+
+
+def drop_lowest(matrix, columns, count):
+    """在 columns 这些列中，把每行最低的 count 个得分率改为 NaN (每行至少保留一个已有成绩)。"""
+    if count <= 0 or len(columns) < 2:
+        return matrix
+    block = matrix[:, columns]
+    graded = ~np.isnan(block)
+    # 每行可去掉的个数：不超过 count，并保留至少一个成绩
+    droppable = np.minimum(count, np.maximum(graded.sum(axis=1) - 1, 0))
+    # NaN 排在最后；两次 argsort 得到每个元素在行内的名次
+    ranks = np.argsort(np.argsort(np.where(graded, block, np.inf), axis=1, kind='stable'), axis=1)
+    block = np.where(ranks < droppable[:, None], np.nan, block)
+    matrix = matrix.copy()
+    matrix[:, columns] = block
+    return matrix
+
+
+def _final_scores(course, now):
+    """返回 (选课记录列表, 总评数组)；总评为 NaN 表示该学生没有任何计入的成绩。"""
+    enrollments, assignments, matrix = score_matrix(course, now)
+    if not assignments or not enrollments:
+        return enrollments, np.full(len(enrollments), np.nan)
+    categories = {}
+    for i, assignment in enumerate(assignments):
+        if assignment.category:
+            categories.setdefault(assignment.category, []).append(i)
+    for columns in categories.values():
+        matrix = drop_lowest(matrix, columns, course.drop_lowest)
+
+    weights = np.array([float(assignment.weight) for assignment in assignments])
+    weight_totals = (~np.isnan(matrix) * weights).sum(axis=1)
+    earned = (np.nan_to_num(matrix) * weights).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percentages = np.where(weight_totals > 0, earned / weight_totals * 100, np.nan)
+    return enrollments, np.clip(percentages, 0, 100)
+
+
+def final_percentages(course, now=None):
+    """计算课程每个学生的总评 (0-100)。返回 {student_id: float}；没有任何计入成绩的学生不在结果中。"""
+    enrollments, percentages = _final_scores(course, now)
+    return {
+        enrollment.student_id: value
+        for enrollment, value in zip(enrollments, percentages.tolist()) if not np.isnan(value)
+    }
+
+
+def format_percentage(value):
+    return str(Decimal(value).quantize(Decimal('0.1')))
+
+
+def apply_final_grades(course, now=None):
+    """
+    计算总评并用一条 bulk_update 写回 Enrollment.grade，返回改变的选课记录数。
+    没有计入成绩的学生保持原成绩。共四条查询 (作业、选课、提交、写回)，另加成绩单汇总的重算。
+    """
+    enrollments, percentages = _final_scores(course, now)
+    changed = []
+    for enrollment, value in zip(enrollments, percentages.tolist()):
+        if np.isnan(value):
+            continue
+        grade = format_percentage(value)
+        if enrollment.grade != grade:
+            enrollment.grade = grade
+            changed.append(enrollment)
+    save_grades(changed)
+    return len(changed)
@@ -0,0 +1,176 @@
+# courses/grading.py
+"""
+批量录入课程成绩：从 CSV / XLSX 文件或 JSON 中读取 (学生, 成绩) 行，一次校验全部行，
+全部合法时在一个事务中用一条 bulk_update 写入 (并重算相关学生的成绩单汇总)，任何一行有错都不写入。
+
+学生可以用用户名、邮箱或学号 (StudentProfile.student_id_number) 标识，不区分大小写；
+成绩为空表示清除成绩。XLSX 需要安装 openpyxl。
+"""
+import csv
+import io
+import json
+import os
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Enrollment
+from .services import rebuild_transcripts
+
+MAX_GRADE_ROWS = 5000
+MAX_GRADE_FILE_SIZE = 5 * 1024 * 1024 # 5 MB
+GRADE_MAX_LENGTH = Enrollment._meta.get_field('grade').max_length
+STUDENT_HEADERS = {'student', 'username', 'email', 'student id', 'student_id'}
+GRADE_HEADERS = {'grade'}
+
+
+def read_grade_file(upload):
+    """把上传的 CSV / XLSX 文件读成 [(行号, 学生, 成绩)]。第一行是表头时按表头找列，否则取前两列。"""
+    if upload.size > MAX_GRADE_FILE_SIZE:
+        raise ValidationError('The grade file is larger than %(size)d MB.', params={'size': MAX_GRADE_FILE_SIZE // (1024 * 1024)})
+    extension = os.path.splitext(upload.name)[1].lower()
+    if extension == '.csv':
+        rows = _csv_rows(upload)
+    elif extension == '.xlsx':
+        rows = _xlsx_rows(upload)
+    else:
+        raise ValidationError('Upload a .csv or .xlsx file.')
+    return _grade_rows(rows)
+
+
+def read_grade_json(payload):
+    """
+    解析 JSON 请求体，接受 {"grades": [["alice", "A"], ...]}、{"grades": {"alice": "A", ...}}
+    或 {"grades": [{"student": "alice", "grade": "A"}, ...]}。
+    """
+    try:
+        grades = json.loads(payload)['grades']
+    except (ValueError, TypeError, KeyError):
+        raise ValidationError('Expected a JSON object with a "grades" list.')
+    if isinstance(grades, dict):
+        grades = list(grades.items())
+    if not isinstance(grades, list):
+        raise ValidationError('"grades" must be a list or an object.')
+    rows = []
+    for number, item in enumerate(grades, start=1):
+        if isinstance(item, dict):
+            item = (item.get('student'), item.get('grade'))
+        if not isinstance(item, (list, tuple)) or len(item) != 2:
+            raise ValidationError('Entry %(number)d is not a (student, grade) pair.', params={'number': number})
+        rows.append((number, item[0], item[1]))
+    return rows
+
+
+def _csv_rows(upload):
+    raw = upload.read()
+    for encoding in ('utf-8-sig', 'gb18030'): # Excel 导出的中文 CSV 常见 GBK 编码
+        try:
+            text = raw.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValidationError('The CSV file is not UTF-8 or GB18030 encoded.')
+    return csv.reader(io.StringIO(text, newline=''))
+
+
+def _xlsx_rows(upload):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValidationError('XLSX upload is not available on this server; upload a CSV file instead.')
+    try:
+        workbook = load_workbook(upload, read_only=True, data_only=True)
+    except Exception: # openpyxl 对损坏的文件会抛出各种异常 (zipfile、KeyError 等)
+        raise ValidationError('The XLSX file could not be read.')
+    return workbook.active.iter_rows(values_only=True)
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer(): # Excel 把学号存成数字
+        value = int(value)
+    return str(value).strip()
+
+
+def _grade_rows(rows):
+    student_column, grade_column = 0, 1
+    result = []
+    for number, row in enumerate(rows, start=1):
+        cells = [_cell(value) for value in row]
+        if not any(cells):
+            continue
+        if number == 1:
+            headers = [cell.lower() for cell in cells]
+            student = next((i for i, header in enumerate(headers) if header in STUDENT_HEADERS), None)
+            grade = next((i for i, header in enumerate(headers) if header in GRADE_HEADERS), None)
+            if student is not None and grade is not None:
+                student_column, grade_column = student, grade
+                continue
+        if len(result) >= MAX_GRADE_ROWS:
+            raise ValidationError('The file has more than %(max)d rows.', params={'max': MAX_GRADE_ROWS})
+        cells += [''] * (max(student_column, grade_column) + 1 - len(cells))
+        result.append((number, cells[student_column], cells[grade_column]))
+    return result
+
+
+def _enrollment_lookup(course):
+    """课程全部选课记录按用户名 / 邮箱 / 学号 (小写) 建索引，一次查询。"""
+    lookup = {}
+    enrollments = (
+        Enrollment.objects.filter(course=course)
+        .select_related('student__student_profile')
+        .only('grade', 'student', 'student__username', 'student__email', 'student__student_profile__student_id_number')
+    )
+    for enrollment in enrollments:
+        student = enrollment.student
+        profile = getattr(student, 'student_profile', None)
+        for key in (student.username, student.email, profile and profile.student_id_number):
+            if key:
+                lookup.setdefault(key.lower(), enrollment)
+    return lookup
+
+
+def apply_grades(course, rows):
+    """
+    校验 rows ([(行号, 学生, 成绩)]) 并写入课程成绩，返回实际改变的选课记录数。
+    有任何一行不合法时抛出 ValidationError (包含所有行的错误信息)，不写入任何成绩。
+    """
+    lookup = _enrollment_lookup(course)
+    errors = []
+    changed = {}
+    seen = set()
+    for number, student, grade in rows:
+        key = _cell(student).lower()
+        grade = _cell(grade) or None
+        enrollment = lookup.get(key)
+        if not key:
+            errors.append(f'Row {number}: missing student.')
+        elif enrollment is None:
+            errors.append(f'Row {number}: "{student}" is not enrolled in this course.')
+        elif enrollment.pk in seen:
+            errors.append(f'Row {number}: "{student}" appears more than once.')
+        elif grade and len(grade) > GRADE_MAX_LENGTH:
+            errors.append(f'Row {number}: grade "{grade}" is longer than {GRADE_MAX_LENGTH} characters.')
+        else:
+            seen.add(enrollment.pk)
+            if enrollment.grade != grade:
+                enrollment.grade = grade
+                changed[enrollment.pk] = enrollment
+    if errors:
+        raise ValidationError(errors)
+    save_grades(changed.values())
+    return len(changed)
+
+
+def save_grades(enrollments):
+    """
+    用一条 bulk_update 写入成绩。bulk_update 不发送信号，这里顺带在同一事务中重算这些学生的成绩单汇总。
+    """
+    enrollments = list(enrollments)
+    if not enrollments:
+        return
+    with transaction.atomic():
+        Enrollment.objects.bulk_update(enrollments, ['grade'], batch_size=500)
+        rebuild_transcripts({enrollment.student_id for enrollment in enrollments})
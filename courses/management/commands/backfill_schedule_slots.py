@@ -0,0 +1,58 @@
+# courses/management/commands/backfill_schedule_slots.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from courses.models import Course, ScheduleSlot
+from courses.schedule import encode_week, week_mask
+from courses.services import build_schedule_slots, rebuild_timetables, venue_name_index
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = ('Parses Course.schedule_information of all courses into ScheduleSlot rows (replacing existing slots), '
+            'updates Course.schedule_mask and rebuilds the student timetable bitmaps.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of courses processed per transaction (default: 500).')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        venue_ids = venue_name_index() # 场所表只查一次
+        courses = Course.objects.only('pk', 'code', 'schedule_information').order_by('pk')
+
+        total_courses = total_slots = partially_parsed = 0
+        for chunk in _chunks(courses.iterator(chunk_size=options['batch_size']), options['batch_size']):
+            slots = []
+            for course in chunk:
+                course_slots, unparsed = build_schedule_slots(course, venue_ids)
+                slots.extend(course_slots)
+                course.schedule_mask = encode_week(week_mask(course_slots))
+                if unparsed:
+                    partially_parsed += 1
+                    if verbosity >= 2:
+                        self.stdout.write(self.style.WARNING(f'{course.code}: could not parse {unparsed}'))
+            # 每块课程一次删除 + 一次批量插入
+            with transaction.atomic():
+                ScheduleSlot.objects.filter(course__in=[course.pk for course in chunk]).delete()
+                ScheduleSlot.objects.bulk_create(slots)
+                Course.objects.bulk_update(chunk, ['schedule_mask'])
+            total_courses += len(chunk)
+            total_slots += len(slots)
+
+        timetables = rebuild_timetables() # 课程位图可能都变了，学生位图整体重算一次
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfilled {total_slots} schedule slot(s) for {total_courses} course(s); '
+            f'{partially_parsed} course(s) contain text that could not be parsed (use -v 2 to list it). '
+            f'Rebuilt {timetables} student timetable(s).'
+        ))
@@ -0,0 +1,18 @@
+# courses/management/commands/cleanup_upload_sessions.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from courses.uploads import expire_sessions
+
+
+class Command(BaseCommand):
+    help = ('Deletes chunked upload sessions (and their temporary files) that have been inactive for longer than '
+            'UPLOAD_SESSION_TTL hours. Run periodically, e.g. from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, help='Override UPLOAD_SESSION_TTL for this run.')
+
+    def handle(self, *args, **options):
+        max_age = timedelta(hours=options['hours']) if options['hours'] is not None else None
+        count = expire_sessions(max_age)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} expired upload session(s).'))
@@ -0,0 +1,30 @@
+# courses/management/commands/rebuild_signatures.py
+
+from django.core.management.base import BaseCommand
+from courses.models import Submission
+from courses.similarity import update_signature
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the MinHash signatures used to find similar submissions, e.g. after loaddata or for '
+            'submissions made before similarity detection existed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assignment', type=int, action='append', dest='assignments',
+                            help='Only rebuild the submissions of this assignment id (may be repeated).')
+        parser.add_argument('--missing', action='store_true', help='Only submissions that have no signature yet.')
+
+    def handle(self, *args, **options):
+        submissions = Submission.objects.only('assignment_id', 'submitted_file').order_by('pk')
+        if options['assignments']:
+            submissions = submissions.filter(assignment_id__in=options['assignments'])
+        if options['missing']:
+            submissions = submissions.filter(signature__isnull=True)
+        signed = skipped = 0
+        for submission in submissions.iterator(chunk_size=500):
+            # 不复用其他提交的签名，它们可能也是旧的
+            if update_signature(submission, reuse=False):
+                signed += 1
+            else:
+                skipped += 1
+        self.stdout.write(self.style.SUCCESS(f'Computed {signed} signature(s), {skipped} submission(s) without comparable text.'))
@@ -0,0 +1,17 @@
+# courses/management/commands/rebuild_timetables.py
+
+from django.core.management.base import BaseCommand
+from courses.services import rebuild_timetables
+
+
+class Command(BaseCommand):
+    help = ('Recomputes every StudentTimetable bitmap (used for enrollment clash detection) from the current '
+            'enrollments, e.g. after loaddata or bulk imports that bypass the signals.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', type=int, action='append', dest='students',
+                            help='Only rebuild the timetable of this student id (may be repeated).')
+
+    def handle(self, *args, **options):
+        count = rebuild_timetables(options['students'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} student timetable(s).'))
@@ -0,0 +1,25 @@
+# courses/management/commands/rebuild_transcripts.py
+
+from django.core.management.base import BaseCommand, CommandError
+from courses.services import rebuild_transcripts
+from users.models import Department
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the StudentTranscript aggregates (GPA and credits earned) from the current enrollment grades, '
+            'e.g. after loaddata, bulk imports that bypass the signals, or a change to the grade scale.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', type=int, action='append', dest='students',
+                            help='Only rebuild the transcript of this student id (may be repeated).')
+        parser.add_argument('--department', type=int,
+                            help='Only rebuild students who took a course offered by this department id.')
+
+    def handle(self, *args, **options):
+        department = None
+        if options['department'] is not None:
+            department = Department.objects.filter(pk=options['department']).first()
+            if department is None:
+                raise CommandError(f"Department {options['department']} does not exist.")
+        count = rebuild_transcripts(options['students'], department=department)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} student transcript(s).'))
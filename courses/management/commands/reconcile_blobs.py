@@ -0,0 +1,98 @@
+# courses/management/commands/reconcile_blobs.py
+import os
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from courses.models import StoredBlob
+from courses.signals import BLOB_FIELDS
+from courses.storage import BLOB_DIR, UNUSED_GRACE, blob_storage, delete_if_unused
+
+
+class Command(BaseCommand):
+    help = ('Recounts StoredBlob.ref_count from CourseMaterial, Assignment and Submission files, deletes stored '
+            'files nobody references, and optionally moves older files into the deduplicated store.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--import-existing', action='store_true',
+                            help='Move files stored before deduplication (outside blobs/) into the store.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report, do not change anything.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if options['import_existing']:
+            self.import_existing(dry_run)
+
+        # 实际引用数：三个字段的文件名计数
+        references = Counter()
+        for model, field in BLOB_FIELDS.items():
+            names = model.objects.filter(**{f'{field}__startswith': BLOB_DIR + '/'}).values_list(field, flat=True)
+            references.update(names.iterator(chunk_size=2000))
+
+        drifted = []
+        for blob in StoredBlob.objects.only('pk', 'name', 'ref_count').iterator(chunk_size=2000):
+            actual = references.pop(blob.name, 0)
+            if blob.ref_count != actual:
+                blob.ref_count = actual
+                drifted.append(blob)
+        # 被引用但没有记录的文件 (例如 loaddata 导入)
+        missing = [
+            StoredBlob(name=name, sha256=os.path.splitext(os.path.basename(name))[0], size=blob_storage.size(name), ref_count=count)
+            for name, count in references.items() if blob_storage.exists(name)
+        ]
+        if not dry_run:
+            with transaction.atomic():
+                StoredBlob.objects.bulk_update(drifted, ['ref_count'], batch_size=500)
+                StoredBlob.objects.bulk_create(missing, batch_size=500)
+        self.stdout.write(f'{len(drifted)} reference count(s) drifted, {len(missing)} record(s) missing.')
+
+        # 没有引用且过了宽限期的文件
+        cutoff = timezone.now() - UNUSED_GRACE
+        unused = StoredBlob.objects.filter(ref_count=0, saved_at__lt=cutoff).values_list('name', flat=True)
+        deleted = len(unused) if dry_run else sum(delete_if_unused(name) for name in list(unused))
+        deleted += self.delete_orphans(cutoff.timestamp(), dry_run)
+        verb = 'would be deleted' if dry_run else 'deleted'
+        self.stdout.write(self.style.SUCCESS(f'Reconcile finished, {deleted} unused file(s) {verb}.'))
+
+    def delete_orphans(self, cutoff, dry_run):
+        """删除 blobs/ 下没有记录的文件 (中断的保存留下的临时文件等)。"""
+        root = blob_storage.path(BLOB_DIR)
+        known = set(StoredBlob.objects.values_list('name', flat=True))
+        count = 0
+        for directory, _dirs, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, blob_storage.location).replace(os.sep, '/')
+                if name in known or os.path.getmtime(path) >= cutoff:
+                    continue
+                if not dry_run:
+                    os.remove(path)
+                count += 1
+        return count
+
+    def import_existing(self, dry_run):
+        """把旧的按日期存放的文件存入去重存储，更新字段 (不触发信号，之后统一重新计数)，再删除旧文件。"""
+        imported = 0
+        for model, field in BLOB_FIELDS.items():
+            legacy = (
+                model.objects.exclude(Q(**{f'{field}__startswith': BLOB_DIR + '/'}) | Q(**{field: ''}) | Q(**{f'{field}__isnull': True}))
+                .values_list('pk', field)
+            )
+            for pk, name in legacy.iterator(chunk_size=2000):
+                if not blob_storage.exists(name):
+                    self.stderr.write(f'{model.__name__} {pk}: file {name} is missing, skipped.')
+                    continue
+                imported += 1
+                if dry_run:
+                    continue
+                with blob_storage.open(name) as f:
+                    new_name = blob_storage.save(name, f)
+                model.objects.filter(pk=pk).update(**{field: new_name})
+                if not any(
+                    other.objects.filter(**{other_field: name}).exists() for other, other_field in BLOB_FIELDS.items()
+                ):
+                    blob_storage.delete(name)
+        self.stdout.write(f'{imported} file(s) moved into the deduplicated store.')
@@ -0,0 +1,44 @@
+# courses/management/commands/reconcile_counts.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+from courses.models import Class, Course
+from users.models import Department
+
+# (模型, 冗余计数字段, 用于实际计数的反向关联)
+COUNTERS = [
+    (Course, 'enrollment_count', 'enrollments'),
+    (Class, 'student_count', 'students'),
+    (Department, 'employee_count', 'employees'),
+]
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the denormalized counters (Course.enrollment_count, Class.student_count, '
+            'Department.employee_count) and fixes any drift.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, do not fix it.')
+
+    def handle(self, *args, **options):
+        total_fixed = 0
+        for model, field, relation in COUNTERS:
+            # 每个模型一条聚合查询，只取出存储值与实际值不一致的行
+            drifted = list(
+                model.objects.annotate(actual=Count(relation))
+                .filter(~Q(**{field: F('actual')}))
+                .only('pk', field)
+            )
+            for obj in drifted:
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f'{model.__name__} {obj.pk}: {field} {getattr(obj, field)} -> {obj.actual}')
+                setattr(obj, field, obj.actual)
+            if drifted and not options['dry_run']:
+                with transaction.atomic():
+                    model.objects.bulk_update(drifted, [field], batch_size=500)
+            total_fixed += len(drifted)
+            self.stdout.write(f'{model.__name__}.{field}: {len(drifted)} row(s) drifted.')
+
+        verb = 'found' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Reconcile finished, {total_fixed} counter(s) {verb}.'))
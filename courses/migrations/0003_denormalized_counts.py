@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, fk):
+    # 按外键分组计数的相关子查询，整张表一条 UPDATE 完成回填
+    counts = model.objects.filter(**{fk: OuterRef('pk')}).order_by().values(fk).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts), 0)
+
+
+def backfill_counts(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    Class = apps.get_model('courses', 'Class')
+    StudentProfile = apps.get_model('users', 'StudentProfile')
+    Course.objects.update(enrollment_count=count_subquery(Enrollment, 'course'))
+    Class.objects.update(student_count=count_subquery(StudentProfile, 'assigned_class'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_initial'),
+        ('users', '0004_studentprofile_assigned_class'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='class',
+            name='student_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Number of Students'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Enrolled Students'),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
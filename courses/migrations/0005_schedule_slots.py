@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_capacity_waitlist'),
+        ('venues', '0005_recurring_bookings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')], verbose_name='Weekday')),
+                ('start_time', models.TimeField(verbose_name='Start Time')),
+                ('end_time', models.TimeField(verbose_name='End Time')),
+                ('location', models.CharField(blank=True, max_length=255, verbose_name='Location')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_slots', to='courses.course')),
+                ('venue', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='schedule_slots', to='venues.venue', verbose_name='Venue')),
+            ],
+            options={
+                'verbose_name': 'Schedule Slot',
+                'verbose_name_plural': 'Schedule Slots',
+                'ordering': ['weekday', 'start_time'],
+                'indexes': [models.Index(fields=['course', 'weekday', 'start_time'], name='slot_course_day_start_idx'), models.Index(fields=['weekday', 'start_time', 'end_time'], name='slot_day_period_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# 迁移不导入应用代码 (courses.schedule 以后的修改不能改变历史迁移的结果)，这里保留当时的位图编码
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES # 96
+WEEK_BITMAP_BYTES = (7 * SLOTS_PER_DAY + 7) // 8 # 84
+
+
+def encode_week(value):
+    return value.to_bytes(WEEK_BITMAP_BYTES, 'big')
+
+
+def week_mask(slots):
+    mask = 0
+    for slot in slots:
+        first = (slot.start_time.hour * 60 + slot.start_time.minute) // SLOT_MINUTES
+        end_minutes = slot.end_time.hour * 60 + slot.end_time.minute + (1 if slot.end_time.second or slot.end_time.microsecond else 0)
+        last = min(SLOTS_PER_DAY, -(-end_minutes // SLOT_MINUTES))
+        if last > first:
+            mask |= ((1 << (last - first)) - 1) << (slot.weekday * SLOTS_PER_DAY + first)
+    return mask
+
+
+def backfill_bitmaps(apps, schema_editor):
+    # 由已有的 ScheduleSlot 计算课程位图，再按选课记录合成学生位图
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    ScheduleSlot = apps.get_model('courses', 'ScheduleSlot')
+    StudentTimetable = apps.get_model('courses', 'StudentTimetable')
+
+    slots_by_course = {}
+    for slot in ScheduleSlot.objects.only('course_id', 'weekday', 'start_time', 'end_time').iterator():
+        slots_by_course.setdefault(slot.course_id, []).append(slot)
+    masks = {course_id: week_mask(slots) for course_id, slots in slots_by_course.items()}
+    courses = list(Course.objects.filter(pk__in=list(masks)).only('pk'))
+    for course in courses:
+        course.schedule_mask = encode_week(masks[course.pk])
+    Course.objects.bulk_update(courses, ['schedule_mask'], batch_size=500)
+
+    bitmaps = {}
+    overlaps = set()
+    for student_id, course_id in Enrollment.objects.filter(course_id__in=list(masks)).values_list('student_id', 'course_id').iterator():
+        busy = bitmaps.get(student_id, 0)
+        if busy & masks[course_id]:
+            overlaps.add(student_id)
+        bitmaps[student_id] = busy | masks[course_id]
+    StudentTimetable.objects.bulk_create(
+        [StudentTimetable(student_id=student_id, bitmap=encode_week(bitmap), has_overlaps=student_id in overlaps)
+         for student_id, bitmap in bitmaps.items() if bitmap],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_schedule_slots'),
+        ('users', '0005_denormalized_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentTimetable',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='timetable', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('bitmap', models.BinaryField(default=b'', max_length=84, verbose_name='Weekly Busy Bitmap')),
+                ('has_overlaps', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Student Timetable',
+                'verbose_name_plural': 'Student Timetables',
+            },
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='schedule_mask',
+            field=models.BinaryField(default=b'', max_length=84, verbose_name='Weekly Schedule Bitmap'),
+        ),
+        migrations.RunPython(backfill_bitmaps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:22
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# 迁移不导入应用代码 (courses.grade_scale 以后调整换算规则时，重算用 rebuild_transcripts)，这里保留当时的换算
+LETTER_POINTS = {
+    'A+': Decimal('4.0'), 'A': Decimal('4.0'), 'A-': Decimal('3.7'),
+    'B+': Decimal('3.3'), 'B': Decimal('3.0'), 'B-': Decimal('2.7'),
+    'C+': Decimal('2.3'), 'C': Decimal('2.0'), 'C-': Decimal('1.7'),
+    'D+': Decimal('1.3'), 'D': Decimal('1.0'), 'D-': Decimal('0.7'),
+    'F': Decimal('0.0'),
+}
+PERCENT_POINTS = [
+    (90, Decimal('4.0')), (85, Decimal('3.7')), (82, Decimal('3.3')), (78, Decimal('3.0')),
+    (75, Decimal('2.7')), (72, Decimal('2.3')), (68, Decimal('2.0')), (64, Decimal('1.5')),
+    (60, Decimal('1.0')), (0, Decimal('0.0')),
+]
+PASS_GRADES = {'P', 'PASS'}
+NO_PASS_GRADES = {'NP', 'FAIL'}
+
+
+def grade_value(grade):
+    # (绩点, 是否获得学分)，绩点为 None 表示不计入 GPA
+    grade = (grade or '').strip().upper()
+    if grade in LETTER_POINTS:
+        points = LETTER_POINTS[grade]
+        return points, points > 0
+    if grade in PASS_GRADES:
+        return None, True
+    if grade in NO_PASS_GRADES:
+        return None, False
+    try:
+        score = Decimal(grade)
+    except ArithmeticError:
+        return None, False
+    if not score.is_finite() or not 0 <= score <= 100:
+        return None, False
+    points = next(points for minimum, points in PERCENT_POINTS if score >= minimum)
+    return points, score >= 60
+
+
+def contribution(grade, credits):
+    if not grade or not credits:
+        return Decimal('0'), 0, 0
+    points, earns_credit = grade_value(grade)
+    if points is None:
+        return Decimal('0'), 0, credits if earns_credit else 0
+    return points * credits, credits, credits if earns_credit else 0
+
+
+def backfill_transcripts(apps, schema_editor):
+    # 按已有的选课成绩计算每个学生的累加值
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    StudentTranscript = apps.get_model('courses', 'StudentTranscript')
+
+    totals = {}
+    enrollments = Enrollment.objects.exclude(grade__isnull=True).exclude(grade='').values_list('student_id', 'grade', 'course__credits')
+    for student_id, grade, credits in enrollments.iterator():
+        total = totals.setdefault(student_id, [0, 0, 0])
+        for i, value in enumerate(contribution(grade, credits)):
+            total[i] += value
+    StudentTranscript.objects.bulk_create(
+        [StudentTranscript(student_id=student_id, quality_points=points, gpa_credits=gpa_credits, credits_earned=earned)
+         for student_id, (points, gpa_credits, earned) in totals.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_timetable_bitmaps'),
+        ('users', '0005_denormalized_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentTranscript',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='transcript', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('quality_points', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Quality Points')),
+                ('gpa_credits', models.PositiveIntegerField(default=0, verbose_name='GPA Credits')),
+                ('credits_earned', models.PositiveIntegerField(default=0, verbose_name='Credits Earned')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Student Transcript',
+                'verbose_name_plural': 'Student Transcripts',
+            },
+        ),
+        migrations.RunPython(backfill_transcripts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:25
+
+import django.core.validators
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_student_transcripts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='category',
+            field=models.CharField(blank=True, help_text='e.g. Homework, Quiz. The lowest scores within a category can be dropped.', max_length=50, verbose_name='Category'),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='max_score',
+            field=models.DecimalField(decimal_places=2, default=100, max_digits=6, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))], verbose_name='Maximum Score'),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='weight',
+            field=models.DecimalField(decimal_places=2, default=1, help_text='Relative weight of this assignment in the final grade.', max_digits=6, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Weight'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='drop_lowest',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Number of lowest assignment scores dropped in each assignment category when computing final grades.', verbose_name='Drop Lowest'),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='score',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Score'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:37
+
+import courses.storage
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_chunked_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Name')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Size')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='References')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('saved_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Stored File',
+                'verbose_name_plural': 'Stored Files',
+            },
+        ),
+        migrations.AlterField(
+            model_name='assignment',
+            name='assignment_file',
+            field=models.FileField(blank=True, null=True, storage=courses.storage.get_blob_storage, upload_to='assignments/prompts/%Y/%m/%d/', verbose_name='Assignment File (Optional)'),
+        ),
+        migrations.AlterField(
+            model_name='coursematerial',
+            name='file',
+            field=models.FileField(storage=courses.storage.get_blob_storage, upload_to='course_materials/%Y/%m/%d/', verbose_name='File'),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='submitted_file',
+            field=models.FileField(storage=courses.storage.get_blob_storage, upload_to='assignments/submissions/%Y/%m/%d/', verbose_name='Submitted File'),
+        ),
+    ]
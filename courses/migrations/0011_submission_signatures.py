@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionSignature',
+            fields=[
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='courses.submission')),
+                ('signature', models.BinaryField(max_length=512, verbose_name='MinHash Signature')),
+                ('shingle_count', models.PositiveIntegerField(verbose_name='Shingles')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signatures', to='courses.assignment')),
+            ],
+            options={
+                'verbose_name': 'Submission Signature',
+                'verbose_name_plural': 'Submission Signatures',
+            },
+        ),
+    ]
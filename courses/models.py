@@ -1,9 +1,16 @@
 # courses/models.py
 from django.db import models
 # Create your models here.
+from decimal import Decimal
+import uuid
 from django.conf import settings # 用于导入 AUTH_USER_MODEL
+from django.core.validators import MinValueValidator
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .grade_scale import compute_gpa
+from .storage import get_blob_storage
+
 class Class(models.Model): # 代表一个学生群体，例如“高一(1)班”
     name = models.CharField(_('Class Name'), max_length=100, unique=True) # 班级名称
     # 考虑链接到一个 'GradeLevel' (年级) 模型，或者只是一个 CharField
@@ -17,6 +24,8 @@ class Class(models.Model): # 代表一个学生群体，例如“高一(1)班”
         related_name='advised_classes',
         verbose_name=_('Class Advisor') # 班主任
     )
+    # 冗余存储的班级人数，由 courses.signals / users.signals 在 StudentProfile 变动时增量维护
+    student_count = models.PositiveIntegerField(_('Number of Students'), default=0, editable=False)
     # 将 StudentProfile 链接到 Class
     # students = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='classes_enrolled_in', limit_choices_to={'role':'student'}, blank=True)
     # 如果一个学生只属于一个班级，那么在 StudentProfile 中使用 ForeignKey 会更好
@@ -55,6 +64,22 @@ class Course(models.Model):
         help_text=_('Enter course schedule details (e.g., Mon 10:00-12:00, Room A101; Wed 14:00-16:00, Online)')
     )
 
+    # 冗余存储的选课人数，避免列表页逐门课 COUNT；由 courses.signals 在选课/退课时增量维护，
+    # 出现偏差时运行 reconcile_counts 修正
+    enrollment_count = models.PositiveIntegerField(_('Enrolled Students'), default=0, editable=False)
+    capacity = models.PositiveIntegerField(
+        _('Capacity'), null=True, blank=True,
+        help_text=_('Maximum number of enrolled students. Leave empty for no limit; extra students join the waitlist.')
+    ) # 课程容量
+    # 上课时间的周位图 (见 courses.schedule.week_mask)，与 ScheduleSlot 一起由 sync_schedule_slots 维护，
+    # 选课时直接与学生的 StudentTimetable 按位与，不必再查询时间段
+    schedule_mask = models.BinaryField(_('Weekly Schedule Bitmap'), max_length=84, default=b'', editable=False)
+    # 计算总评时每个作业类别去掉的最低分个数 (见 courses.gradebook)
+    drop_lowest = models.PositiveSmallIntegerField(
+        _('Drop Lowest'), default=0,
+        help_text=_('Number of lowest assignment scores dropped in each assignment category when computing final grades.')
+    )
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
 
@@ -80,13 +105,196 @@ class Enrollment(models.Model):
     def __str__(self):
         return f"{self.student.username} enrolled in {self.course.title}" # 某某学生选了某某课程
 
+class ScheduleSlot(models.Model):
+    """
+    课程每周的一个上课时间段，由 Course.schedule_information 解析得到 (见 courses.schedule)。
+    schedule_information 改变时由 courses.signals 重新生成；已有数据用 backfill_schedule_slots 回填。
+    """
+    WEEKDAY_CHOICES = [
+        (0, _('Monday')), (1, _('Tuesday')), (2, _('Wednesday')), (3, _('Thursday')),
+        (4, _('Friday')), (5, _('Saturday')), (6, _('Sunday')),
+    ]
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='schedule_slots') # 课程
+    weekday = models.PositiveSmallIntegerField(_('Weekday'), choices=WEEKDAY_CHOICES) # 星期几，周一 = 0
+    start_time = models.TimeField(_('Start Time')) # 开始时间
+    end_time = models.TimeField(_('End Time')) # 结束时间
+    # 文本中的上课地点能匹配到场所名称时关联 Venue，否则 (例如 "Online") 只保留原文
+    venue = models.ForeignKey('venues.Venue', on_delete=models.SET_NULL, null=True, blank=True, related_name='schedule_slots', verbose_name=_('Venue'))
+    location = models.CharField(_('Location'), max_length=255, blank=True)
+
+    class Meta:
+        verbose_name = _('Schedule Slot') # 上课时间段
+        verbose_name_plural = _('Schedule Slots')
+        ordering = ['weekday', 'start_time']
+        indexes = [
+            # 课表按课程取出时间段；"周一 10:00 有什么课" 按 weekday + 时间查询
+            models.Index(fields=['course', 'weekday', 'start_time'], name='slot_course_day_start_idx'),
+            models.Index(fields=['weekday', 'start_time', 'end_time'], name='slot_day_period_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.course.code} {self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+class WaitlistEntry(models.Model):
+    """
+    课程满员后的候补名单，按加入时间先进先出；有学生退课时由 courses.services 自动递补。
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='waitlist') # 课程
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        limit_choices_to={'role': 'student'},
+        related_name='waitlist_entries'
+    ) # 学生
+    created_at = models.DateTimeField(auto_now_add=True) # 加入候补的时间
+
+    class Meta:
+        unique_together = ('student', 'course')
+        ordering = ['created_at', 'pk']
+        verbose_name = _('Waitlist Entry') # 候补记录
+        verbose_name_plural = _('Waitlist Entries')
+        indexes = [
+            # 递补时按课程取最早的一条
+            models.Index(fields=['course', 'created_at'], name='waitlist_course_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} waiting for {self.course.title}"
+
+class StudentTimetable(models.Model):
+    """
+    学生已选课程的每周占用位图 (所有已选课程 Course.schedule_mask 的按位或)，用于选课时的时间冲突检测。
+    由 courses.signals 在选课/退课时增量维护；出现偏差时运行 rebuild_timetables 重建。
+    has_overlaps 表示已选课程之间本身有重叠 (例如管理员手动添加)，这时退课不能简单清除对应的位，需要重算。
+    """
+    student = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='timetable'
+    ) # 学生
+    bitmap = models.BinaryField(_('Weekly Busy Bitmap'), max_length=84, default=b'')
+    has_overlaps = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = _('Student Timetable') # 学生课表位图
+        verbose_name_plural = _('Student Timetables')
+
+    def __str__(self):
+        return f"Timetable of {self.student.username}"
+
+class StudentTranscript(models.Model):
+    """
+    学生成绩单的汇总值 (换算规则见 courses.grade_scale)，保存累加和而不是 GPA 本身，
+    成绩变动时只需加减这一条选课记录的贡献。由 courses.signals 增量维护，
+    批量改成绩、课程学分变化时按学生重算；出现偏差时运行 rebuild_transcripts 重建。
+    """
+    student = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='transcript'
+    ) # 学生
+    quality_points = models.DecimalField(_('Quality Points'), max_digits=10, decimal_places=2, default=0) # Σ 绩点 × 学分
+    gpa_credits = models.PositiveIntegerField(_('GPA Credits'), default=0) # 计入 GPA 的学分
+    credits_earned = models.PositiveIntegerField(_('Credits Earned'), default=0) # 已获得的学分
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Student Transcript') # 学生成绩单汇总
+        verbose_name_plural = _('Student Transcripts')
+
+    def __str__(self):
+        return f"Transcript of {self.student.username}"
+
+    @property
+    def gpa(self):
+        return compute_gpa(self.quality_points, self.gpa_credits)
+
+class UploadSession(models.Model):
+    """
+    一次可续传的分片上传 (见 courses.uploads)。分片写入 UPLOAD_SESSION_ROOT 下的临时文件，
+    全部到齐后存入目标 FileField：作业提交 (assignment) 或课程资料 (course)。
+    """
+    TARGET_SUBMISSION = 'submission'
+    TARGET_MATERIAL = 'material'
+    TARGET_CHOICES = [(TARGET_SUBMISSION, _('Submission')), (TARGET_MATERIAL, _('Course Material'))]
+    STATUS_ACTIVE = 'active'
+    STATUS_COMPLETE = 'complete'
+    STATUS_CHOICES = [(STATUS_ACTIVE, _('Active')), (STATUS_COMPLETE, _('Complete'))]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False) # 不可猜测，出现在上传地址中
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions') # 上传者
+    target = models.CharField(_('Target'), max_length=20, choices=TARGET_CHOICES)
+    assignment = models.ForeignKey('Assignment', on_delete=models.CASCADE, null=True, blank=True, related_name='upload_sessions')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True, related_name='upload_sessions')
+    title = models.CharField(_('Title'), max_length=200, blank=True) # 课程资料的标题和描述
+    description = models.TextField(_('Description'), blank=True)
+    filename = models.CharField(_('File Name'), max_length=255)
+    size = models.PositiveBigIntegerField(_('Size')) # 字节
+    part_size = models.PositiveIntegerField(_('Part Size')) # 创建时的分片大小，之后修改设置不影响进行中的会话
+    sha256 = models.CharField(_('SHA-256'), max_length=64, blank=True) # 客户端声明的整体校验和 (可选)
+    status = models.CharField(_('Status'), max_length=20, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True) # 最后活动时间，过期清理依据
+
+    class Meta:
+        verbose_name = _('Upload Session') # 分片上传会话
+        verbose_name_plural = _('Upload Sessions')
+
+    def __str__(self):
+        return f"Upload of {self.filename} by {self.user.username}"
+
+    @property
+    def total_parts(self):
+        return -(-self.size // self.part_size)
+
+    def expected_part_size(self, number):
+        return min(self.part_size, self.size - number * self.part_size)
+
+
+class UploadPart(models.Model):
+    """上传会话中已收到的一个分片 (编号从 0 开始) 及其 SHA-256"""
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='parts')
+    number = models.PositiveIntegerField(_('Part Number'))
+    size = models.PositiveIntegerField(_('Size'))
+    sha256 = models.CharField(_('SHA-256'), max_length=64)
+
+    class Meta:
+        unique_together = ('session', 'number')
+        verbose_name = _('Upload Part') # 上传分片
+        verbose_name_plural = _('Upload Parts')
+
+    def __str__(self):
+        return f"Part {self.number} of {self.session_id}"
+
+class StoredBlob(models.Model):
+    """
+    内容寻址存储 (courses.storage) 中的一个文件。ref_count 是引用它的 FileField 数，
+    由 courses.signals 增量维护，为 0 时文件被删除；出现偏差时运行 reconcile_blobs。
+    """
+    name = models.CharField(_('Name'), max_length=100, unique=True) # 存储中的文件名 blobs/xx/<sha256><扩展名>
+    sha256 = models.CharField(_('SHA-256'), max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField(_('Size')) # 字节
+    ref_count = models.PositiveIntegerField(_('References'), default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    saved_at = models.DateTimeField(default=timezone.now) # 最近一次有人上传这份内容的时间
+
+    class Meta:
+        verbose_name = _('Stored File') # 去重存储的文件
+        verbose_name_plural = _('Stored Files')
+
+    def __str__(self):
+        return self.name
+
 # 其他模型: Grade (成绩), CourseMaterial (课程资料), Assignment (作业), Submission (提交记录) (根据你的 ERD)
 
 
 class CourseMaterial(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='materials')
     title = models.CharField(_('Title'), max_length=200)
-    file = models.FileField(_('File'), upload_to='course_materials/%Y/%m/%d/')
+    # 三个 FileField 都按内容去重存储 (courses.storage)，upload_to 的目录不再使用
+    file = models.FileField(_('File'), upload_to='course_materials/%Y/%m/%d/', storage=get_blob_storage)
     description = models.TextField(_('Description'), blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='uploaded_materials')
@@ -100,7 +308,17 @@ class Assignment(models.Model):
     description = models.TextField(_('Description'))
     due_date = models.DateTimeField(_('Due Date'))
     created_at = models.DateTimeField(auto_now_add=True)
-    assignment_file = models.FileField(_('Assignment File (Optional)'), upload_to='assignments/prompts/%Y/%m/%d/', blank=True, null=True)
+    assignment_file = models.FileField(_('Assignment File (Optional)'), upload_to='assignments/prompts/%Y/%m/%d/', storage=get_blob_storage, blank=True, null=True)
+    # 总评计算 (courses.gradebook)：得分率 = Submission.score / max_score，按 weight 加权
+    max_score = models.DecimalField(_('Maximum Score'), max_digits=6, decimal_places=2, default=100, validators=[MinValueValidator(Decimal('0.01'))])
+    weight = models.DecimalField(
+        _('Weight'), max_digits=6, decimal_places=2, default=1, validators=[MinValueValidator(0)],
+        help_text=_('Relative weight of this assignment in the final grade.')
+    )
+    category = models.CharField(
+        _('Category'), max_length=50, blank=True,
+        help_text=_('e.g. Homework, Quiz. The lowest scores within a category can be dropped.')
+    )
 
     def __str__(self):
         return self.title
@@ -118,9 +336,10 @@ class Submission(models.Model):
         limit_choices_to={'role': 'student'}, 
         related_name='assignment_submissions'
     )
-    submitted_file = models.FileField(_('Submitted File'), upload_to='assignments/submissions/%Y/%m/%d/')
+    submitted_file = models.FileField(_('Submitted File'), upload_to='assignments/submissions/%Y/%m/%d/', storage=get_blob_storage)
     submitted_at = models.DateTimeField(auto_now_add=True)
     grade = models.CharField(_('Grade'), max_length=100, blank=True, null=True) # Increased length for more detailed grades/feedback
+    score = models.DecimalField(_('Score'), max_digits=6, decimal_places=2, blank=True, null=True, validators=[MinValueValidator(0)]) # 数值分数，用于计算总评
     feedback = models.TextField(_('Feedback'), blank=True, null=True)
     
     def __str__(self):
@@ -137,4 +356,24 @@ class Submission(models.Model):
     class Meta:
         unique_together = ('assignment', 'student')
         verbose_name = _('Submission')
-        verbose_name_plural = _('Submissions')
\ No newline at end of file
+        verbose_name_plural = _('Submissions')
+
+
+class SubmissionSignature(models.Model):
+    """
+    作业提交文本的 MinHash 签名 (courses.similarity)，用于查重。提交的文件改变时由 courses.signals 重新计算；
+    已有数据用 rebuild_signatures 回填。没有可比较文本的提交没有签名。
+    """
+    submission = models.OneToOneField(Submission, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    # 冗余保存作业，查重时按作业取出全部签名不需要 JOIN
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='signatures')
+    signature = models.BinaryField(_('MinHash Signature'), max_length=512) # 128 个 uint32 (小端)
+    shingle_count = models.PositiveIntegerField(_('Shingles')) # 文本中不同 shingle 的个数
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Submission Signature') # 提交的查重签名
+        verbose_name_plural = _('Submission Signatures')
+
+    def __str__(self):
+        return f"Signature of submission {self.submission_id}"
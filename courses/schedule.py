@@ -0,0 +1,167 @@
+# courses/schedule.py
+"""
+把 Course.schedule_information 这类自由文本解析成结构化的上课时间段。
+
+解析尽量宽容，能识别例如：
+    "Mon 10:00-12:00, Room A101; Wed 14:00-16:00, Online"
+    "Mon/Wed 9-10:30 Lecture Hall A"
+    "Tue, Thu 2pm-4pm"
+    "周一 10:00~12:00 A101"
+    "Mon-Fri 08:00 to 09:00"
+无法识别的片段会被忽略 (parse_schedule 返回值中单独列出)，不会抛出异常。
+"""
+from collections import namedtuple
+from datetime import time
+import re
+
+ParsedSlot = namedtuple('ParsedSlot', ['weekday', 'start_time', 'end_time', 'location'])
+
+# weekday 与 datetime.weekday() 一致：周一 = 0
+_EN_DAYS = {'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6}
+_ZH_DAYS = {'一': 0, '二': 1, '三': 2, '四': 3, '五': 4, '六': 5, '日': 6, '天': 6}
+
+DAY_RE = re.compile(
+    r'(?<![a-z])(mon(?:day)?|tue(?:s(?:day)?)?|wed(?:nesday)?|thu(?:r(?:s(?:day)?)?)?|fri(?:day)?|sat(?:urday)?|sun(?:day)?)(?![a-z])'
+    r'|(?:周|星期)([一二三四五六日天])',
+    re.IGNORECASE,
+)
+_TIME = r'(\d{1,2})(?:[:.：](\d{2}))?\s*([ap]\.?m\.?)?'
+# 前后不能紧挨着其他数字，否则 "Room 2-101" 这类房间号会被当成 02:00-10:00
+RANGE_RE = re.compile(r'(?<![\d:.：])' + _TIME + r'\s*(?:-|–|—|~|～|to|至)\s*' + _TIME + r'(?![\d:.：]?\d)', re.IGNORECASE)
+DAY_RANGE_SEPARATOR_RE = re.compile(r'\s*(?:-|–|—|~|to|至)\s*$', re.IGNORECASE)
+SEGMENT_SEPARATOR_RE = re.compile(r'[;；\n]+')
+LOCATION_STRIP = ' \t,，、;:@|-–()[]'
+# 两个时间段之间出现这样的文字说明已经进入地点部分
+LOCATION_WORD_RE = re.compile(r'[^\W\d_]')
+RANGE_JOINER_RE = re.compile(r'\band\b|和|及', re.IGNORECASE)
+
+
+def _day_index(match):
+    if match.group(1):
+        return _EN_DAYS[match.group(1)[:3].lower()]
+    return _ZH_DAYS[match.group(2)]
+
+
+def _to_time(hour, minute, meridiem):
+    hour = int(hour)
+    minute = int(minute or 0)
+    if meridiem:
+        meridiem = meridiem[0].lower()
+        if hour > 12:
+            return None
+        if meridiem == 'p' and hour < 12:
+            hour += 12
+        elif meridiem == 'a' and hour == 12:
+            hour = 0
+    if hour > 23 or minute > 59:
+        return None
+    return time(hour, minute)
+
+
+def _parse_range(match):
+    start_hour, start_minute, start_meridiem, end_hour, end_minute, end_meridiem = match.groups()
+    # "2-4pm"：开始时间没写上下午时沿用结束时间的
+    start = _to_time(start_hour, start_minute, start_meridiem or end_meridiem)
+    end = _to_time(end_hour, end_minute, end_meridiem)
+    if start is not None and end is not None and start_meridiem is None and end_meridiem and start >= end:
+        start = _to_time(start_hour, start_minute, None)
+    if start is None or end is None or start >= end:
+        return None
+    return start, end
+
+
+def _parse_days(text):
+    """取出文本中的星期，支持 "Mon/Wed"、"Tue, Thu" 和范围 "Mon-Fri"。"""
+    days = []
+    previous_end = None
+    for match in DAY_RE.finditer(text):
+        day = _day_index(match)
+        if days and previous_end is not None and DAY_RANGE_SEPARATOR_RE.match(text[previous_end:match.start()] + ' '):
+            first = days[-1]
+            days.extend(d % 7 for d in range(first + 1, first + 1 + (day - first) % 7))
+        elif day not in days:
+            days.append(day)
+        previous_end = match.end()
+    return list(dict.fromkeys(days))
+
+
+def _split_clauses(segment):
+    """
+    一个片段中可能连着写多组 "星期 时间 地点"，例如 "Mon 10-12, A101, Wed 14-16, Online"。
+    在第二个及以后的时间段之前如果出现了星期，就从第一个星期处切开。
+    """
+    ranges = list(RANGE_RE.finditer(segment))
+    cuts = [0]
+    for previous, current in zip(ranges, ranges[1:]):
+        day = DAY_RE.search(segment, previous.end(), current.start())
+        if day:
+            cuts.append(day.start())
+    cuts.append(len(segment))
+    return [segment[a:b] for a, b in zip(cuts, cuts[1:])]
+
+
+def _time_ranges(clause):
+    """
+    片段中的时间段。第一个时间段之后只接受紧跟着 (中间只有标点或 and / 和) 的时间段，
+    地点文字之后的数字 (例如 "Mon 9-11 Room 2-3") 不是时间；地点取最后一个时间段之后的文字。
+    """
+    matches = []
+    for match in RANGE_RE.finditer(clause):
+        if matches and LOCATION_WORD_RE.search(RANGE_JOINER_RE.sub('', clause[matches[-1].end():match.start()])):
+            break
+        matches.append(match)
+    return matches
+
+
+def parse_schedule(text):
+    """
+    解析上课时间文本，返回 (slots, unparsed)：slots 为 ParsedSlot 列表 (按 weekday、开始时间排序并去重)，
+    unparsed 为无法识别的片段，方便导入/回填时给出提示。
+    """
+    slots = []
+    unparsed = []
+    inherited_days = []
+    for segment in SEGMENT_SEPARATOR_RE.split(text or ''):
+        for clause in _split_clauses(segment):
+            if not clause.strip(LOCATION_STRIP):
+                continue
+            ranges = [(match, _parse_range(match)) for match in _time_ranges(clause)]
+            ranges = [(match, period) for match, period in ranges if period]
+            days = _parse_days(clause[:ranges[0][0].start()]) if ranges else []
+            days = days or inherited_days # "Mon 10-12, 14-16" 这类写法沿用前面的星期
+            if not ranges or not days:
+                unparsed.append(clause.strip(LOCATION_STRIP))
+                continue
+            inherited_days = days
+            location = clause[ranges[-1][0].end():].strip(LOCATION_STRIP)
+            for _, (start, end) in ranges:
+                slots.extend(ParsedSlot(day, start, end, location) for day in days)
+    return sorted(set(slots), key=lambda slot: (slot.weekday, slot.start_time, slot.end_time)), unparsed
+
+
+# ---- 每周占用位图 ----
+# 一周 7 × 96 格 (15 分钟一格)，第 weekday * 96 + i 位表示该天 [i*15min, (i+1)*15min) 有课。
+# 与 venues 的忙闲位图一样是"保守"的：与某格有交集就置位。
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES # 96
+WEEK_BITMAP_BYTES = (7 * SLOTS_PER_DAY + 7) // 8 # 84
+
+
+def encode_week(value):
+    return value.to_bytes(WEEK_BITMAP_BYTES, 'big')
+
+
+def decode_week(raw):
+    return int.from_bytes(raw, 'big') if raw else 0
+
+
+def week_mask(slots):
+    """把一组时间段 (有 weekday、start_time、end_time 属性，例如 ScheduleSlot / ParsedSlot) 合成一个周位图。"""
+    mask = 0
+    for slot in slots:
+        first = (slot.start_time.hour * 60 + slot.start_time.minute) // SLOT_MINUTES
+        end_minutes = slot.end_time.hour * 60 + slot.end_time.minute + (1 if slot.end_time.second or slot.end_time.microsecond else 0)
+        last = min(SLOTS_PER_DAY, -(-end_minutes // SLOT_MINUTES))
+        if last > first:
+            mask |= ((1 << (last - first)) - 1) << (slot.weekday * SLOTS_PER_DAY + first)
+    return mask
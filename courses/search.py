@@ -0,0 +1,255 @@
+# courses/search.py
+"""
+课程代码/标题的进程内自动补全索引。
+
+CourseFilter 的 icontains 每敲一个键就要对整张 Course 表做前导通配 LIKE 扫描；自动补全改用内存索引：
+    - 排序的课程代码列表：代码前缀匹配用二分查找，结果天然按代码排序；
+    - 排序的词表 + 词 -> 课程 id 集合：标题/代码中任一词的前缀匹配；
+    - 三元组 (trigram) -> 课程 id 集合：长度 >= 3 的查询词做词中间的子串匹配 (与 icontains 一致)。
+索引在 worker 启动时 (campushive/wsgi.py) 或第一次查询时构建，本进程内由 courses.signals 增量更新；
+其他 worker 的修改通过每 REFRESH_INTERVAL 秒一次的增量同步获得：按 updated_at 取变化的课程 (往回多看
+WATERMARK_OVERLAP，updated_at 在保存时取值，事务可能晚于更新的行提交)；课程总数与索引不一致时才比较 id 集合，
+找出删除或漏掉的课程。
+"""
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import timedelta
+import heapq
+import re
+import threading
+import time
+
+from .models import Course
+
+REFRESH_INTERVAL = 30 # 秒
+WATERMARK_OVERLAP = timedelta(minutes=2)
+MAX_SUGGESTIONS = 20
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    return ' '.join(WORD_RE.findall((text or '').lower()))
+
+
+def _code_key(code):
+    # 代码去掉空格和标点后比较，"CS-101" 与查询 "cs1" 能前缀匹配
+    return ''.join(WORD_RE.findall((code or '').lower()))
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _prefix_range(sorted_items, prefix):
+    """sorted_items 中以 prefix 开头的元素所在区间 [lo, hi)。"""
+    lo = bisect_left(sorted_items, prefix)
+    hi = bisect_left(sorted_items, prefix + '\U0010ffff', lo)
+    return lo, hi
+
+
+class CourseIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._clear()
+
+    def _clear(self):
+        self._entries = {} # id -> (code, title, code key)
+        self._haystacks = {} # id -> 规范化后的 "code title"，用于子串校验
+        self._codes = [] # 排序的 (code key, id)
+        self._code_keys = [] # 与 _codes 对应的 code key，供二分查找
+        self._words = defaultdict(set) # 词 -> 课程 id
+        self._sorted_words = []
+        self._trigrams = defaultdict(set) # 三元组 -> 课程 id
+        self._short_prefix_cache = {} # 一两个字母的前缀对应的 id 集合很大，合并一次后缓存，索引变化时清空
+        self._synced_at = 0.0
+        self._max_updated = None
+
+    # ---- 维护 ----
+    def build(self):
+        """从数据库整体 (重新) 构建索引。"""
+        with self._lock:
+            self._clear()
+            rows = Course.objects.values_list('pk', 'code', 'title', 'updated_at').order_by('pk')
+            for pk, code, title, updated_at in rows.iterator(chunk_size=2000):
+                self._add(pk, code, title, sort=False)
+                self._track(updated_at)
+            # 逐条有序插入是 O(n²)，整体构建时先追加再统一排序
+            self._codes.sort()
+            self._code_keys = [code_key for code_key, _ in self._codes]
+            self._sorted_words = sorted(self._words)
+            self._built = True
+            self._synced_at = time.monotonic()
+
+    def ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def add(self, pk, code, title, updated_at=None):
+        """新增或更新一门课程；索引尚未构建时什么也不做 (构建时会读到它)。"""
+        with self._lock:
+            if not self._built:
+                return
+            self._remove(pk)
+            self._add(pk, code, title)
+            self._track(updated_at)
+
+    def remove(self, pk):
+        with self._lock:
+            if self._built:
+                self._remove(pk)
+
+    def _track(self, updated_at):
+        if updated_at is not None and (self._max_updated is None or updated_at > self._max_updated):
+            self._max_updated = updated_at
+
+    def _add(self, pk, code, title, sort=True):
+        code_key = _code_key(code)
+        haystack = normalize(f'{code} {title}')
+        self._entries[pk] = (code, title, code_key)
+        self._haystacks[pk] = haystack
+        self._short_prefix_cache.clear()
+        if sort:
+            position = bisect_left(self._codes, (code_key, pk))
+            self._codes.insert(position, (code_key, pk))
+            self._code_keys.insert(position, code_key)
+        else:
+            self._codes.append((code_key, pk))
+        for word in set(haystack.split()):
+            if sort and not self._words[word]:
+                insort(self._sorted_words, word)
+            self._words[word].add(pk)
+        for trigram in _trigrams(haystack):
+            self._trigrams[trigram].add(pk)
+
+    def _remove(self, pk):
+        entry = self._entries.pop(pk, None)
+        if entry is None:
+            return
+        haystack = self._haystacks.pop(pk)
+        self._short_prefix_cache.clear()
+        position = bisect_left(self._codes, (entry[2], pk))
+        del self._codes[position]
+        del self._code_keys[position]
+        for word in set(haystack.split()):
+            ids = self._words[word]
+            ids.discard(pk)
+            if not ids:
+                del self._words[word]
+                del self._sorted_words[bisect_left(self._sorted_words, word)]
+        for trigram in _trigrams(haystack):
+            ids = self._trigrams[trigram]
+            ids.discard(pk)
+            if not ids:
+                del self._trigrams[trigram]
+
+    def refresh(self, force=False):
+        """
+        与数据库同步其他进程的修改：取出 updated_at 晚于 (水位 - WATERMARK_OVERLAP) 的课程，内容变了的逐条更新；
+        再用一条 COUNT 检查课程数，与索引不一致时才读出全部 id，移除已删除的课程、补上漏掉的课程。
+        没有删除时每次同步只有两条查询。每 REFRESH_INTERVAL 秒最多执行一次。
+        """
+        with self._lock:
+            if not self._built:
+                self.build()
+                return
+            if not force and time.monotonic() - self._synced_at < REFRESH_INTERVAL:
+                return
+            changed = Course.objects.values_list('pk', 'code', 'title', 'updated_at')
+            if self._max_updated is not None:
+                changed = changed.filter(updated_at__gt=self._max_updated - WATERMARK_OVERLAP)
+            for pk, code, title, updated_at in changed:
+                entry = self._entries.get(pk)
+                if entry is None or entry[:2] != (code, title): # 回看窗口内已经同步过的课程不重复更新
+                    self._remove(pk)
+                    self._add(pk, code, title)
+                self._track(updated_at)
+            if Course.objects.count() != len(self._entries):
+                current = set(Course.objects.values_list('pk', flat=True))
+                for pk in set(self._entries) - current:
+                    self._remove(pk)
+                missing = current - set(self._entries)
+                if missing:
+                    for pk, code, title, updated_at in Course.objects.filter(pk__in=missing).values_list('pk', 'code', 'title', 'updated_at'):
+                        self._add(pk, code, title)
+                        self._track(updated_at)
+            self._synced_at = time.monotonic()
+
+    # ---- 查询 ----
+    def _word_prefix_ids(self, term):
+        """有以 term 开头的词的课程 (返回的集合不能修改)。"""
+        ids = self._short_prefix_cache.get(term)
+        if ids is None:
+            lo, hi = _prefix_range(self._sorted_words, term)
+            ids = set().union(*(self._words[word] for word in self._sorted_words[lo:hi]))
+            if len(term) <= 2:
+                self._short_prefix_cache[term] = ids
+        return ids
+
+    def _trigram_candidates(self, term):
+        """包含 term 全部三元组的课程 (未校验，可能有误报)。"""
+        grams = sorted(_trigrams(term), key=lambda gram: len(self._trigrams.get(gram, ())))
+        if not grams or grams[0] not in self._trigrams:
+            return set()
+        ids = set(self._trigrams[grams[0]])
+        for gram in grams[1:]:
+            ids &= self._trigrams.get(gram, set())
+            if not ids:
+                break
+        return ids
+
+    def _first_by_code(self, ids, count, predicate=None):
+        """
+        ids 中 (满足 predicate 的) 按课程代码排序的前 count 个。候选很多 (例如只输入一两个字母) 时
+        顺着已排序的代码表找，很快就能凑够；predicate 只对实际检查到的课程调用。
+        """
+        if len(ids) > 50 * count:
+            return (pk for _, pk in self._codes if pk in ids and (predicate is None or predicate(pk)))
+        if predicate is not None:
+            ids = [pk for pk in ids if predicate(pk)]
+        return heapq.nsmallest(count, ids, key=lambda pk: (self._entries[pk][2], pk))
+
+    def suggest(self, query, limit=10):
+        """
+        返回最多 limit 条 (id, code, title)，排序依次为：代码以查询开头、每个查询词都是某个词的前缀、
+        每个查询词都出现在代码或标题中 (子串)；同一档内按课程代码排序。
+        """
+        query = normalize(query)
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        if not query:
+            return []
+        self.refresh()
+        with self._lock:
+            results = []
+            seen = set()
+
+            def take(ids_in_order):
+                for pk in ids_in_order:
+                    if pk not in seen:
+                        seen.add(pk)
+                        results.append(pk)
+                        if len(results) >= limit:
+                            return True
+                return False
+
+            lo, hi = _prefix_range(self._code_keys, _code_key(query))
+            if not take(pk for _, pk in self._codes[lo:min(hi, lo + limit)]):
+                terms = query.split()
+                prefix_sets = sorted((self._word_prefix_ids(term) for term in terms), key=len)
+                prefix_ids = set.intersection(*prefix_sets) - seen
+                if not take(self._first_by_code(prefix_ids, limit - len(results))):
+                    long_terms = [term for term in terms if len(term) >= 3]
+                    if long_terms:
+                        candidates = set.intersection(*(self._trigram_candidates(term) for term in long_terms)) - seen
+                        take(self._first_by_code(
+                            candidates, limit - len(results),
+                            lambda pk: all(term in self._haystacks[pk] for term in terms),
+                        ))
+            return [(pk, *self._entries[pk][:2]) for pk in results]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 每个进程一个实例
+course_index = CourseIndex()
@@ -0,0 +1,369 @@
+# courses/services.py
+from decimal import Decimal
+
+import numpy as np
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Greatest
+
+from venues.models import Venue
+from .grade_scale import NO_CONTRIBUTION, compute_gpa, grade_value
+from .models import Course, Enrollment, ScheduleSlot, StudentTimetable, StudentTranscript, WaitlistEntry
+from .schedule import decode_week, encode_week, parse_schedule, week_mask
+
+# enroll_student 的结果
+ENROLLED = 'enrolled'
+WAITLISTED = 'waitlisted'
+ALREADY_ENROLLED = 'already_enrolled'
+ALREADY_WAITLISTED = 'already_waitlisted'
+CLASH = 'clash'
+
+
+def _claim_seat(course_id):
+    """
+    用一条带条件的 UPDATE 占一个座位 (enrollment_count + 1，前提是未满或不限容量)。
+    数据库保证并发请求不会同时拿到最后一个座位；返回是否成功。
+    """
+    return Course.objects.filter(
+        Q(capacity__isnull=True) | Q(enrollment_count__lt=F('capacity')), pk=course_id,
+    ).update(enrollment_count=F('enrollment_count') + 1) == 1
+
+
+def _create_enrollment(course_id, student_id):
+    enrollment = Enrollment(course_id=course_id, student_id=student_id)
+    enrollment._seat_claimed = True # 计数已在 _claim_seat 中增加，信号不再重复加
+    enrollment.save()
+    return enrollment
+
+
+def _timetable_clashes(student_id, mask):
+    """
+    锁住学生的课表位图并检查是否与 mask 重叠；同一学生的并发选课因此串行执行。
+    还没有课表行的学生先建一行 (与 add_to_timetable 相同)，否则 SELECT ... FOR UPDATE 什么也锁不住。
+    """
+    timetable, _ = StudentTimetable.objects.select_for_update().get_or_create(student_id=student_id)
+    return bool(decode_week(timetable.bitmap) & mask)
+
+
+def enroll_student(course, student, allow_clash=False):
+    """
+    选课：有空位则原子地占座并创建选课记录，满员则加入候补名单 (先进先出)。
+    上课时间与学生已选课程冲突时拒绝 (返回 CLASH)，除非 allow_clash。冲突检测只比较两个位图
+    (Course.schedule_mask 与 StudentTimetable.bitmap)，不随已选课程数和时间段数增长。
+    返回 ENROLLED / WAITLISTED / CLASH / ALREADY_ENROLLED / ALREADY_WAITLISTED 之一。
+    """
+    if Enrollment.objects.filter(course=course, student=student).exists():
+        return ALREADY_ENROLLED
+    mask = decode_week(course.schedule_mask)
+    try:
+        with transaction.atomic():
+            if mask and not allow_clash and _timetable_clashes(student.pk, mask):
+                return CLASH
+            if not _claim_seat(course.pk):
+                # 满员：锁住课程行再试一次，并在同一事务中排队。退课在这一行上减计数，要么先提交 (重试占座成功)，
+                # 要么等本事务提交后才递补 (能看到这条候补)，空出的座位不会因为候补还没提交而没人补
+                Course.objects.select_for_update().filter(pk=course.pk).values_list('pk', flat=True).first()
+                if not _claim_seat(course.pk):
+                    _, created = WaitlistEntry.objects.get_or_create(course=course, student=student)
+                    return WAITLISTED if created else ALREADY_WAITLISTED
+            _create_enrollment(course.pk, student.pk)
+            WaitlistEntry.objects.filter(course=course, student=student).delete()
+            return ENROLLED
+    except IntegrityError:
+        # 同一学生的并发重复提交：唯一约束拒绝第二条，事务回滚后占的座位也一并释放
+        return ALREADY_ENROLLED
+
+
+def clashing_courses(course, student):
+    """学生已选课程中与 course 上课时间冲突的课程，用于提示 (只在 enroll_student 返回 CLASH 后调用)。"""
+    mask = decode_week(course.schedule_mask)
+    if not mask:
+        return []
+    enrolled = Course.objects.filter(enrollments__student=student).exclude(pk=course.pk).only('code', 'title', 'schedule_mask')
+    return [other for other in enrolled if decode_week(other.schedule_mask) & mask]
+
+
+def promote_waitlist(course_id):
+    """
+    按候补顺序把学生补进空出的座位，直到满员或候补名单为空。返回被递补的学生 id 列表。
+    上课时间与学生 (排上候补之后) 已选课程冲突的条目跳过，留在候补名单中，不占座位。
+    """
+    promoted = []
+    skipped = []
+    mask = course_mask(course_id)
+    with transaction.atomic():
+        while True:
+            entry = (
+                WaitlistEntry.objects.select_for_update().filter(course_id=course_id).exclude(pk__in=skipped)
+                .order_by('created_at', 'pk').first()
+            )
+            if entry is None:
+                break
+            if Enrollment.objects.filter(course_id=course_id, student_id=entry.student_id).exists():
+                entry.delete() # 已经通过其他途径选上了
+                continue
+            if mask and _timetable_clashes(entry.student_id, mask):
+                skipped.append(entry.pk)
+                continue
+            if not _claim_seat(course_id):
+                break
+            _create_enrollment(course_id, entry.student_id)
+            entry.delete()
+            promoted.append(entry.student_id)
+    return promoted
+
+
+def drop_enrollment(enrollment):
+    """退课并在同一事务中递补候补名单。返回被递补的学生 id 列表。"""
+    with transaction.atomic():
+        enrollment.delete() # 信号把 enrollment_count 减 1
+        return promote_waitlist(enrollment.course_id)
+
+
+def waitlist_position(course, student):
+    """学生在候补名单中的位置 (从 1 开始)，不在名单中返回 None。一次查询：用子查询数出排在前面 (含自己) 的条目。"""
+    ahead = WaitlistEntry.objects.filter(course=OuterRef('course')).filter(
+        Q(created_at__lt=OuterRef('created_at')) | Q(created_at=OuterRef('created_at'), pk__lte=OuterRef('pk'))
+    ).order_by().values('course').annotate(count=Count('pk')).values('count')
+    return WaitlistEntry.objects.filter(course=course, student=student).annotate(
+        position=Subquery(ahead)
+    ).values_list('position', flat=True).first()
+
+
+def build_schedule_slots(course, venue_ids=None):
+    """
+    解析一门课的 schedule_information，返回 (未保存的 ScheduleSlot 列表, 无法识别的片段)。
+    venue_ids 为 {场所名小写: id}，批量回填时传入以避免每门课查询一次场所表。
+    """
+    parsed, unparsed = parse_schedule(course.schedule_information)
+    if venue_ids is None:
+        venue_ids = venue_name_index()
+    slots = [
+        ScheduleSlot(
+            course_id=course.pk, weekday=slot.weekday, start_time=slot.start_time, end_time=slot.end_time,
+            location=slot.location[:255], venue_id=venue_ids.get(slot.location.lower()),
+        )
+        for slot in parsed
+    ]
+    return slots, unparsed
+
+
+def venue_name_index():
+    return {name.lower(): pk for pk, name in Venue.objects.values_list('pk', 'name')}
+
+
+def sync_schedule_slots(course):
+    """
+    重新生成一门课的上课时间段 (先删后建，在同一事务中) 并更新 schedule_mask。
+    位图变化时重建已选该课学生的课表位图。
+    """
+    slots, _ = build_schedule_slots(course)
+    mask = encode_week(week_mask(slots))
+    with transaction.atomic():
+        ScheduleSlot.objects.filter(course_id=course.pk).delete()
+        ScheduleSlot.objects.bulk_create(slots)
+        previous = Course.objects.filter(pk=course.pk).values_list('schedule_mask', flat=True).first()
+        if decode_week(previous) != decode_week(mask):
+            Course.objects.filter(pk=course.pk).update(schedule_mask=mask)
+            rebuild_timetables(Enrollment.objects.filter(course_id=course.pk).values_list('student_id', flat=True))
+    course.schedule_mask = mask
+    return slots
+
+
+# ---- 学生课表位图 ----
+def course_mask(course_id):
+    return decode_week(Course.objects.filter(pk=course_id).values_list('schedule_mask', flat=True).first())
+
+
+def add_to_timetable(student_id, mask):
+    """选上一门课后把它的上课时间并入学生的课表位图。"""
+    if not mask:
+        return
+    with transaction.atomic():
+        timetable, _ = StudentTimetable.objects.select_for_update().get_or_create(student_id=student_id)
+        busy = decode_week(timetable.bitmap)
+        timetable.has_overlaps = timetable.has_overlaps or bool(busy & mask)
+        timetable.bitmap = encode_week(busy | mask)
+        timetable.save(update_fields=['bitmap', 'has_overlaps'])
+
+
+def remove_from_timetable(student_id, mask):
+    """
+    退课后从课表位图中清除该课的上课时间。已选课程互不重叠时直接清位；
+    有重叠 (has_overlaps) 时清位会误删其他课程的时间，改为按剩余课程重算该学生的位图。
+    """
+    if not mask:
+        return
+    with transaction.atomic():
+        timetable = StudentTimetable.objects.select_for_update().filter(student_id=student_id).first()
+        if timetable is None:
+            return
+        if timetable.has_overlaps:
+            rebuild_timetables([student_id])
+            return
+        timetable.bitmap = encode_week(decode_week(timetable.bitmap) & ~mask)
+        timetable.save(update_fields=['bitmap'])
+
+
+def rebuild_timetables(student_ids=None):
+    """
+    按已选课程重算课表位图 (student_ids 为 None 时重算全部学生)，一次查询读出相关选课及课程位图。
+    没有任何占用的学生删除对应行。返回写入的位图数。
+    """
+    enrollments = Enrollment.objects.values_list('student_id', 'course__schedule_mask')
+    stale = StudentTimetable.objects.all()
+    if student_ids is not None:
+        student_ids = list(student_ids)
+        if not student_ids:
+            return 0
+        enrollments = enrollments.filter(student_id__in=student_ids)
+        stale = stale.filter(student_id__in=student_ids)
+
+    bitmaps = {}
+    overlaps = set()
+    for student_id, raw in enrollments:
+        mask = decode_week(raw)
+        if not mask:
+            continue
+        busy = bitmaps.get(student_id, 0)
+        if busy & mask:
+            overlaps.add(student_id)
+        bitmaps[student_id] = busy | mask
+
+    with transaction.atomic():
+        stale.exclude(student_id__in=list(bitmaps)).delete()
+        StudentTimetable.objects.bulk_create(
+            [StudentTimetable(student_id=student_id, bitmap=encode_week(bitmap), has_overlaps=student_id in overlaps)
+             for student_id, bitmap in bitmaps.items()],
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=['bitmap', 'has_overlaps'],
+            batch_size=500,
+        )
+    return len(bitmaps)
+
+
+# ---- 成绩单 / GPA ----
+def course_credits(course_id):
+    return Course.objects.filter(pk=course_id).values_list('credits', flat=True).first() or 0
+
+
+def adjust_transcript(student_id, old=NO_CONTRIBUTION, new=NO_CONTRIBUTION):
+    """把一条选课记录的贡献从 old 改成 new：用 F() 原子地加减学生的累加值，不必重读其他选课记录。"""
+    delta = [n - o for n, o in zip(new, old)]
+    if not any(delta):
+        return
+    with transaction.atomic():
+        StudentTranscript.objects.get_or_create(student_id=student_id)
+        StudentTranscript.objects.filter(student_id=student_id).update(
+            quality_points=Greatest(F('quality_points') + delta[0], 0),
+            gpa_credits=Greatest(F('gpa_credits') + delta[1], 0),
+            credits_earned=Greatest(F('credits_earned') + delta[2], 0),
+        )
+
+
+def _graded_enrollments():
+    return Enrollment.objects.exclude(grade__isnull=True).exclude(grade='')
+
+
+def rebuild_transcripts(student_ids=None, department=None):
+    """
+    按选课成绩重算学生的成绩单汇总。student_ids 为 None 时重算全部学生；指定 department 时重算
+    在该院系选过课的所有学生 (GPA 包含他们在其他院系的课程)。
+    按 (学生, 成绩) 分组在数据库中汇总学分，每种不同的成绩只换算一次，再用 NumPy 按学生整体累加，
+    然后批量写入。返回写入的行数。
+    """
+    rows = _graded_enrollments()
+    stale = StudentTranscript.objects.all()
+    if department is not None:
+        students = Enrollment.objects.filter(course__department=department).values('student_id')
+        rows = rows.filter(student_id__in=students)
+        stale = stale.filter(student_id__in=students)
+    if student_ids is not None:
+        student_ids = list(student_ids)
+        if not student_ids:
+            return 0
+        rows = rows.filter(student_id__in=student_ids)
+        stale = stale.filter(student_id__in=student_ids)
+
+    grouped = rows.order_by().filter(course__credits__gt=0).values_list('student_id', 'grade').annotate(credits=Sum('course__credits'))
+    totals = _transcript_totals(list(grouped))
+
+    with transaction.atomic():
+        stale.exclude(student_id__in=list(totals)).delete()
+        StudentTranscript.objects.bulk_create(
+            [StudentTranscript(student_id=student_id, quality_points=points, gpa_credits=gpa_credits, credits_earned=earned)
+             for student_id, (points, gpa_credits, earned) in totals.items()],
+            update_conflicts=True,
+            unique_fields=['student'],
+            update_fields=['quality_points', 'gpa_credits', 'credits_earned', 'updated_at'],
+            batch_size=500,
+        )
+    return len(totals)
+
+
+def _transcript_totals(grouped):
+    """
+    (学生, 成绩, 学分和) 行 → {学生: (Σ 绩点 × 学分, 计入 GPA 的学分, 获得的学分)}。
+    绩点都是 0.1 的整数倍，按十分之一绩点用整数累加，结果与逐条 Decimal 相加完全一致。
+    """
+    if not grouped:
+        return {}
+    student_column, grade_column, credit_column = zip(*grouped)
+    grades = {}
+    for grade in grade_column:
+        if grade not in grades:
+            grades[grade] = grade_value(grade)
+    table = list(grades.values())
+    grade_points = np.array([int(value.points * 10) if value.points is not None else 0 for value in table], dtype=np.int64)
+    counts_for_gpa = np.array([value.points is not None for value in table])
+    earns_credit = np.array([value.earns_credit for value in table])
+
+    grade_index = {grade: i for i, grade in enumerate(grades)}
+    rows = np.fromiter((grade_index[grade] for grade in grade_column), dtype=np.intp, count=len(grouped))
+    credits = np.array(credit_column, dtype=np.int64)
+    students, student_rows = np.unique(np.array(student_column, dtype=np.int64), return_inverse=True)
+    count = len(students)
+    points = np.bincount(student_rows, weights=grade_points[rows] * credits, minlength=count)
+    gpa_credits = np.bincount(student_rows, weights=np.where(counts_for_gpa[rows], credits, 0), minlength=count)
+    earned = np.bincount(student_rows, weights=np.where(earns_credit[rows], credits, 0), minlength=count)
+    return {
+        int(student_id): (Decimal(int(round(p))) / 10, int(g), int(e))
+        for student_id, p, g, e in zip(students, points, gpa_credits, earned)
+    }
+
+
+def student_transcript(student):
+    """学生的成绩单：每门已选课程一行 (含换算后的绩点) 以及汇总的 StudentTranscript (没有成绩时为空记录)。"""
+    enrollments = list(
+        Enrollment.objects.filter(student=student).select_related('course')
+        .only('grade', 'enrollment_date', 'course__code', 'course__title', 'course__credits')
+        .order_by('enrollment_date', 'course__code')
+    )
+    for enrollment in enrollments:
+        enrollment.points = grade_value(enrollment.grade).points if enrollment.grade else None
+    summary = StudentTranscript.objects.filter(student=student).first() or StudentTranscript(student=student)
+    return enrollments, summary
+
+
+def cohort_gpas(class_ids=None):
+    """
+    每个班级 (courses.Class) 的学分加权 GPA，直接汇总各学生的 StudentTranscript (每个学生一行)。
+    返回 {class_id: {'gpa', 'gpa_credits', 'credits_earned', 'students'}}，只包含有成绩的班级。
+    """
+    transcripts = StudentTranscript.objects.filter(student__student_profile__assigned_class__isnull=False)
+    if class_ids is not None:
+        transcripts = transcripts.filter(student__student_profile__assigned_class__in=class_ids)
+    rows = transcripts.values('student__student_profile__assigned_class').annotate(
+        points=Sum('quality_points'), credits=Sum('gpa_credits'), earned=Sum('credits_earned'), students=Count('pk'),
+    ).order_by()
+    return {
+        row['student__student_profile__assigned_class']: {
+            'gpa': compute_gpa(row['points'], row['credits']),
+            'gpa_credits': row['credits'],
+            'credits_earned': row['earned'],
+            'students': row['students'],
+        }
+        for row in rows
+    }
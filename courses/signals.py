@@ -0,0 +1,174 @@
+# courses/signals.py
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from campushive.counters import adjust_count, move_count
+from .models import Assignment, Course, CourseMaterial, Enrollment, Submission
+from .search import course_index
+from .grade_scale import NO_CONTRIBUTION, contribution
+from .similarity import update_signature
+from .storage import release, retain
+from .services import (
+    add_to_timetable, adjust_transcript, course_credits, course_mask, rebuild_transcripts, remove_from_timetable,
+    sync_schedule_slots,
+)
+
+
+@receiver(pre_save, sender=Enrollment)
+def remember_previous_course(sender, instance, raw=False, **kwargs):
+    # 管理后台可能把选课记录改到另一门课 (或另一个学生)，需要知道原来的课程和学生；成绩单还需要原来的成绩和学分
+    instance._previous_course_id = instance._previous_student_id = None
+    instance._previous_grade, instance._previous_credits = None, 0
+    if instance.pk and not raw:
+        previous = Enrollment.objects.filter(pk=instance.pk).values_list('course_id', 'student_id', 'grade', 'course__credits').first()
+        if previous:
+            (instance._previous_course_id, instance._previous_student_id,
+             instance._previous_grade, instance._previous_credits) = previous
+
+
+@receiver(post_save, sender=Enrollment)
+def update_enrollment_count_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw: # loaddata 时不维护，之后运行 reconcile_counts
+        return
+    if created and getattr(instance, '_seat_claimed', False):
+        # courses.services 已经在抢座位时用条件 UPDATE 加过 1
+        return
+    previous = None if created else getattr(instance, '_previous_course_id', None)
+    move_count(Course, 'enrollment_count', previous, instance.course_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def update_enrollment_count_on_delete(sender, instance, **kwargs):
+    adjust_count(Course, instance.course_id, 'enrollment_count', -1)
+
+
+@receiver(post_save, sender=Enrollment)
+def update_timetable_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw: # loaddata 时不维护，之后运行 rebuild_timetables
+        return
+    previous = None if created else (getattr(instance, '_previous_course_id', None), getattr(instance, '_previous_student_id', None))
+    if previous == (instance.course_id, instance.student_id):
+        return
+    if previous is not None and previous[0] is not None:
+        remove_from_timetable(previous[1], course_mask(previous[0]))
+    add_to_timetable(instance.student_id, course_mask(instance.course_id))
+
+
+@receiver(post_delete, sender=Enrollment)
+def update_timetable_on_delete(sender, instance, **kwargs):
+    remove_from_timetable(instance.student_id, course_mask(instance.course_id))
+
+
+@receiver(post_save, sender=Enrollment)
+def update_transcript_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw: # loaddata 时不维护，之后运行 rebuild_transcripts
+        return
+    previous_student = None if created else getattr(instance, '_previous_student_id', None)
+    previous_grade = None if created else getattr(instance, '_previous_grade', None)
+    if not created and (getattr(instance, '_previous_course_id', None), previous_student, previous_grade) \
+            == (instance.course_id, instance.student_id, instance.grade):
+        return
+    old = contribution(previous_grade, getattr(instance, '_previous_credits', 0))
+    new = contribution(instance.grade, course_credits(instance.course_id)) if instance.grade else NO_CONTRIBUTION
+    if previous_student == instance.student_id:
+        adjust_transcript(instance.student_id, old, new)
+    else:
+        if previous_student is not None:
+            adjust_transcript(previous_student, old=old)
+        adjust_transcript(instance.student_id, new=new)
+
+
+@receiver(post_delete, sender=Enrollment)
+def update_transcript_on_delete(sender, instance, **kwargs):
+    if instance.grade:
+        adjust_transcript(instance.student_id, old=contribution(instance.grade, course_credits(instance.course_id)))
+
+
+@receiver(pre_save, sender=Course)
+def remember_previous_schedule(sender, instance, raw=False, **kwargs):
+    instance._previous_schedule, instance._previous_credits = None, None
+    if instance.pk and not raw:
+        previous = Course.objects.filter(pk=instance.pk).values_list('schedule_information', 'credits').first()
+        if previous:
+            instance._previous_schedule, instance._previous_credits = previous
+
+
+@receiver(post_save, sender=Course)
+def update_schedule_slots(sender, instance, created, raw=False, **kwargs):
+    if raw: # loaddata 时不维护，之后运行 backfill_schedule_slots
+        return
+    if created and not instance.schedule_information:
+        return
+    if created or instance.schedule_information != getattr(instance, '_previous_schedule', None):
+        sync_schedule_slots(instance)
+
+
+@receiver(post_save, sender=Course)
+def update_transcripts_on_credit_change(sender, instance, created, raw=False, **kwargs):
+    # 学分改变后，该课所有有成绩的学生的累加值都要重算
+    if raw or created or instance.credits == getattr(instance, '_previous_credits', None):
+        return
+    rebuild_transcripts(
+        Enrollment.objects.filter(course=instance).exclude(grade__isnull=True).exclude(grade='').values_list('student_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=Course)
+def update_course_index_on_save(sender, instance, raw=False, **kwargs):
+    # 提交后再更新本进程的自动补全索引，回滚的修改不会进入索引
+    if raw:
+        return
+    pk, code, title, updated_at = instance.pk, instance.code, instance.title, instance.updated_at
+    transaction.on_commit(lambda: course_index.add(pk, code, title, updated_at))
+
+
+@receiver(post_delete, sender=Course)
+def update_course_index_on_delete(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: course_index.remove(pk))
+
+
+# 引用去重存储文件的字段，StoredBlob.ref_count 随之增减
+BLOB_FIELDS = {CourseMaterial: 'file', Assignment: 'assignment_file', Submission: 'submitted_file'}
+
+
+def _file_saved(sender, update_fields):
+    return update_fields is None or BLOB_FIELDS[sender] in update_fields
+
+
+def remember_previous_file(sender, instance, raw=False, update_fields=None, **kwargs):
+    field = BLOB_FIELDS[sender]
+    instance._previous_file = None
+    if instance.pk and not raw and _file_saved(sender, update_fields): # 例如评分只保存 grade 等字段时不必查询
+        instance._previous_file = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+def update_blob_refs_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or not _file_saved(sender, update_fields): # loaddata 时不维护，之后运行 reconcile_blobs
+        return
+    name = getattr(instance, BLOB_FIELDS[sender]).name or None
+    previous = None if created else (getattr(instance, '_previous_file', None) or None)
+    if name != previous:
+        retain(name)
+        release(previous)
+
+
+@receiver(post_save, sender=Submission)
+def update_submission_signature(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # 只有文件改变时才重新计算 (评分等保存不需要)；提交后再读文件，回滚的提交不会计算
+    if raw or not _file_saved(sender, update_fields): # loaddata 时不维护，之后运行 rebuild_signatures
+        return
+    if not created and instance.submitted_file.name == getattr(instance, '_previous_file', None):
+        return
+    transaction.on_commit(lambda: update_signature(instance))
+
+
+def update_blob_refs_on_delete(sender, instance, **kwargs):
+    release(getattr(instance, BLOB_FIELDS[sender]).name)
+
+
+for model in BLOB_FIELDS:
+    pre_save.connect(remember_previous_file, sender=model, dispatch_uid=f'remember_previous_file_{model.__name__}')
+    post_save.connect(update_blob_refs_on_save, sender=model, dispatch_uid=f'update_blob_refs_on_save_{model.__name__}')
+    post_delete.connect(update_blob_refs_on_delete, sender=model, dispatch_uid=f'update_blob_refs_on_delete_{model.__name__}')
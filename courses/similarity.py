@@ -0,0 +1,129 @@
+# courses/similarity.py
+"""
+作业提交的相似度检测 (查重)，用 MinHash 签名 + LSH 分段找出疑似雷同的提交对。
+
+    - 提交文件的文本 (search.extract) 切成词 (中文按单字) 的 SHINGLE_SIZE 元组 (shingle)，每个 shingle 哈希成 32 位整数；
+    - 用 NUM_PERM 个随机哈希函数 h(x) = (a·x + b) mod p 各取最小值得到签名，两个签名相同位置相等的比例
+      是两份文本 shingle 集合 Jaccard 相似度的无偏估计。签名为 NUM_PERM 个 uint32，512 字节，
+      在提交保存时计算并存入 SubmissionSignature；
+    - 签名分成 BANDS 段，每段 ROWS 个值，任何一段完全相同的两份提交才成为候选对 (按段哈希分桶)，
+      只有候选对才计算相似度，不需要两两比较全部提交。ROWS = 4、BANDS = 32 时相似度 0.5 的文本
+      成为候选的概率约 87%，0.7 以上几乎必然，0.2 以下约 5%。
+"""
+import re
+import zlib
+from collections import defaultdict, namedtuple
+from itertools import combinations
+
+import numpy as np
+
+from search.extract import extract_text
+from .models import SubmissionSignature
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SIMILARITY_THRESHOLD = 0.5 # 报告中列出的最低估计相似度
+MAX_REPORT_PAIRS = 100
+HASH_BLOCK = 4096 # 每次处理的 shingle 数，限制中间矩阵的大小
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+# 固定种子：签名存在数据库中，所有进程必须使用同一组哈希函数。a < 2^31、x < 2^32，a·x + b 不会溢出 uint64
+_rng = np.random.default_rng(20250601)
+_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+
+# 中日韩文字逐字切分，其他文字按连续的字母数字切分
+TOKEN_RE = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]|[^\W_\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+')
+
+SuspiciousPair = namedtuple('SuspiciousPair', ['similarity', 'first', 'second']) # first / second 是提交的主键
+
+
+def shingle_hashes(text):
+    """文本中所有 shingle 的 32 位哈希 (去重)；词数不足一个 shingle 时整段作为一个 shingle。"""
+    tokens = TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    count = max(len(tokens) - SHINGLE_SIZE + 1, 1)
+    hashes = {zlib.crc32(' '.join(tokens[i:i + SHINGLE_SIZE]).encode()) for i in range(count)}
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+def minhash(hashes):
+    """shingle 哈希 → NUM_PERM 个 uint32 的签名。"""
+    signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    for start in range(0, len(hashes), HASH_BLOCK):
+        block = hashes[start:start + HASH_BLOCK, None]
+        values = (block * _A + _B) % _MERSENNE_PRIME & _MAX_HASH
+        np.minimum(signature, values.min(axis=0), out=signature)
+    return signature.astype('<u4')
+
+
+def signature_bytes(signature):
+    return signature.astype('<u4').tobytes()
+
+
+def load_signature(data):
+    return np.frombuffer(bytes(data), dtype='<u4')
+
+
+def estimated_similarity(first, second):
+    return float(np.count_nonzero(first == second)) / NUM_PERM
+
+
+def candidate_pairs(signatures):
+    """
+    LSH 分段：signatures 为 {key: 签名}，返回至少有一段完全相同的 (key1, key2) 集合 (key1 < key2)。
+    分桶的开销与提交数成正比，只有同桶的提交才成对。
+    """
+    buckets = defaultdict(list)
+    for key, signature in signatures.items():
+        for band, rows in enumerate(signature.reshape(BANDS, ROWS)):
+            buckets[band, rows.tobytes()].append(key)
+    pairs = set()
+    for members in buckets.values():
+        if len(members) > 1:
+            pairs.update(combinations(sorted(members), 2))
+    return pairs
+
+
+def suspicious_pairs(assignment, threshold=SIMILARITY_THRESHOLD, limit=MAX_REPORT_PAIRS):
+    """作业中估计相似度不低于 threshold 的提交对，按相似度从高到低，最多 limit 对。一条查询。"""
+    signatures = {
+        submission_id: load_signature(data)
+        for submission_id, data in SubmissionSignature.objects.filter(assignment=assignment).values_list('submission_id', 'signature')
+    }
+    pairs = []
+    for first, second in candidate_pairs(signatures):
+        similarity = estimated_similarity(signatures[first], signatures[second])
+        if similarity >= threshold:
+            pairs.append(SuspiciousPair(similarity, first, second))
+    pairs.sort(key=lambda pair: (-pair.similarity, pair.first, pair.second))
+    return pairs[:limit]
+
+
+def update_signature(submission, reuse=True):
+    """
+    计算并保存提交的签名；文件中没有可比较的文本 (例如图片、扫描件) 时删除已有签名，不参与查重。
+    去重存储中同名即同内容，reuse 时如果已有其他提交使用同一个文件就直接复用它的签名。
+    """
+    name = submission.submitted_file.name
+    existing = (
+        SubmissionSignature.objects.filter(submission__submitted_file=name).exclude(submission_id=submission.pk)
+        .values_list('signature', 'shingle_count').first()
+    ) if name and reuse else None
+    if existing:
+        signature, shingle_count = existing
+    else:
+        hashes = shingle_hashes(extract_text(submission.submitted_file))
+        if not len(hashes):
+            SubmissionSignature.objects.filter(submission_id=submission.pk).delete()
+            return None
+        signature, shingle_count = signature_bytes(minhash(hashes)), len(hashes)
+    record, _created = SubmissionSignature.objects.update_or_create(
+        submission_id=submission.pk,
+        defaults={'assignment_id': submission.assignment_id, 'signature': signature, 'shingle_count': shingle_count},
+    )
+    return record
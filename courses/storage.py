@@ -0,0 +1,160 @@
+# courses/storage.py
+"""
+按内容寻址、去重的文件存储，用于课程资料、作业附件和作业提交 (CourseMaterial.file、
+Assignment.assignment_file、Submission.submitted_file)。
+
+保存文件时边写临时文件边计算 SHA-256，文件名由内容决定：blobs/<前两位>/<sha256><扩展名>。
+同样内容 (且扩展名相同) 的文件只存一份，例如同一份讲义上传到多个教学班。upload_to 给出的目录被忽略，
+只保留扩展名 (MIME 类型和 search.extract 按扩展名判断格式)。同一个名字的内容永远不变，
+下载时可以让浏览器永久缓存 (见 courses.downloads)。
+
+每个文件对应一条 StoredBlob 记录，ref_count 是引用它的模型字段数，由 courses.signals 在保存、
+修改、删除时增减 (retain / release)；减到 0 时在事务提交后删除文件。最近 UNUSED_GRACE 内刚保存过的
+文件不删 (可能正有请求上传了相同内容、还没保存模型)，留给 reconcile_blobs 清理。
+出现偏差或有旧的、不在 blobs/ 下的文件时也运行 reconcile_blobs。
+"""
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+UNUSED_GRACE = timedelta(hours=1)
+MAX_EXTENSION_LENGTH = 10
+HASH_BLOCK_SIZE = 64 * 1024
+
+
+def blob_name(sha256, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if len(extension) > MAX_EXTENSION_LENGTH or not extension[1:].isalnum():
+        extension = ''
+    return f'{BLOB_DIR}/{sha256[:2]}/{sha256}{extension}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_DIR + '/')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    文件名由内容的 SHA-256 决定的 FileSystemStorage (默认同样位于 MEDIA_ROOT 下，
+    旧的按日期存放的文件照常读取)。已经存在的内容不再写入，只返回已有的名字。
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # 名字在 _save 中按内容确定，同名即同内容，不需要加随机后缀
+        return name
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+
+        temp_path = getattr(content, 'temporary_file_path', None)
+        if temp_path:
+            # 大文件上传已经落在临时文件中：只读一遍算校验和，然后直接移动过去
+            sha256, size = _file_sha256(temp_path())
+            temp_path = temp_path()
+        else:
+            sha256, size, temp_path = self._write_temp(content)
+        name = blob_name(sha256, name)
+        path = self.path(name)
+        # 先登记 (刷新 saved_at，宽限期内不会被删除) 再放文件
+        StoredBlob.objects.update_or_create(name=name, defaults={'sha256': sha256, 'size': size, 'saved_at': timezone.now()})
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            file_move_safe(temp_path, path)
+        except FileExistsError: # 已有相同内容 (包括并发上传同一文件)
+            if not hasattr(content, 'temporary_file_path'):
+                os.remove(temp_path)
+        else:
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        return name
+
+    def _write_temp(self, content):
+        """把 content 逐块写入存储目录下的临时文件 (与目标在同一文件系统，之后可以原子地改名)。"""
+        directory = self.path(os.path.join(BLOB_DIR, 'tmp'))
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return digest.hexdigest(), size, temp_path
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def get_blob_storage():
+    # 以可调用对象传给 FileField(storage=...)，迁移中只记录函数路径
+    return blob_storage
+
+
+def retain(name):
+    """多了一个字段引用 name。不在 blobs/ 下的旧文件不计数。"""
+    from .models import StoredBlob
+
+    if not is_blob(name) or StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1):
+        return
+    if blob_storage.exists(name): # 例如 loaddata 导入的数据，文件在但没有记录
+        sha256 = os.path.splitext(os.path.basename(name))[0]
+        StoredBlob.objects.get_or_create(name=name, defaults={'sha256': sha256, 'size': blob_storage.size(name), 'ref_count': 1})
+
+
+def release(name):
+    """少了一个字段引用 name；减到 0 时在事务提交后删除记录和文件 (提交前又被引用则保留)。"""
+    from .models import StoredBlob
+
+    if not is_blob(name):
+        return
+    StoredBlob.objects.filter(name=name).update(ref_count=Greatest(F('ref_count') - 1, 0))
+    transaction.on_commit(lambda: delete_if_unused(name))
+
+
+def delete_if_unused(name):
+    """
+    没有引用且过了宽限期时删除记录和文件。在同一事务中锁住记录、删除记录和文件：并发上传相同内容的 _save
+    (update_or_create 同样先锁这一行) 要么先刷新了 saved_at，这里不再满足条件；要么等这里提交后重新登记并放入文件，
+    不会出现记录还在、文件却被删掉的情况。
+    """
+    from .models import StoredBlob
+
+    with transaction.atomic():
+        blob = StoredBlob.objects.select_for_update().filter(
+            name=name, ref_count=0, saved_at__lt=timezone.now() - UNUSED_GRACE,
+        ).first()
+        if blob is None:
+            return False
+        blob.delete()
+        blob_storage.delete(name)
+    return True
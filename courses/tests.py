@@ -1,12 +1,47 @@
 # courses/tests.py
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 # Create your tests here.
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from users.models import User
-from users.models import Department, EmployeeProfile
-from .models import Class, Course, Enrollment
+from users.models import Department, EmployeeProfile, StudentProfile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+import time
+from datetime import time as clock, timedelta
+from venues.models import Venue
+from django.test.utils import CaptureQueriesContext
+from .models import Assignment, Class, Course, CourseMaterial, Enrollment, ScheduleSlot, StudentTimetable, Submission, WaitlistEntry
+from .schedule import decode_week, parse_schedule, week_mask
+from .search import CourseIndex, course_index
+from .services import _timetable_clashes, enroll_student, drop_enrollment, waitlist_position, CLASH, ENROLLED, WAITLISTED
+from .services import _transcript_totals, cohort_gpas, rebuild_transcripts
+from .grade_scale import contribution, grade_value
+from .grading import apply_grades
+from .models import StudentTranscript
+from decimal import Decimal
+import numpy as np
+from .gradebook import apply_final_grades, drop_lowest, final_percentages
+from .models import UploadPart, UploadSession
+from .uploads import complete_session, session_path, start_session, write_part
+from .models import StoredBlob
+from .storage import UNUSED_GRACE, blob_storage, delete_if_unused
+from django.test import override_settings
+from campushive.testing import TemporaryMediaMixin
+import hashlib
+import os
 from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.base import ContentFile
+import json
+import csv
+import tracemalloc
+import io
+import zipfile
+from .models import SubmissionSignature
+from .similarity import NUM_PERM, candidate_pairs, estimated_similarity, minhash, shingle_hashes, suspicious_pairs
 
 
 User = get_user_model()
@@ -241,4 +276,1287 @@ class EnrollmentViewTests(TestCase):
         self.client.login(username='other_student', password='password') # Different student logs in
         response = self.client.post(reverse('courses:drop_course', kwargs={'enrollment_id': enrollment_by_main_student.id}))
         self.assertEqual(response.status_code, 404) # get_object_or_404 should fail for wrong student
-        self.assertTrue(Enrollment.objects.filter(id=enrollment_by_main_student.id).exists()) # Enrollment should still exist
\ No newline at end of file
+        self.assertTrue(Enrollment.objects.filter(id=enrollment_by_main_student.id).exists()) # Enrollment should still exist
+
+class DenormalizedCountTests(TestCase):
+    """
+    测试冗余计数字段 (选课人数、班级人数、部门人数) 的增量维护与修正
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(email='cnt_stu@example.com', username='cnt_stu', password='password', role=User.ROLE_STUDENT)
+        cls.teacher = User.objects.create_user(email='cnt_tch@example.com', username='cnt_tch', password='password', role=User.ROLE_TEACHER)
+        cls.course = Course.objects.create(code='CNT101', title='Counting')
+        cls.other_course = Course.objects.create(code='CNT102', title='More Counting')
+        cls.class_a = Class.objects.create(name='Class A', academic_year='2025/2026')
+        cls.class_b = Class.objects.create(name='Class B', academic_year='2025/2026')
+        cls.department = Department.objects.create(name='Counting Dept')
+
+    def _count(self, obj, field):
+        obj.refresh_from_db(fields=[field])
+        return getattr(obj, field)
+
+    def test_enrollment_count_follows_enroll_move_and_drop(self):
+        self.client.login(username='cnt_stu', password='password')
+        self.client.post(reverse('courses:enroll_course', kwargs={'course_id': self.course.id}))
+        self.assertEqual(self._count(self.course, 'enrollment_count'), 1)
+
+        enrollment = Enrollment.objects.get(student=self.student)
+        enrollment.course = self.other_course # 例如在管理后台修改
+        enrollment.save()
+        self.assertEqual(self._count(self.course, 'enrollment_count'), 0)
+        self.assertEqual(self._count(self.other_course, 'enrollment_count'), 1)
+
+        self.client.post(reverse('courses:drop_course', kwargs={'enrollment_id': enrollment.id}))
+        self.assertEqual(self._count(self.other_course, 'enrollment_count'), 0)
+
+    def test_class_and_department_counts(self):
+        profile = StudentProfile.objects.create(user=self.student, student_id_number='CNT-S1', enrollment_date=timezone.now().date(), assigned_class=self.class_a)
+        self.assertEqual(self._count(self.class_a, 'student_count'), 1)
+        profile.assigned_class = self.class_b
+        profile.save()
+        self.assertEqual(self._count(self.class_a, 'student_count'), 0)
+        self.assertEqual(self._count(self.class_b, 'student_count'), 1)
+
+        employee = EmployeeProfile.objects.create(user=self.teacher, employee_id_number='CNT-E1', department=self.department)
+        self.assertEqual(self._count(self.department, 'employee_count'), 1)
+        employee.delete()
+        self.assertEqual(self._count(self.department, 'employee_count'), 0)
+
+    def test_reconcile_counts_fixes_drift(self):
+        Enrollment.objects.create(student=self.student, course=self.course)
+        Course.objects.filter(pk=self.course.pk).update(enrollment_count=7)
+        Department.objects.filter(pk=self.department.pk).update(employee_count=3)
+
+        call_command('reconcile_counts', stdout=StringIO())
+        self.assertEqual(self._count(self.course, 'enrollment_count'), 1)
+        self.assertEqual(self._count(self.department, 'employee_count'), 0)
+
+
+
+class CourseCapacityTests(TestCase):
+    """
+    测试课程容量、候补名单与退课递补
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(email='cap_t@example.com', username='cap_t', password='password', role=User.ROLE_TEACHER)
+        cls.course = Course.objects.create(code='CAP101', title='Popular Course', capacity=2, instructor=cls.teacher)
+        cls.students = [
+            User.objects.create_user(email=f'cap{i}@example.com', username=f'cap{i}', password='password', role=User.ROLE_STUDENT)
+            for i in range(4)
+        ]
+
+    def test_full_course_waitlists_in_fifo_order(self):
+        results = [enroll_student(self.course, student) for student in self.students]
+        self.assertEqual(results, [ENROLLED, ENROLLED, WAITLISTED, WAITLISTED])
+        self.assertEqual(waitlist_position(self.course, self.students[3]), 2)
+
+        drop_enrollment(Enrollment.objects.get(course=self.course, student=self.students[0]))
+        self.assertTrue(Enrollment.objects.filter(course=self.course, student=self.students[2]).exists())
+        self.assertEqual(waitlist_position(self.course, self.students[3]), 1)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollment_count, 2)
+
+    def test_promotion_skips_students_with_a_clash(self):
+        course = Course.objects.create(code='CAP103', title='Morning Course', capacity=1, schedule_information='Mon 8-10', instructor=self.teacher)
+        other = Course.objects.create(code='CAP104', title='Clashing Course', schedule_information='Mon 9-11', instructor=self.teacher)
+        results = [enroll_student(course, student) for student in self.students[:3]]
+        self.assertEqual(results, [ENROLLED, WAITLISTED, WAITLISTED])
+        self.assertEqual(enroll_student(other, self.students[1]), ENROLLED) # 候补期间选了时间冲突的课
+
+        promoted = drop_enrollment(Enrollment.objects.get(course=course, student=self.students[0]))
+        self.assertEqual(promoted, [self.students[2].pk])
+        self.assertFalse(Enrollment.objects.filter(course=course, student=self.students[1]).exists())
+        self.assertEqual(waitlist_position(course, self.students[1]), 1)
+
+    def test_enroll_view_reports_waitlist(self):
+        enroll_student(self.course, self.students[0])
+        enroll_student(self.course, self.students[1])
+        self.client.login(username='cap2', password='password')
+        response = self.client.post(reverse('courses:enroll_course', kwargs={'course_id': self.course.id}), follow=True)
+        self.assertContains(response, 'waitlist')
+        self.assertTrue(WaitlistEntry.objects.filter(course=self.course, student=self.students[2]).exists())
+
+    def test_unlimited_course_never_waitlists(self):
+        course = Course.objects.create(code='CAP102', title='Open Course')
+        self.assertEqual({enroll_student(course, student) for student in self.students}, {ENROLLED})
+
+
+class CourseEnrollmentLoadTests(TransactionTestCase):
+    """
+    选课日压力测试：大量学生并发选同一门课，不能超过容量
+    """
+    CAPACITY = 15
+    STUDENTS = 60
+
+    def test_concurrent_enrollment_never_exceeds_capacity(self):
+        course = Course.objects.create(code='LOAD101', title='Registration Day', capacity=self.CAPACITY)
+        User.objects.bulk_create([
+            User(username=f'load{i}', email=f'load{i}@example.com', role=User.ROLE_STUDENT) for i in range(self.STUDENTS)
+        ])
+        students = list(User.objects.filter(username__startswith='load'))
+
+        def enroll(student):
+            try:
+                for _ in range(200):
+                    try:
+                        return enroll_student(course, student)
+                    except OperationalError:
+                        # SQLite 的共享内存测试库遇到并发写会直接报 "table is locked"，整个事务已回滚，重试即可
+                        time.sleep(0.005)
+                raise AssertionError('Too many lock retries.')
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(enroll, students))
+
+        course.refresh_from_db()
+        self.assertEqual(results.count(ENROLLED), self.CAPACITY)
+        self.assertEqual(results.count(WAITLISTED), self.STUDENTS - self.CAPACITY)
+        self.assertEqual(Enrollment.objects.filter(course=course).count(), self.CAPACITY)
+        self.assertEqual(course.enrollment_count, self.CAPACITY)
+        self.assertEqual(WaitlistEntry.objects.filter(course=course).count(), self.STUDENTS - self.CAPACITY)
+
+    def test_seats_freed_while_students_queue_are_filled(self):
+        # 退课与选课同时进行：只要还有候补，退课空出的座位最终都要补上
+        course = Course.objects.create(code='LOAD102', title='Add/Drop Week', capacity=self.CAPACITY)
+        User.objects.bulk_create([
+            User(username=f'swap{i}', email=f'swap{i}@example.com', role=User.ROLE_STUDENT) for i in range(self.STUDENTS)
+        ])
+        students = list(User.objects.filter(username__startswith='swap').order_by('pk'))
+        for student in students[:self.CAPACITY]:
+            enroll_student(course, student)
+
+        def retry(action):
+            try:
+                for _ in range(200):
+                    try:
+                        return action()
+                    except OperationalError:
+                        time.sleep(0.005)
+                raise AssertionError('Too many lock retries.')
+            finally:
+                connection.close()
+
+        def drop(student):
+            return retry(lambda: drop_enrollment(Enrollment.objects.get(course=course, student=student)))
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            jobs = [pool.submit(retry, lambda student=student: enroll_student(course, student)) for student in students[self.CAPACITY:]]
+            jobs += [pool.submit(drop, student) for student in students[:self.CAPACITY]]
+            for job in jobs:
+                job.result()
+
+        course.refresh_from_db()
+        self.assertEqual(Enrollment.objects.filter(course=course).count(), self.CAPACITY)
+        self.assertEqual(course.enrollment_count, self.CAPACITY)
+        self.assertEqual(WaitlistEntry.objects.filter(course=course).count(), self.STUDENTS - 2 * self.CAPACITY)
+
+
+
+class ScheduleSlotTests(TestCase):
+    """
+    测试 schedule_information 的解析与 ScheduleSlot 的维护
+    """
+    def test_parse_schedule_tolerates_common_formats(self):
+        slots, unparsed = parse_schedule('Mon/Wed 9-10:30 Lecture Hall A; Fri 2pm-4pm, Online; TBA')
+        self.assertEqual(
+            [(s.weekday, s.start_time, s.end_time, s.location) for s in slots],
+            [(0, clock(9), clock(10, 30), 'Lecture Hall A'), (2, clock(9), clock(10, 30), 'Lecture Hall A'),
+             (4, clock(14), clock(16), 'Online')],
+        )
+        self.assertEqual(unparsed, ['TBA'])
+
+        slots, _ = parse_schedule('周一 10:00~12:00 A101, Mon-Wed 08:00 to 09:00')
+        self.assertEqual(sorted({s.weekday for s in slots}), [0, 1, 2])
+
+    def test_room_numbers_are_not_parsed_as_times(self):
+        # 房间号中的 "2-101"、"2-3" 不能变成 02:00-10:00 这类多余的时间段 (会造成选课时误报冲突)
+        for text, location in (('Monday 9:00 - 11:00 Room 2-101', 'Room 2-101'), ('Mon 9-11 Room 2-3', 'Room 2-3')):
+            slots, unparsed = parse_schedule(text)
+            self.assertEqual([(s.weekday, s.start_time, s.end_time, s.location) for s in slots],
+                             [(0, clock(9), clock(11), location)], text)
+            self.assertEqual(unparsed, [])
+        slots, _ = parse_schedule('Tue 10:00-12:00 and 14:00-16:00 Lab 1')
+        self.assertEqual([(s.start_time, s.end_time, s.location) for s in slots],
+                         [(clock(10), clock(12), 'Lab 1'), (clock(14), clock(16), 'Lab 1')])
+
+    def test_slots_follow_schedule_information_and_match_venues(self):
+        hall = Venue.objects.create(name='Lecture Hall A', capacity=200)
+        course = Course.objects.create(code='SCH101', title='Scheduling', schedule_information='Mon 10:00-12:00, lecture hall a; Wed 14:00-16:00, Online')
+        slots = list(course.schedule_slots.all())
+        self.assertEqual([(s.weekday, s.venue_id, s.location) for s in slots], [(0, hall.id, 'lecture hall a'), (2, None, 'Online')])
+
+        course.schedule_information = 'Tue 08:00-09:00'
+        course.save()
+        self.assertEqual(list(course.schedule_slots.values_list('weekday', flat=True)), [1])
+
+    def test_backfill_command_rebuilds_slots(self):
+        course = Course.objects.create(code='SCH102', title='Backfill', schedule_information='Thu 10-11')
+        ScheduleSlot.objects.all().delete()
+        Course.objects.filter(pk=course.pk).update(schedule_information='Thu 10-11; Fri 10-11')
+
+        call_command('backfill_schedule_slots', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(list(course.schedule_slots.values_list('weekday', flat=True)), [3, 4])
+
+
+class TimetableClashTests(TestCase):
+    """
+    测试选课时间冲突检测与学生课表位图的增量维护
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(email='tt_t@example.com', username='tt_t', password='password', role=User.ROLE_TEACHER)
+        cls.student = User.objects.create_user(email='tt_s@example.com', username='tt_s', password='password', role=User.ROLE_STUDENT)
+
+    def _course(self, code, schedule):
+        return Course.objects.create(code=code, title=f'Course {code}', schedule_information=schedule, instructor=self.teacher)
+
+    def _bitmap(self):
+        raw = StudentTimetable.objects.filter(student=self.student).values_list('bitmap', flat=True).first()
+        return decode_week(raw)
+
+    def test_overlapping_course_is_rejected_and_adjacent_one_accepted(self):
+        morning = self._course('TT101', 'Mon 10:00-12:00')
+        overlapping = self._course('TT102', 'Mon 11:30-13:00; Fri 9-10')
+        adjacent = self._course('TT103', 'Mon 12:00-13:00')
+
+        self.assertEqual(enroll_student(morning, self.student), ENROLLED)
+        self.assertEqual(enroll_student(overlapping, self.student), CLASH)
+        self.assertEqual(enroll_student(adjacent, self.student), ENROLLED)
+        self.assertFalse(Enrollment.objects.filter(course=overlapping, student=self.student).exists())
+        self.assertEqual(self._bitmap(), week_mask(parse_schedule('Mon 10:00-13:00')[0]))
+
+    def test_drop_frees_the_slots(self):
+        morning = self._course('TT104', 'Tue 8-10')
+        clashing = self._course('TT105', 'Tue 9-11')
+        enroll_student(morning, self.student)
+        drop_enrollment(Enrollment.objects.get(course=morning, student=self.student))
+        self.assertEqual(self._bitmap(), 0)
+        self.assertEqual(enroll_student(clashing, self.student), ENROLLED)
+
+    def test_check_cost_does_not_grow_with_enrolled_courses(self):
+        def queries_for_clash_check(course):
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(enroll_student(course, self.student), CLASH)
+            return len(context)
+
+        enroll_student(self._course('TT110', 'Wed 8-9'), self.student)
+        few = queries_for_clash_check(self._course('TT111', 'Wed 8:30-9:30'))
+        for hour in range(10, 16):
+            enroll_student(self._course(f'TT1{hour + 10}', f'Wed {hour}-{hour + 1}'), self.student)
+        self.assertEqual(queries_for_clash_check(self._course('TT140', 'Wed 15:30-16:30')), few)
+
+    def test_clash_check_locks_a_row_for_students_without_timetable(self):
+        # 没有课表行时 SELECT ... FOR UPDATE 锁不住任何行，并发的两次选课会都通过检测
+        StudentTimetable.objects.filter(student=self.student).delete()
+        with transaction.atomic():
+            self.assertFalse(_timetable_clashes(self.student.pk, week_mask(parse_schedule('Sun 8-9')[0])))
+            self.assertTrue(StudentTimetable.objects.filter(student=self.student).exists())
+
+    def test_schedule_change_updates_enrolled_students(self):
+        course = self._course('TT106', 'Thu 8-9')
+        enroll_student(course, self.student)
+        course.schedule_information = 'Thu 14-15'
+        course.save()
+        self.assertEqual(self._bitmap(), week_mask(parse_schedule('Thu 14-15')[0]))
+        self.assertEqual(enroll_student(self._course('TT107', 'Thu 8-9'), self.student), ENROLLED)
+
+    def test_overlapping_enrollments_added_directly_are_handled_on_drop(self):
+        first = self._course('TT108', 'Fri 8-10')
+        second = self._course('TT109', 'Fri 9-11')
+        Enrollment.objects.create(course=first, student=self.student) # 例如管理员在后台添加，不经过冲突检测
+        Enrollment.objects.create(course=second, student=self.student)
+        self.assertTrue(StudentTimetable.objects.get(student=self.student).has_overlaps)
+
+        Enrollment.objects.get(course=first).delete()
+        timetable = StudentTimetable.objects.get(student=self.student)
+        self.assertEqual(decode_week(timetable.bitmap), week_mask(parse_schedule('Fri 9-11')[0]))
+        self.assertFalse(timetable.has_overlaps)
+
+    def test_enroll_view_names_clashing_course(self):
+        enroll_student(self._course('TT120', 'Sat 9-11'), self.student)
+        clashing = self._course('TT121', 'Sat 10-12')
+        self.client.login(username='tt_s', password='password')
+        response = self.client.post(reverse('courses:enroll_course', kwargs={'course_id': clashing.id}), follow=True)
+        self.assertContains(response, 'Course TT120')
+        self.assertFalse(Enrollment.objects.filter(course=clashing, student=self.student).exists())
+
+    def test_rebuild_command_restores_bitmaps(self):
+        enroll_student(self._course('TT122', 'Sun 9-10'), self.student)
+        expected = self._bitmap()
+        StudentTimetable.objects.all().delete()
+        call_command('rebuild_timetables', stdout=StringIO())
+        self.assertEqual(self._bitmap(), expected)
+
+
+class CourseAutocompleteTests(TestCase):
+    """
+    测试课程自动补全索引与 JSON 接口
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(email='ac_s@example.com', username='ac_s', password='password', role=User.ROLE_STUDENT)
+        for code, title in [('CS-101', 'Introduction to Programming'), ('CS201', 'Data Structures'),
+                            ('MA101', 'Linear Algebra'), ('PH110', 'Physics for Programmers')]:
+            Course.objects.create(code=code, title=title)
+
+    def _index(self):
+        index = CourseIndex()
+        index.build()
+        return index
+
+    def _codes(self, index, query):
+        return [code for _, code, _ in index.suggest(query)]
+
+    def test_code_prefix_ranks_before_word_prefix_and_substring(self):
+        index = self._index()
+        self.assertEqual(self._codes(index, 'cs1'), ['CS-101'])
+        self.assertEqual(self._codes(index, 'prog'), ['CS-101', 'PH110'])
+        self.assertEqual(self._codes(index, 'gebra'), ['MA101']) # 词中间的子串，与 icontains 一致
+        self.assertEqual(self._codes(index, 'data str'), ['CS201'])
+        self.assertEqual(self._codes(index, 'p'), ['PH110', 'CS-101'])
+        self.assertEqual(index.suggest('zzz'), [])
+
+    def test_index_follows_course_changes(self):
+        index = self._index()
+        course = Course.objects.get(code='MA101')
+        index.add(course.pk, 'MA102', 'Abstract Algebra')
+        self.assertEqual(self._codes(index, 'abstract'), ['MA102'])
+        self.assertEqual(self._codes(index, 'linear'), [])
+        index.remove(course.pk)
+        self.assertEqual(self._codes(index, 'algebra'), [])
+
+        # 其他进程的修改通过 refresh 同步
+        Course.objects.create(code='BI100', title='Biology Basics')
+        Course.objects.filter(code='CS201').delete()
+        index.refresh(force=True)
+        self.assertEqual(self._codes(index, 'bio'), ['BI100'])
+        self.assertEqual(self._codes(index, 'data'), [])
+
+    def test_refresh_catches_late_commits_and_skips_the_id_scan(self):
+        index = self._index()
+        with self.assertNumQueries(2): # 变化的课程 + COUNT，没有删除时不读出全部 id
+            index.refresh(force=True)
+
+        # 另一个进程较早保存、较晚提交的课程 (updated_at 早于本进程已经看到的最新修改)，同时删了一门课，总数不变
+        latest = Course.objects.latest('updated_at').updated_at
+        late = Course.objects.create(code='GE100', title='Geology')
+        Course.objects.filter(pk=late.pk).update(updated_at=latest - timedelta(seconds=30))
+        Course.objects.filter(code='MA101').delete()
+        index.refresh(force=True)
+        self.assertEqual(self._codes(index, 'geology'), ['GE100'])
+        self.assertEqual(self._codes(index, 'linear'), [])
+
+    def test_signals_update_the_shared_index_after_commit(self):
+        course_index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            course = Course.objects.create(code='EC100', title='Microeconomics')
+        self.assertEqual(self._codes(course_index, 'micro'), ['EC100'])
+        with self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+        self.assertEqual(self._codes(course_index, 'micro'), [])
+
+    def test_autocomplete_view_returns_json(self):
+        course_index.build()
+        self.client.login(username='ac_s', password='password')
+        response = self.client.get(reverse('courses:course_autocomplete'), {'q': 'physics'})
+        results = response.json()['results']
+        self.assertEqual([r['code'] for r in results], ['PH110'])
+        self.assertEqual(results[0]['url'], reverse('courses:course_detail', args=[results[0]['id']]))
+
+    def test_suggestions_stay_fast_for_large_catalogues(self):
+        words = ('introduction advanced calculus linear algebra physics chemistry biology history literature '
+                 'programming data structures algorithms networks databases statistics economics design theory').split()
+        index = CourseIndex()
+        index.build()
+        for pk in range(100000, 150000):
+            index.add(pk, f'X{pk}', ' '.join(words[(pk * k) % len(words)] for k in (1, 3, 7)))
+        for query in ('x12', 'intro', 'alg data', 'gebra', 'a b'):
+            started = time.perf_counter()
+            self.assertTrue(index.suggest(query))
+            # 目标是个位数毫秒，这里留出余量避免在繁忙的 CI 机器上误报
+            self.assertLess(time.perf_counter() - started, 0.05, query)
+
+
+class CourseDetailQueryBudgetTests(TestCase):
+    """
+    课程详情页的查询数固定，不随资料、作业和学生数量增长
+    """
+    # 会话 + 用户 + 课程 (含院系、教师) + 资料 + 作业 + 选课状态 + 候补位置 / 选课学生
+    STUDENT_QUERIES = 7
+    INSTRUCTOR_QUERIES = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(email='qb_t@example.com', username='qb_t', password='password', role=User.ROLE_TEACHER)
+        cls.department = Department.objects.create(name='Query Budget Department')
+        cls.course = Course.objects.create(code='QB101', title='Budgeted Course', instructor=cls.teacher, department=cls.department)
+        cls.student = User.objects.create_user(email='qb_s@example.com', username='qb_s', password='password', role=User.ROLE_STUDENT)
+
+    def _add_content(self, count):
+        start = CourseMaterial.objects.count()
+        for i in range(start, start + count):
+            CourseMaterial.objects.create(course=self.course, title=f'Material {i}', file=f'course_materials/m{i}.pdf', uploaded_by=self.teacher)
+            Assignment.objects.create(course=self.course, title=f'Assignment {i}', description='-', due_date=timezone.now())
+            student = User.objects.create_user(email=f'qb{i}@example.com', username=f'qb{i}', password='password', role=User.ROLE_STUDENT)
+            Enrollment.objects.create(course=self.course, student=student)
+
+    def _get(self, username, queries):
+        self.client.login(username=username, password='password')
+        url = reverse('courses:course_detail', kwargs={'pk': self.course.pk})
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_student_page_query_count_is_constant(self):
+        self._add_content(1)
+        self._get('qb_s', self.STUDENT_QUERIES)
+        self._add_content(10)
+        response = self._get('qb_s', self.STUDENT_QUERIES)
+        self.assertContains(response, 'Material 10')
+        self.assertContains(response, 'Assignment 10')
+
+        enroll_student(self.course, self.student)
+        response = self._get('qb_s', self.STUDENT_QUERIES - 1) # 已选课时不需要查询候补位置
+        self.assertContains(response, 'Drop Course')
+
+    def test_instructor_page_query_count_is_constant(self):
+        self._add_content(1)
+        self._get('qb_t', self.INSTRUCTOR_QUERIES)
+        self._add_content(10)
+        response = self._get('qb_t', self.INSTRUCTOR_QUERIES)
+        self.assertContains(response, 'qb10')
+
+    def test_waitlist_position_is_shown(self):
+        self.course.capacity = 1
+        self.course.save()
+        self._add_content(1)
+        enroll_student(self.course, self.student)
+        response = self._get('qb_s', self.STUDENT_QUERIES)
+        self.assertContains(response, 'position 1')
+
+
+class BulkGradingTests(TestCase):
+    """
+    测试批量录入成绩：文件 / JSON 一次校验，全部合法才用一条 bulk_update 写入
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(email='bg_t@example.com', username='bg_t', password='password', role=User.ROLE_TEACHER)
+        cls.course = Course.objects.create(code='BG101', title='Bulk Grading', instructor=cls.teacher)
+        cls.students = []
+        for i in range(3):
+            student = User.objects.create_user(email=f'bg{i}@example.com', username=f'bg{i}', password='password', role=User.ROLE_STUDENT)
+            StudentProfile.objects.create(user=student, student_id_number=f'2025{i:04d}', enrollment_date=timezone.now().date())
+            Enrollment.objects.create(course=cls.course, student=student)
+            cls.students.append(student)
+        cls.outsider = User.objects.create_user(email='bg_x@example.com', username='bg_x', password='password', role=User.ROLE_STUDENT)
+        cls.url = reverse('courses:grade_enrollments', kwargs={'course_id': cls.course.pk})
+
+    def setUp(self):
+        self.client.login(username='bg_t', password='password')
+
+    def _grades(self):
+        return dict(Enrollment.objects.filter(course=self.course).values_list('student__username', 'grade'))
+
+    def test_csv_upload_matches_username_email_and_student_id(self):
+        content = 'Grade,Student\nA,bg0\nb+,BG1@example.com\nC,20250002\n'
+        upload = SimpleUploadedFile('grades.csv', content.encode('utf-8'))
+        response = self.client.post(self.url, {'grades_file': upload})
+        self.assertRedirects(response, self.url)
+        self.assertEqual(self._grades(), {'bg0': 'A', 'bg1': 'b+', 'bg2': 'C'})
+
+    def test_invalid_row_rejects_whole_file(self):
+        content = 'bg0,A\nbg_x,B\nbg1,TOOLONG\nbg0,C\n'
+        upload = SimpleUploadedFile('grades.csv', content.encode('utf-8'))
+        response = self.client.post(self.url, {'grades_file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Row 2: &quot;bg_x&quot; is not enrolled in this course.')
+        self.assertContains(response, 'Row 3: grade &quot;TOOLONG&quot; is longer than 5 characters.')
+        self.assertContains(response, 'Row 4: &quot;bg0&quot; appears more than once.')
+        self.assertEqual(self._grades(), {'bg0': None, 'bg1': None, 'bg2': None})
+
+    def test_json_payload_writes_with_single_update(self):
+        payload = json.dumps({'grades': [['bg0', 'A'], ['bg1', 'B'], ['bg2', 'C']]})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, payload, content_type='application/json')
+        self.assertEqual(response.json(), {'updated': 3})
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+        # 没有改变的成绩不再写入；空成绩清除
+        response = self.client.post(self.url, json.dumps({'grades': {'bg0': 'A', 'bg1': ''}}), content_type='application/json')
+        self.assertEqual(response.json(), {'updated': 1})
+        self.assertEqual(self._grades(), {'bg0': 'A', 'bg1': None, 'bg2': 'C'})
+
+        response = self.client.post(self.url, json.dumps({'grades': [['nobody', 'A']]}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'errors': ['Row 1: "nobody" is not enrolled in this course.']})
+
+    def test_formset_saves_changed_rows(self):
+        enrollments = list(Enrollment.objects.filter(course=self.course).order_by('student__username'))
+        data = {
+            'enrollments-TOTAL_FORMS': '3', 'enrollments-INITIAL_FORMS': '3',
+            'enrollments-MIN_NUM_FORMS': '0', 'enrollments-MAX_NUM_FORMS': '1000',
+        }
+        for i, enrollment in enumerate(enrollments):
+            data[f'enrollments-{i}-id'] = enrollment.pk
+            data[f'enrollments-{i}-grade'] = 'A' if i == 0 else ''
+        response = self.client.post(self.url, data)
+        self.assertRedirects(response, self.url)
+        self.assertEqual(self._grades(), {'bg0': 'A', 'bg1': None, 'bg2': None})
+
+
+class GradebookExportTests(TestCase):
+    """
+    测试成绩册 / 花名册的流式 CSV 导出
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Export Department')
+        cls.teacher = User.objects.create_user(email='ex_t@example.com', username='ex_t', password='password', role=User.ROLE_TEACHER)
+        cls.registrar = User.objects.create_user(email='ex_r@example.com', username='ex_r', password='password', role=User.ROLE_STAFF_MEMBER)
+        cls.course = Course.objects.create(code='EX101', title='Exports', instructor=cls.teacher, department=cls.department)
+        cls.alice = User.objects.create_user(email='ex_a@example.com', username='ex_a', password='password', role=User.ROLE_STUDENT)
+        cls.bob = User.objects.create_user(email='ex_b@example.com', username='ex_b', password='password', role=User.ROLE_STUDENT)
+        cls.dropped = User.objects.create_user(email='ex_d@example.com', username='ex_d', password='password', role=User.ROLE_STUDENT)
+        Enrollment.objects.create(course=cls.course, student=cls.alice, grade='A')
+        Enrollment.objects.create(course=cls.course, student=cls.bob)
+        cls.essay = Assignment.objects.create(course=cls.course, title='Essay', description='-', due_date=timezone.now())
+        cls.quiz = Assignment.objects.create(course=cls.course, title='Quiz', description='-', due_date=timezone.now() + timezone.timedelta(days=1))
+        Submission.objects.create(assignment=cls.essay, student=cls.alice, submitted_file='s/2.pdf', grade='A-')
+        Submission.objects.create(assignment=cls.quiz, student=cls.bob, submitted_file='s/3.pdf', grade='90')
+        Submission.objects.create(assignment=cls.quiz, student=cls.dropped, submitted_file='s/4.pdf', grade='50')
+
+    def _export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(content.splitlines()))
+
+    def test_course_gradebook_merges_submissions(self):
+        self.client.login(username='ex_t', password='password')
+        rows = self._export(reverse('courses:course_export', kwargs={'pk': self.course.pk, 'export': 'gradebook'}))
+        self.assertEqual(rows[0][:6], ['course', 'username', 'first_name', 'last_name', 'student_id', 'course_grade'])
+        summary = [(row[1], row[5], row[6], row[9]) for row in rows[1:]]
+        self.assertEqual(summary, [
+            ('ex_a', 'A', 'Essay', 'A-'), ('ex_a', 'A', 'Quiz', ''),
+            ('ex_b', '', 'Essay', ''), ('ex_b', '', 'Quiz', '90'),
+        ])
+
+    def test_roster_and_permissions(self):
+        roster_url = reverse('courses:course_export', kwargs={'pk': self.course.pk, 'export': 'roster'})
+        department_url = reverse('courses:department_export', kwargs={'department_id': self.department.pk, 'export': 'roster'})
+        self.client.login(username='ex_a', password='password')
+        self.assertEqual(self.client.get(roster_url).status_code, 403)
+        self.client.login(username='ex_t', password='password')
+        self.assertEqual(self.client.get(department_url).status_code, 403) # 教师只能导出自己的课程
+
+        self.client.login(username='ex_r', password='password')
+        rows = self._export(department_url)
+        self.assertEqual([(row[1], row[4], row[7]) for row in rows[1:]], [('ex_a', 'ex_a@example.com', 'A'), ('ex_b', 'ex_b@example.com', '')])
+        self.assertEqual(self.client.get(reverse('courses:course_export', kwargs={'pk': self.course.pk, 'export': 'passwords'})).status_code, 404)
+
+    def test_export_filename_is_escaped(self):
+        course = Course.objects.create(code='化学"101', title='Chemistry', instructor=self.teacher)
+        self.client.login(username='ex_t', password='password')
+        response = self.client.get(reverse('courses:course_export', kwargs={'pk': course.pk, 'export': 'roster'}))
+        self.assertEqual(response['Content-Disposition'], "attachment; filename*=utf-8''%E5%8C%96%E5%AD%A6%22101-roster.csv")
+
+    def test_large_department_export_streams_with_flat_memory(self):
+        students = User.objects.bulk_create(
+            User(username=f'ex_bulk{i}', email=f'ex_bulk{i}@example.com', role=User.ROLE_STUDENT, password='!') for i in range(1000)
+        )
+        # 4 门课 × 1000 名学生 × 25 个作业 = 10 万行，每门课只有第一个作业有提交
+        for c in range(4):
+            course = Course.objects.create(code=f'EXL{c}', title=f'Large {c}', department=self.department)
+            assignments = Assignment.objects.bulk_create(
+                Assignment(course=course, title=f'Week {a}', description='-', due_date=timezone.now()) for a in range(25)
+            )
+            Enrollment.objects.bulk_create(Enrollment(course=course, student=student, grade='B') for student in students)
+            Submission.objects.bulk_create(
+                Submission(assignment=assignments[0], student=student, submitted_file='s/x.pdf', grade='75') for student in students
+            )
+        self.client.login(username='ex_r', password='password')
+        response = self.client.get(reverse('courses:department_export', kwargs={'department_id': self.department.pk, 'export': 'gradebook'}))
+
+        tracemalloc.start()
+        try:
+            size = lines = 0
+            for chunk in response.streaming_content:
+                size += len(chunk)
+                lines += chunk.count(b'\n')
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(lines, 1 + 4 + 4 * 1000 * 25) # 表头 + EX101 的 4 行 + 大课程
+        self.assertGreater(size, 4_000_000)
+        self.assertLess(peak, 3_000_000) # 峰值只取决于每批读取的行数，与导出行数无关
+
+
+class TranscriptTests(TestCase):
+    """
+    测试成绩换算、成绩单汇总的增量维护与批量重算、班级 GPA
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Transcript Department')
+        cls.cohort = Class.objects.create(name='Transcript Class', academic_year='2025/2026')
+        cls.math = Course.objects.create(code='TR101', title='Calculus', credits=4, department=cls.department)
+        cls.art = Course.objects.create(code='TR201', title='Drawing', credits=2)
+        cls.seminar = Course.objects.create(code='TR301', title='Seminar', credits=1)
+        cls.alice = User.objects.create_user(email='tr_a@example.com', username='tr_a', password='password', role=User.ROLE_STUDENT)
+        cls.bob = User.objects.create_user(email='tr_b@example.com', username='tr_b', password='password', role=User.ROLE_STUDENT)
+        for i, student in enumerate((cls.alice, cls.bob)):
+            StudentProfile.objects.create(user=student, student_id_number=f'TR{i}', enrollment_date=timezone.now().date(), assigned_class=cls.cohort)
+
+    def _summary(self, student):
+        transcript = StudentTranscript.objects.filter(student=student).first()
+        return transcript and (transcript.gpa, transcript.gpa_credits, transcript.credits_earned)
+
+    def test_grade_scale(self):
+        self.assertEqual(grade_value('A-'), (Decimal('3.7'), True))
+        self.assertEqual(grade_value(' b+ '), (Decimal('3.3'), True))
+        self.assertEqual(grade_value('F'), (Decimal('0.0'), False))
+        self.assertEqual(grade_value('86'), (Decimal('3.7'), True))
+        self.assertEqual(grade_value('59.5'), (Decimal('0.0'), False))
+        self.assertEqual(grade_value('P'), (None, True))
+        self.assertEqual(grade_value('NP'), (None, False))
+        self.assertEqual(grade_value('W'), (None, False))
+        self.assertEqual(grade_value('NaN'), (None, False))
+
+    def test_aggregates_follow_grade_changes(self):
+        math = Enrollment.objects.create(course=self.math, student=self.alice)
+        self.assertIsNone(self._summary(self.alice)) # 没有成绩时不建汇总行
+        math.grade = 'A'
+        math.save()
+        art = Enrollment.objects.create(course=self.art, student=self.alice, grade='C')
+        seminar = Enrollment.objects.create(course=self.seminar, student=self.alice, grade='P')
+        # (4.0 × 4 + 2.0 × 2) / 6 = 3.33，P 只计入获得学分
+        self.assertEqual(self._summary(self.alice), (Decimal('3.33'), 6, 7))
+
+        art.grade = '95'
+        art.save()
+        self.assertEqual(self._summary(self.alice), (Decimal('4.00'), 6, 7))
+        seminar.delete()
+        self.assertEqual(self._summary(self.alice), (Decimal('4.00'), 6, 6))
+        art.student = self.bob # 管理后台把记录改到另一个学生
+        art.save()
+        self.assertEqual(self._summary(self.alice), (Decimal('4.00'), 4, 4))
+        self.assertEqual(self._summary(self.bob), (Decimal('4.00'), 2, 2))
+
+        self.math.credits = 2
+        self.math.save()
+        self.assertEqual(self._summary(self.alice), (Decimal('4.00'), 2, 2))
+
+        # 增量维护的结果与整体重算一致
+        expected = {t.pk: (t.quality_points, t.gpa_credits, t.credits_earned) for t in StudentTranscript.objects.all()}
+        StudentTranscript.objects.all().delete()
+        self.assertEqual(rebuild_transcripts(), 2)
+        rebuilt = {t.pk: (t.quality_points, t.gpa_credits, t.credits_earned) for t in StudentTranscript.objects.all()}
+        self.assertEqual(rebuilt, expected)
+
+    def test_bulk_grading_and_department_rebuild(self):
+        Enrollment.objects.create(course=self.math, student=self.alice)
+        Enrollment.objects.create(course=self.math, student=self.bob)
+        Enrollment.objects.create(course=self.art, student=self.bob, grade='B')
+        apply_grades(self.math, [(1, 'tr_a', 'B'), (2, 'tr_b', 'F')])
+        self.assertEqual(self._summary(self.alice), (Decimal('3.00'), 4, 4))
+        self.assertEqual(self._summary(self.bob), (Decimal('1.00'), 6, 2))
+
+        cohort = cohort_gpas()[self.cohort.pk]
+        self.assertEqual((cohort['gpa'], cohort['gpa_credits'], cohort['students']), (Decimal('1.80'), 10, 2))
+
+        StudentTranscript.objects.update(quality_points=0, gpa_credits=0, credits_earned=0)
+        call_command('rebuild_transcripts', department=self.department.pk, stdout=StringIO())
+        self.assertEqual(self._summary(self.alice), (Decimal('3.00'), 4, 4))
+        self.assertEqual(self._summary(self.bob), (Decimal('1.00'), 6, 2)) # 包括院系外的课程
+
+    def test_batch_totals_match_per_enrollment_contributions(self):
+        grades = ['A', 'A-', 'B+', 'C-', 'D+', 'F', 'P', 'NP', 'W', '86', '59.5', '100', 'abc']
+        grouped = [(student_id, grade, (student_id * 7 + i) % 5 + 1) for student_id in range(1, 40) for i, grade in enumerate(grades[student_id % 4::3])]
+        expected = {}
+        for student_id, grade, credits in grouped:
+            total = expected.setdefault(student_id, (Decimal('0'), 0, 0))
+            expected[student_id] = tuple(t + c for t, c in zip(total, contribution(grade, credits)))
+        self.assertEqual(_transcript_totals(grouped), expected)
+        self.assertEqual(_transcript_totals([]), {})
+
+    def test_transcript_page(self):
+        Enrollment.objects.create(course=self.math, student=self.alice, grade='A-')
+        self.client.login(username='tr_a', password='password')
+        response = self.client.get(reverse('users:student_transcript'))
+        self.assertContains(response, 'Calculus')
+        self.assertContains(response, '3.70', count=2) # 本人 GPA 与班级平均
+
+
+class WeightedGradebookTests(TestCase):
+    """
+    测试按作业分数、权重和去掉最低分计算总评
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(email='wg_t@example.com', username='wg_t', password='password', role=User.ROLE_TEACHER)
+        cls.course = Course.objects.create(code='WG101', title='Weighted', credits=3, instructor=cls.teacher, drop_lowest=1)
+        past = timezone.now() - timezone.timedelta(days=1)
+        cls.homework = [
+            Assignment.objects.create(course=cls.course, title=f'HW{i}', description='-', due_date=past, max_score=10, category='Homework')
+            for i in range(3)
+        ]
+        cls.exam = Assignment.objects.create(course=cls.course, title='Exam', description='-', due_date=past, weight=3)
+        cls.project = Assignment.objects.create(course=cls.course, title='Project', description='-',
+                                                due_date=timezone.now() + timezone.timedelta(days=7), weight=5)
+        cls.students = {}
+        for name in ('ann', 'ben', 'cat'):
+            cls.students[name] = User.objects.create_user(email=f'wg_{name}@example.com', username=f'wg_{name}', password='password', role=User.ROLE_STUDENT)
+            Enrollment.objects.create(course=cls.course, student=cls.students[name])
+
+    def _submit(self, name, assignment, score):
+        Submission.objects.create(assignment=assignment, student=self.students[name], submitted_file='s/x.pdf', score=score)
+
+    def test_weights_drops_and_missing_work(self):
+        for assignment, score in zip(self.homework, (10, 5, 8)):
+            self._submit('ann', assignment, score)
+        self._submit('ann', self.exam, 90)
+        self._submit('ben', self.homework[0], 7) # 其余作业缺交，截止后记 0 分
+        self._submit('cat', self.exam, None) # 已提交未评分，不计入
+        percentages = final_percentages(self.course)
+        # ann: 去掉 5/10 后 (1.0 + 0.8 + 0.9 × 3) / 5；未截止的项目不计入
+        self.assertAlmostEqual(percentages[self.students['ann'].pk], 90.0)
+        # ben: 作业 [0.7, 0, 0] 去掉一个 0，考试缺交 0 分
+        self.assertAlmostEqual(percentages[self.students['ben'].pk], 14.0)
+        self.assertAlmostEqual(percentages[self.students['cat'].pk], 0.0)
+
+        self._submit('ann', self.project, 100) # 提前提交并评分的作业计入
+        self.assertAlmostEqual(final_percentages(self.course)[self.students['ann'].pk], 95.0)
+
+    def test_drop_lowest_keeps_at_least_one_score(self):
+        matrix = np.array([[0.5, np.nan, 0.9], [np.nan, np.nan, 0.4], [0.2, 0.1, 0.3]])
+        dropped = drop_lowest(matrix, [0, 1, 2], 2)
+        np.testing.assert_array_equal(np.isnan(dropped), [[True, True, False], [True, True, False], [True, True, False]])
+        self.assertEqual(dropped[2, 2], 0.3)
+        self.assertTrue(np.isnan(matrix[0, 1]) and matrix[0, 0] == 0.5) # 不修改传入的矩阵
+
+    def test_apply_writes_grades_with_one_update(self):
+        self._submit('ann', self.exam, 88)
+        Enrollment.objects.filter(student=self.students['cat']).update(grade='A')
+        Course.objects.filter(pk=self.course.pk).update(drop_lowest=0)
+        self.course.refresh_from_db()
+        with CaptureQueriesContext(connection) as queries:
+            updated = apply_final_grades(self.course, now=timezone.now() - timezone.timedelta(days=2)) # 作业均未截止
+        self.assertEqual(updated, 1)
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "courses_enrollment"')]
+        self.assertEqual(len(updates), 1)
+        grades = dict(Enrollment.objects.filter(course=self.course).values_list('student__username', 'grade'))
+        self.assertEqual(grades, {'wg_ann': '88.0', 'wg_ben': None, 'wg_cat': 'A'}) # 没有计入成绩的学生保持原成绩
+        self.assertEqual(StudentTranscript.objects.get(student=self.students['ann']).gpa, Decimal('3.70'))
+        self.assertEqual(apply_final_grades(self.course, now=timezone.now() - timezone.timedelta(days=2)), 0)
+
+    def test_compute_view(self):
+        self._submit('ann', self.exam, 75)
+        self.client.login(username='wg_t', password='password')
+        url = reverse('courses:compute_final_grades', kwargs={'course_id': self.course.pk})
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse('courses:grade_enrollments', kwargs={'course_id': self.course.pk}))
+        self.assertEqual(Enrollment.objects.get(student=self.students['ann']).grade, '45.0') # (0 + 0 + 0.75 × 3) / 5，缺交的作业去掉一个
+
+
+class ChunkedUploadTests(TemporaryMediaMixin, TestCase):
+    """
+    测试可续传的分片上传：乱序/重传分片、校验、权限、完成后存入 FileField，以及内存占用
+    """
+    PART_SIZE = 64 * 1024
+
+    @classmethod
+    def temporary_settings(cls, tmp):
+        return {
+            'MEDIA_ROOT': os.path.join(tmp, 'media'), 'UPLOAD_SESSION_ROOT': os.path.join(tmp, 'sessions'),
+            'UPLOAD_PART_SIZE': cls.PART_SIZE,
+        }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(email='cu_t@example.com', username='cu_t', password='password', role=User.ROLE_TEACHER)
+        cls.other_teacher = User.objects.create_user(email='cu_o@example.com', username='cu_o', password='password', role=User.ROLE_TEACHER)
+        cls.student = User.objects.create_user(email='cu_s@example.com', username='cu_s', password='password', role=User.ROLE_STUDENT)
+        cls.intruder = User.objects.create_user(email='cu_x@example.com', username='cu_x', password='password', role=User.ROLE_STUDENT)
+        cls.course = Course.objects.create(code='CU101', title='Chunked', instructor=cls.teacher)
+        cls.assignment = Assignment.objects.create(course=cls.course, title='Big upload', description='-', due_date=timezone.now())
+
+    def _start(self, **body):
+        response = self.client.post(reverse('courses:upload_session_create'), json.dumps(body), content_type='application/json')
+        return response
+
+    def _put(self, session_id, number, data, **headers):
+        url = reverse('courses:upload_part', kwargs={'session_id': session_id, 'number': number})
+        return self.client.put(url, data, content_type='application/octet-stream', headers=headers)
+
+    def test_out_of_order_resumable_upload_creates_submission(self):
+        content = os.urandom(self.PART_SIZE * 2 + 1000)
+        self.client.login(username='cu_s', password='password')
+        response = self._start(assignment=self.assignment.pk, filename='../report final.pdf', size=len(content),
+                               sha256=hashlib.sha256(content).hexdigest())
+        self.assertEqual(response.status_code, 201)
+        session = response.json()
+        self.assertEqual((session['parts'], session['received']), (3, []))
+        parts = [content[i:i + self.PART_SIZE] for i in range(0, len(content), self.PART_SIZE)]
+
+        self.assertEqual(self._put(session['id'], 2, parts[2]).status_code, 200)
+        self.assertEqual(self._put(session['id'], 0, parts[0], X_Part_SHA256=hashlib.sha256(parts[0]).hexdigest()).status_code, 200)
+        response = self.client.post(reverse('courses:upload_complete', kwargs={'session_id': session['id']}))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['missing'], [1])
+
+        # 断线后查询状态，只补传缺少的分片
+        status = self.client.get(reverse('courses:upload_session', kwargs={'session_id': session['id']})).json()
+        self.assertEqual(status['received'], [0, 2])
+        self._put(session['id'], 1, parts[1])
+        response = self.client.post(reverse('courses:upload_complete', kwargs={'session_id': session['id']}))
+        self.assertEqual(response.json()['redirect'], reverse('courses:assignment_detail', kwargs={'assignment_id': self.assignment.pk}))
+
+        submission = Submission.objects.get(assignment=self.assignment, student=self.student)
+        self.assertEqual(submission.submitted_file.name, f'blobs/{hashlib.sha256(content).hexdigest()[:2]}/{hashlib.sha256(content).hexdigest()}.pdf')
+        with submission.submitted_file.open('rb') as f:
+            self.assertEqual(f.read(), content)
+        upload = UploadSession.objects.get()
+        self.assertEqual(upload.status, UploadSession.STATUS_COMPLETE)
+        self.assertFalse(session_path(upload).exists())
+        self.assertFalse(UploadPart.objects.exists())
+        self.assertEqual(self._put(session['id'], 0, parts[0]).status_code, 400) # 已完成的会话不再接受分片
+
+    def test_bad_parts_are_rejected(self):
+        self.client.login(username='cu_t', password='password')
+        response = self._start(course=self.course.pk, filename='slides.pdf', size=self.PART_SIZE + 10, title='Week 1 slides')
+        session_id = response.json()['id']
+        self.assertEqual(self._put(session_id, 1, b'x' * 11).status_code, 400) # 最后一个分片应为 10 字节
+        self.assertEqual(self._put(session_id, 2, b'x' * 10).status_code, 400) # 编号超出范围
+        self.assertEqual(self._put(session_id, 1, b'x' * 10).status_code, 200)
+        response = self._put(session_id, 1, b'y' * 10, X_Part_SHA256=hashlib.sha256(b'x' * 10).hexdigest())
+        self.assertEqual(response.json()['error'], 'Checksum mismatch for part 1.')
+        # 重传失败后原分片内容已被覆盖，不能再算作已收到
+        self.assertEqual(self.client.get(reverse('courses:upload_session', kwargs={'session_id': session_id})).json()['received'], [])
+
+        self._put(session_id, 0, b'a' * self.PART_SIZE)
+        self._put(session_id, 1, b'b' * 10)
+        self.client.post(reverse('courses:upload_complete', kwargs={'session_id': session_id}))
+        material = CourseMaterial.objects.get()
+        self.assertEqual((material.title, material.uploaded_by, material.file.size), ('Week 1 slides', self.teacher, self.PART_SIZE + 10))
+
+    def test_permissions(self):
+        self.client.login(username='cu_o', password='password')
+        self.assertEqual(self._start(course=self.course.pk, filename='a.pdf', size=10).status_code, 403)
+        self.assertEqual(self._start(assignment=self.assignment.pk, filename='a.pdf', size=10).status_code, 403)
+
+        self.client.login(username='cu_s', password='password')
+        self.assertEqual(self._start(assignment=self.assignment.pk, filename='a.pdf', size=0).status_code, 400)
+        self.assertEqual(self._start(assignment='x', filename='a.pdf', size=10).status_code, 400)
+        session_id = self._start(assignment=self.assignment.pk, filename='a.pdf', size=10).json()['id']
+        self.client.login(username='cu_x', password='password')
+        self.assertEqual(self._put(session_id, 0, b'x' * 10).status_code, 404) # 只有会话创建者可以上传
+
+        Submission.objects.create(assignment=self.assignment, student=self.student, submitted_file='s/a.pdf')
+        self.client.login(username='cu_s', password='password')
+        self.assertEqual(self._start(assignment=self.assignment.pk, filename='b.pdf', size=10).status_code, 409)
+        self._put(session_id, 0, b'x' * 10)
+        response = self.client.post(reverse('courses:upload_complete', kwargs={'session_id': session_id}))
+        self.assertEqual(response.json()['error'], 'You have already submitted this assignment.')
+
+    def test_memory_stays_flat_for_large_files(self):
+        # 直接调用服务层，请求体用按需生成数据的流代替 (测试客户端本身会为每个请求保留少量对象)
+        class GeneratedStream:
+            def __init__(self, size):
+                self.remaining = size
+
+            def read(self, n):
+                n = min(n, self.remaining)
+                self.remaining -= n
+                return b'z' * n
+
+        size = 16 * 1024 * 1024
+        session = start_session(self.teacher, filename='video.mp4', size=size, course=self.course)
+        tracemalloc.start()
+        try:
+            for number in range(session.total_parts):
+                write_part(session, number, GeneratedStream(session.expected_part_size(number)))
+            material = complete_session(session)
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(material.file.size, size)
+        self.assertLess(peak, 512 * 1024) # 16 MB 的文件，峰值不到 512 KB
+
+    def test_expired_sessions_are_cleaned_up(self):
+        self.client.login(username='cu_t', password='password')
+        session_id = self._start(course=self.course.pk, filename='old.pdf', size=10).json()['id']
+        path = session_path(UploadSession.objects.get())
+        self.assertTrue(path.exists())
+        UploadSession.objects.update(updated_at=timezone.now() - timezone.timedelta(days=2))
+        call_command('cleanup_upload_sessions', stdout=StringIO())
+        self.assertFalse(path.exists())
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+
+
+class ContentAddressedStorageTests(TemporaryMediaMixin, TestCase):
+    """
+    测试按内容去重的文件存储：相同内容只存一份，引用计数随模型增删改变化，为 0 时删除文件，以及 reconcile_blobs
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(email='cas_t@example.com', username='cas_t', password='password', role=User.ROLE_TEACHER)
+        cls.section_a = Course.objects.create(code='CAS101-A', title='Section A', instructor=cls.teacher)
+        cls.section_b = Course.objects.create(code='CAS101-B', title='Section B', instructor=cls.teacher)
+
+    def _upload(self, course, content, filename='lecture01.PDF'):
+        self.client.login(username='cas_t', password='password')
+        url = reverse('courses:upload_material', kwargs={'course_id': course.pk})
+        response = self.client.post(url, {'title': 'Lecture 1', 'file': SimpleUploadedFile(filename, content)})
+        self.assertEqual(response.status_code, 302)
+        return CourseMaterial.objects.filter(course=course).latest('pk')
+
+    def _expire_grace(self):
+        StoredBlob.objects.update(saved_at=timezone.now() - UNUSED_GRACE * 2)
+
+    def test_same_content_is_stored_once(self):
+        content = b'%PDF-1.4 lecture slides'
+        first = self._upload(self.section_a, content)
+        second = self._upload(self.section_b, content, filename='copy.pdf')
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(first.file.name, f'blobs/{digest[:2]}/{digest}.pdf')
+        self.assertEqual(second.file.name, first.file.name)
+        self.assertEqual(os.listdir(os.path.join(self.tmp, 'blobs', digest[:2])), [f'{digest}.pdf'])
+        blob = StoredBlob.objects.get()
+        self.assertEqual((blob.sha256, blob.size, blob.ref_count), (digest, len(content), 2))
+        with second.file.open('rb') as f:
+            self.assertEqual(f.read(), content)
+
+    def test_file_is_deleted_with_its_last_reference(self):
+        first = self._upload(self.section_a, b'shared handout')
+        second = self._upload(self.section_b, b'shared handout')
+        path = first.file.path
+        self._expire_grace()
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_recently_saved_content_is_kept_until_reconcile(self):
+        # 刚上传过的内容可能正要被另一个请求引用，release 不立即删除
+        material = self._upload(self.section_a, b'just uploaded')
+        path = material.file.path
+        with self.captureOnCommitCallbacks(execute=True):
+            material.delete()
+        self.assertTrue(os.path.exists(path))
+        self._expire_grace()
+        call_command('reconcile_blobs', stdout=StringIO())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_saving_the_same_content_again_keeps_an_unused_file(self):
+        # 没有引用的旧文件正要被清理时，又有人上传了相同内容：_save 刷新 saved_at，清理时在锁内重新检查后跳过
+        material = self._upload(self.section_a, b'uploaded again')
+        path = material.file.path
+        with self.captureOnCommitCallbacks(execute=True):
+            material.delete()
+        self._expire_grace()
+        name = blob_storage.save('again.pdf', ContentFile(b'uploaded again'))
+        self.assertFalse(delete_if_unused(name))
+        self.assertTrue(os.path.exists(path))
+        StoredBlob.objects.filter(name=name).update(saved_at=timezone.now() - UNUSED_GRACE * 2)
+        self.assertTrue(delete_if_unused(name))
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_replacing_a_file_moves_the_reference(self):
+        assignment = Assignment.objects.create(
+            course=self.section_a, title='HW', description='-', due_date=timezone.now(),
+            assignment_file=SimpleUploadedFile('hw.docx', b'version 1'),
+        )
+        old_name = assignment.assignment_file.name
+        self._expire_grace()
+        assignment.assignment_file = SimpleUploadedFile('hw.docx', b'version 2')
+        with self.captureOnCommitCallbacks(execute=True):
+            assignment.save()
+        self.assertFalse(StoredBlob.objects.filter(name=old_name).exists())
+        self.assertFalse(blob_storage.exists(old_name))
+        self.assertEqual(StoredBlob.objects.get(name=assignment.assignment_file.name).ref_count, 1)
+        # 只保存其他字段时不查询也不改变计数
+        with CaptureQueriesContext(connection) as queries:
+            assignment.save(update_fields=['title'])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(StoredBlob.objects.get(name=assignment.assignment_file.name).ref_count, 1)
+
+    def test_reconcile_fixes_counts_and_imports_existing_files(self):
+        material = self._upload(self.section_a, b'tracked')
+        StoredBlob.objects.update(ref_count=7)
+        os.makedirs(os.path.join(self.tmp, 'course_materials'))
+        legacy_path = os.path.join(self.tmp, 'course_materials', 'old.pdf')
+        with open(legacy_path, 'wb') as f:
+            f.write(b'tracked')
+        legacy = CourseMaterial.objects.create(course=self.section_b, title='Old', file='course_materials/old.pdf')
+        self.assertEqual(StoredBlob.objects.get().ref_count, 7) # 旧文件不计数
+
+        call_command('reconcile_blobs', '--import-existing', stdout=StringIO())
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.file.name, material.file.name)
+        self.assertFalse(os.path.exists(legacy_path))
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+
+
+class ProtectedFileTests(TemporaryMediaMixin, TestCase):
+    """
+    测试受保护文件的下载：权限 (一条查询)、Range 和条件请求，以及 X-Accel-Redirect / X-Sendfile
+    """
+
+    @classmethod
+    def temporary_settings(cls, tmp):
+        return {'MEDIA_ROOT': tmp, 'MEDIA_SERVE_BACKEND': 'python'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(email='pf_t@example.com', username='pf_t', password='password', role=User.ROLE_TEACHER)
+        cls.student = User.objects.create_user(email='pf_s@example.com', username='pf_s', password='password', role=User.ROLE_STUDENT)
+        cls.classmate = User.objects.create_user(email='pf_c@example.com', username='pf_c', password='password', role=User.ROLE_STUDENT)
+        cls.outsider = User.objects.create_user(email='pf_o@example.com', username='pf_o', password='password', role=User.ROLE_STUDENT)
+        cls.staff = User.objects.create_user(email='pf_f@example.com', username='pf_f', password='password', role=User.ROLE_STAFF_MEMBER)
+        cls.course = Course.objects.create(code='PF101', title='Protected', instructor=cls.teacher)
+        for student in (cls.student, cls.classmate):
+            Enrollment.objects.create(student=student, course=cls.course)
+        cls.content = b'0123456789abcdef'
+        cls.material = CourseMaterial.objects.create(
+            course=cls.course, title='Week 1 slides', file=SimpleUploadedFile('w1.pdf', cls.content), uploaded_by=cls.teacher)
+        cls.assignment = Assignment.objects.create(course=cls.course, title='HW1', description='-', due_date=timezone.now())
+        cls.submission = Submission.objects.create(
+            assignment=cls.assignment, student=cls.student, submitted_file=SimpleUploadedFile('answer.txt', b'my answer'))
+
+    def _get(self, username, kind, pk, **headers):
+        self.client.login(username=username, password='password')
+        return self.client.get(reverse('courses:download_file', kwargs={'kind': kind, 'pk': pk}), headers=headers)
+
+    def test_material_access(self):
+        response = self._get('pf_s', 'material', self.material.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Disposition'], 'inline; filename="Week 1 slides.pdf"')
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(self.content).hexdigest()}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        for username, status in (('pf_t', 200), ('pf_f', 200), ('pf_o', 403)):
+            self.assertEqual(self._get(username, 'material', self.material.pk).status_code, status, username)
+        self.client.logout()
+        response = self.client.get(reverse('courses:download_file', kwargs={'kind': 'material', 'pk': self.material.pk}))
+        self.assertEqual(response.status_code, 302)
+
+    def test_submission_access(self):
+        response = self._get('pf_s', 'submission', self.submission.pk)
+        self.assertEqual(b''.join(response.streaming_content), b'my answer')
+        self.assertEqual(response['Content-Disposition'], 'inline; filename="pf_s-HW1.txt"')
+        for username, status in (('pf_t', 200), ('pf_f', 200), ('pf_c', 403)):
+            self.assertEqual(self._get(username, 'submission', self.submission.pk).status_code, status, username)
+        self.assertEqual(self._get('pf_s', 'assignment', self.assignment.pk).status_code, 404) # 没有附件
+        self.assertEqual(self._get('pf_s', 'nothing', 1).status_code, 404)
+
+    def test_permission_check_is_one_query(self):
+        self.client.login(username='pf_s', password='password')
+        url = reverse('courses:download_file', kwargs={'kind': 'material', 'pk': self.material.pk})
+        with self.assertNumQueries(3): # 会话、用户、文件和权限
+            self.client.get(url)
+
+    def test_range_requests(self):
+        response = self._get('pf_s', 'material', self.material.pk, Range='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/16')
+        self.assertEqual(response['Content-Length'], '4')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+        response = self._get('pf_s', 'material', self.material.pk, Range='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'def')
+        response = self._get('pf_s', 'material', self.material.pk, Range='bytes=10-')
+        self.assertEqual(b''.join(response.streaming_content), b'abcdef')
+
+        response = self._get('pf_s', 'material', self.material.pk, Range='bytes=16-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */16')
+        # 多个区间不支持，发送整个文件
+        response = self._get('pf_s', 'material', self.material.pk, Range='bytes=0-1,4-5')
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_requests(self):
+        etag = self._get('pf_s', 'material', self.material.pk)['ETag']
+        response = self._get('pf_s', 'material', self.material.pk, If_None_Match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # If-Range 不一致时忽略 Range
+        response = self._get('pf_s', 'material', self.material.pk, Range='bytes=0-3', If_Range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response = self._get('pf_s', 'material', self.material.pk, Range='bytes=0-3', If_Range=etag)
+        self.assertEqual(response.status_code, 206)
+
+    def test_front_server_backends(self):
+        with override_settings(MEDIA_SERVE_BACKEND='nginx', MEDIA_ACCEL_PREFIX='/protected-media/'):
+            response = self._get('pf_s', 'material', self.material.pk)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.material.file.name)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        with override_settings(MEDIA_SERVE_BACKEND='sendfile'):
+            response = self._get('pf_s', 'material', self.material.pk)
+        self.assertEqual(response['X-Sendfile'], self.material.file.path)
+        self.assertEqual(response.content, b'')
+
+
+class SubmissionsZipTests(TemporaryMediaMixin, TestCase):
+    """
+    测试作业提交的 ZIP 打包下载：文件按用户名命名、权限、文件丢失，以及流式生成时的内存占用
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(email='zip_t@example.com', username='zip_t', password='password', role=User.ROLE_TEACHER)
+        cls.course = Course.objects.create(code='ZIP101', title='Zip', instructor=cls.teacher)
+        cls.assignment = Assignment.objects.create(course=cls.course, title='Essay', description='-', due_date=timezone.now())
+        cls.students = {}
+        for username, filename in (('zip_bob', 'essay.docx'), ('zip_amy', 'My Essay.pdf')):
+            student = User.objects.create_user(email=f'{username}@example.com', username=username, password='password', role=User.ROLE_STUDENT)
+            Enrollment.objects.create(student=student, course=cls.course)
+            Submission.objects.create(assignment=cls.assignment, student=student,
+                                      submitted_file=SimpleUploadedFile(filename, f'{username} essay'.encode()))
+            cls.students[username] = student
+
+    def _download(self, username='zip_t'):
+        self.client.login(username=username, password='password')
+        return self.client.get(reverse('courses:download_submissions', kwargs={'assignment_id': self.assignment.pk}))
+
+    def test_zip_contains_files_named_by_username(self):
+        response = self._download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="ZIP101-Essay-submissions.zip"')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), ['zip_amy.pdf', 'zip_bob.docx'])
+            self.assertEqual(archive.read('zip_bob.docx'), b'zip_bob essay')
+            self.assertIsNone(archive.testzip())
+
+    def test_only_instructor_and_staff_can_download(self):
+        self.assertEqual(self._download('zip_bob').status_code, 403)
+        User.objects.create_user(email='zip_f@example.com', username='zip_f', password='password', role=User.ROLE_STAFF_MEMBER)
+        self.assertEqual(self._download('zip_f').status_code, 200)
+
+    def test_missing_files_are_listed(self):
+        # 不删除共用的文件 (setUpTestData 的文件各个测试共用)，改为指向不存在的文件
+        Submission.objects.filter(student=self.students['zip_amy']).update(submitted_file='blobs/00/gone.pdf')
+        with zipfile.ZipFile(io.BytesIO(b''.join(self._download().streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), ['zip_bob.docx', 'missing_files.txt'])
+            self.assertEqual(archive.read('missing_files.txt'), b'zip_amy\n')
+
+    def test_archive_is_streamed_with_flat_memory(self):
+        size = 8 * 1024 * 1024
+        for username in self.students:
+            student = self.students[username]
+            submission = Submission.objects.get(student=student)
+            submission.submitted_file = SimpleUploadedFile('big.bin', os.urandom(size))
+            submission.save()
+        response = self._download()
+        total = 0
+        tracemalloc.start()
+        try:
+            for chunk in response.streaming_content:
+                total += len(chunk)
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertGreater(total, 2 * size)
+        self.assertLess(peak, 1024 * 1024) # 16 MB 的压缩包，峰值不到 1 MB
+
+
+class SubmissionSimilarityTests(TemporaryMediaMixin, TestCase):
+    """
+    测试 MinHash + LSH 查重：相似度估计、候选对只来自同桶的签名、保存提交时计算签名，以及作业页面的报告
+    """
+    ESSAY = (
+        'Normalisation is the process of organising the columns and tables of a relational database to reduce '
+        'data redundancy and improve data integrity. Each table should describe a single entity, every non key '
+        'attribute must depend on the whole key, and transitive dependencies are moved into separate tables so '
+        'that updates, insertions and deletions cannot leave the database in an inconsistent state.'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(email='sim_t@example.com', username='sim_t', password='password', role=User.ROLE_TEACHER)
+        cls.course = Course.objects.create(code='SIM101', title='Similarity', instructor=cls.teacher)
+        cls.assignment = Assignment.objects.create(course=cls.course, title='Essay', description='-', due_date=timezone.now())
+
+    def _submit(self, username, text, filename='essay.txt'):
+        student = User.objects.create_user(email=f'{username}@example.com', username=username, password='password', role=User.ROLE_STUDENT)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Submission.objects.create(assignment=self.assignment, student=student,
+                                             submitted_file=SimpleUploadedFile(filename, text.encode()))
+
+    def test_estimate_tracks_jaccard_similarity(self):
+        words = self.ESSAY.split()
+        edited = ' '.join(words[:40] + ['completely', 'different', 'ending', 'here'] + words[44:])
+        first, second = shingle_hashes(self.ESSAY), shingle_hashes(edited)
+        jaccard = len(np.intersect1d(first, second)) / len(np.union1d(first, second))
+        estimate = estimated_similarity(minhash(first), minhash(second))
+        self.assertAlmostEqual(estimate, jaccard, delta=0.15)
+        self.assertEqual(estimated_similarity(minhash(first), minhash(first)), 1.0)
+        # 中文逐字切分
+        self.assertEqual(len(shingle_hashes('关系数据库的规范化')), 5)
+
+    def test_lsh_only_pairs_signatures_sharing_a_band(self):
+        rng = np.random.default_rng(7)
+        signatures = {i: rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64).astype('<u4') for i in range(2000)}
+        near_copy = signatures[5].copy()
+        near_copy[:20] += 1 # 约 85% 的值相同
+        signatures['copy'] = near_copy
+        pairs = candidate_pairs({str(key): value for key, value in signatures.items()})
+        self.assertEqual(pairs, {('5', 'copy')}) # 随机签名之间没有任何一段相同
+
+    def test_signature_is_computed_when_a_submission_is_saved(self):
+        submission = self._submit('sim_a', self.ESSAY)
+        record = SubmissionSignature.objects.get(submission=submission)
+        self.assertEqual(len(bytes(record.signature)), NUM_PERM * 4)
+        self.assertEqual(record.assignment_id, self.assignment.pk)
+        # 只保存成绩不会重新计算
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            submission.grade = 'A'
+            submission.save(update_fields=['grade'])
+        self.assertEqual(len(queries), 1)
+        # 没有文本的文件不参与查重
+        self.assertFalse(SubmissionSignature.objects.filter(submission=self._submit('sim_b', '\x89PNG', 'scan.png')).exists())
+
+    def test_report_ranks_similar_pairs_on_assignment_page(self):
+        words = self.ESSAY.split()
+        original = self._submit('sim_ann', self.ESSAY)
+        self._submit('sim_ben', ' '.join(words[:50] + ['however', 'indexes', 'matter', 'too'] + words[54:]))
+        self._submit('sim_cat', self.ESSAY.upper()) # 大小写不影响
+        self._submit('sim_dan', 'Transactions guarantee atomicity, consistency, isolation and durability for concurrent database users.')
+
+        pairs = suspicious_pairs(self.assignment)
+        students = [{Submission.objects.get(pk=pk).student.username for pk in (pair.first, pair.second)} for pair in pairs]
+        self.assertEqual(students[0], {'sim_ann', 'sim_cat'})
+        self.assertEqual(pairs[0].similarity, 1.0)
+        self.assertEqual(sorted(map(sorted, students)), [['sim_ann', 'sim_ben'], ['sim_ann', 'sim_cat'], ['sim_ben', 'sim_cat']])
+
+        self.client.login(username='sim_t', password='password')
+        response = self.client.get(reverse('courses:assignment_detail', kwargs={'assignment_id': self.assignment.pk}))
+        self.assertContains(response, 'Similar Submissions')
+        self.assertContains(response, '100%')
+        self.assertEqual([pair['similarity'] for pair in response.context['similar_pairs']][0], 100)
+        self.assertIn(original, (response.context['similar_pairs'][0]['first'], response.context['similar_pairs'][0]['second']))
+
+    def test_rebuild_signatures_command(self):
+        submission = self._submit('sim_e', self.ESSAY)
+        SubmissionSignature.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_signatures', '--assignment', str(self.assignment.pk), stdout=out)
+        self.assertTrue(SubmissionSignature.objects.filter(submission=submission).exists())
+        self.assertIn('Computed 1 signature(s)', out.getvalue())
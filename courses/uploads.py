@@ -0,0 +1,165 @@
+# courses/uploads.py
+"""
+可续传的分片上传 (作业提交和课程资料)。协议：
+    1. 创建上传会话 (文件名、大小、可选的整体 SHA-256)，服务端按 settings.UPLOAD_PART_SIZE 切分成固定大小的分片；
+    2. 逐个 PUT 分片 (可并发、可乱序、失败后重传)，每个分片直接流式写入会话临时文件的对应偏移处，
+       同时计算 SHA-256，客户端提供的分片校验和不一致时拒绝；
+    3. 中断后查询会话状态，只补传缺少的分片；
+    4. 全部到齐后完成会话：校验整体 SHA-256，把临时文件存入原有的 FileField (Submission.submitted_file /
+       CourseMaterial.file)，删除临时文件。
+读写都按 COPY_BLOCK_SIZE 分块进行，进程内存占用与文件大小无关。
+"""
+import hashlib
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import CourseMaterial, Submission, UploadPart, UploadSession
+
+COPY_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """上传请求无效 (分片编号、大小或校验和不对，会话已完成等)，message 可以直接返回给客户端。"""
+
+
+def part_size():
+    return getattr(settings, 'UPLOAD_PART_SIZE', 5 * 1024 * 1024)
+
+
+def session_root():
+    return Path(getattr(settings, 'UPLOAD_SESSION_ROOT', Path(settings.MEDIA_ROOT).parent / 'upload_sessions'))
+
+
+def session_path(session):
+    return session_root() / f'{session.pk}.upload'
+
+
+def start_session(user, *, filename, size, sha256='', assignment=None, course=None, title='', description=''):
+    """创建上传会话并预先分配临时文件。assignment 和 course 二选一，分别对应作业提交和课程资料。"""
+    max_size = getattr(settings, 'UPLOAD_MAX_SIZE', 2 * 1024 ** 3)
+    if not isinstance(size, int) or isinstance(size, bool) or not 0 < size <= max_size:
+        raise UploadError(f'File size must be between 1 byte and {max_size} bytes.')
+    filename = get_valid_filename(os.path.basename(str(filename or '')))[:200]
+    if not filename:
+        raise UploadError('A file name is required.')
+    sha256 = (sha256 or '').lower()
+    if sha256 and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256)):
+        raise UploadError('sha256 must be a hex SHA-256 digest.')
+    session = UploadSession.objects.create(
+        user=user, filename=filename, size=size, part_size=part_size(), sha256=sha256,
+        target=UploadSession.TARGET_SUBMISSION if assignment else UploadSession.TARGET_MATERIAL,
+        assignment=assignment, course=course, title=title[:200], description=description,
+    )
+    path = session_path(session)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.truncate(size) # 稀疏文件，各分片按偏移写入
+    return session
+
+
+def received_parts(session):
+    return list(session.parts.order_by('number').values_list('number', flat=True))
+
+
+def missing_parts(session):
+    received = set(received_parts(session))
+    return [number for number in range(session.total_parts) if number not in received]
+
+
+def write_part(session, number, stream, sha256=None):
+    """
+    把分片 number 从 stream (可 read(n) 的对象，例如 request) 流式写入临时文件，返回分片的 SHA-256。
+    长度必须正好等于该分片应有的大小；提供 sha256 时还必须一致。重传同一分片会覆盖之前的内容。
+    """
+    if session.status != UploadSession.STATUS_ACTIVE:
+        raise UploadError('This upload session is no longer active.')
+    if not 0 <= number < session.total_parts:
+        raise UploadError(f'Part number must be between 0 and {session.total_parts - 1}.')
+    expected = session.expected_part_size(number)
+    digest = hashlib.sha256()
+    remaining = expected
+    with open(session_path(session), 'r+b') as f:
+        f.seek(number * session.part_size)
+        while remaining > 0:
+            block = stream.read(min(COPY_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            f.write(block)
+            remaining -= len(block)
+    checksum = digest.hexdigest()
+    error = None
+    if remaining or stream.read(1):
+        error = f'Part {number} must be exactly {expected} bytes.'
+    elif sha256 and sha256.lower() != checksum:
+        error = f'Checksum mismatch for part {number}.'
+    if error:
+        # 这段内容已被覆盖，之前收到的同一分片也不再有效
+        UploadPart.objects.filter(session=session, number=number).delete()
+        raise UploadError(error)
+    UploadPart.objects.update_or_create(session=session, number=number, defaults={'size': expected, 'sha256': checksum})
+    UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now())
+    return checksum
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete_session(session):
+    """
+    校验分片齐全及整体校验和，把文件存入目标 FileField 并创建 Submission / CourseMaterial，返回创建的对象。
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status != UploadSession.STATUS_ACTIVE:
+            raise UploadError('This upload session is no longer active.')
+        missing = missing_parts(session)
+        if missing:
+            raise UploadError(f'{len(missing)} part(s) have not been uploaded yet.')
+        path = session_path(session)
+        if session.sha256 and file_sha256(path) != session.sha256:
+            raise UploadError('Checksum mismatch for the assembled file.')
+        try:
+            with transaction.atomic(), open(path, 'rb') as f:
+                target = _save_target(session, File(f, name=session.filename))
+        except IntegrityError:
+            raise UploadError('You have already submitted this assignment.')
+        session.status = UploadSession.STATUS_COMPLETE
+        session.save(update_fields=['status', 'updated_at'])
+        session.parts.all().delete()
+    path.unlink(missing_ok=True)
+    return target
+
+
+def _save_target(session, file):
+    # FileField 保存时由存储后端分块复制，不会整个读入内存
+    if session.target == UploadSession.TARGET_SUBMISSION:
+        return Submission.objects.create(assignment_id=session.assignment_id, student_id=session.user_id, submitted_file=file)
+    return CourseMaterial.objects.create(
+        course_id=session.course_id, title=session.title or session.filename, description=session.description,
+        file=file, uploaded_by_id=session.user_id,
+    )
+
+
+def expire_sessions(max_age=None):
+    """删除超过 max_age (默认 settings.UPLOAD_SESSION_TTL 小时) 未活动的会话及其临时文件，返回删除的会话数。"""
+    max_age = max_age or timedelta(hours=getattr(settings, 'UPLOAD_SESSION_TTL', 24))
+    stale = UploadSession.objects.filter(updated_at__lt=timezone.now() - max_age)
+    count = 0
+    for session in stale.iterator():
+        session_path(session).unlink(missing_ok=True)
+        session.delete()
+        count += 1
+    return count
@@ -5,13 +5,17 @@ from .views import CourseDetailView
 from .views import CourseUpdateView
 from .views import CourseDeleteView
 from .views import EnrollCourseView, DropCourseView
-from .views import GradeEnrollmentsView
+from .views import GradeEnrollmentsView, FinalGradesView
 from .views import UploadMaterialView, DeleteMaterialView
 from .views import CreateAssignmentViewActual, UpdateAssignmentView, DeleteAssignmentView
 from .views import AssignmentDetailView
 from .views import SubmitAssignmentView
 from .views import GradeSubmissionView
 from .views import TeacherCourseManagementView
+from .views import CourseAutocompleteView
+from .views import CourseExportView, DepartmentExportView
+from .views import UploadSessionCreateView, UploadSessionStatusView, UploadPartView, UploadCompleteView
+from .views import ProtectedFileView, SubmissionsZipView
 # from . import views
 
 app_name = 'courses'
@@ -22,6 +26,7 @@ urlpatterns = [
     # path('<int:pk>/', CourseDetailView.as_view(), name='course_detail'),
 
     path('', CourseListView.as_view(), name='course_list'),
+    path('autocomplete/', CourseAutocompleteView.as_view(), name='course_autocomplete'),
     path('create/', CourseCreateViewActual.as_view(), name='course_create'),
     path('<int:pk>/', CourseDetailView.as_view(), name='course_detail'),
     path('<int:pk>/update/', CourseUpdateView.as_view(), name='course_update'),
@@ -29,13 +34,22 @@ urlpatterns = [
     path('<int:course_id>/enroll/', EnrollCourseView.as_view(), name='enroll_course'),
     path('enrollment/<int:enrollment_id>/drop/', DropCourseView.as_view(), name='drop_course'),
     path('<int:course_id>/grades/', GradeEnrollmentsView.as_view(), name='grade_enrollments'),
+    path('<int:course_id>/grades/final/', FinalGradesView.as_view(), name='compute_final_grades'),
     path('<int:course_id>/materials/upload/', UploadMaterialView.as_view(), name='upload_material'),
     path('materials/<int:pk>/delete/', DeleteMaterialView.as_view(), name='delete_material'), # pk here is material's pk
     path('<int:course_id>/assignments/create/', CreateAssignmentViewActual.as_view(), name='create_assignment'),
     path('assignments/<int:pk>/update/', UpdateAssignmentView.as_view(), name='update_assignment'), # pk is assignment's pk
     path('assignments/<int:pk>/delete/', DeleteAssignmentView.as_view(), name='delete_assignment'),
     path('assignments/<int:assignment_id>/', AssignmentDetailView.as_view(), name='assignment_detail'),
+    path('assignments/<int:assignment_id>/submissions.zip', SubmissionsZipView.as_view(), name='download_submissions'),
     path('assignments/<int:assignment_id>/submit/', SubmitAssignmentView.as_view(), name='submit_assignment'),
     path('submissions/<int:submission_id>/grade/', GradeSubmissionView.as_view(), name='grade_submission'),
+    path('<int:pk>/export/<str:export>.csv', CourseExportView.as_view(), name='course_export'),
+    path('departments/<int:department_id>/export/<str:export>.csv', DepartmentExportView.as_view(), name='department_export'),
+    path('uploads/', UploadSessionCreateView.as_view(), name='upload_session_create'),
+    path('uploads/<uuid:session_id>/', UploadSessionStatusView.as_view(), name='upload_session'),
+    path('uploads/<uuid:session_id>/parts/<int:number>/', UploadPartView.as_view(), name='upload_part'),
+    path('uploads/<uuid:session_id>/complete/', UploadCompleteView.as_view(), name='upload_complete'),
+    path('files/<str:kind>/<int:pk>/', ProtectedFileView.as_view(), name='download_file'),
     path('my-teaching/', TeacherCourseManagementView.as_view(), name='manage_teacher_courses'),
 ]
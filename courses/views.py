@@ -1,23 +1,40 @@
 # courses/views.py
+import json
+import os
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse_lazy, reverse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from django.contrib.auth.mixins import LoginRequiredMixin # Ensure user is logged in
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin # Ensure user is logged in
 from django.contrib import messages
-from .models import Course, Enrollment, CourseMaterial 
+from .models import Course, Enrollment, CourseMaterial, UploadSession
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import Exists, F, OuterRef, Prefetch
 from .models import Assignment, Submission
 from .forms import CourseForm
 from .forms import CourseCreationForm # Phase 3
 from .forms import CourseMaterialForm
 from .forms import AssignmentForm #, SubmissionForm (later)
-from .forms import EnrollmentGradeFormSet
+from .forms import EnrollmentGradeFormSet, GradeUploadForm
 from .forms import SubmissionForm
 from .forms import GradeSubmissionForm
 from .forms import CourseCreationForm
 from users.mixins import TeacherRequiredMixin, StudentRequiredMixin # 从阶段三复用
-from users.models import User # 确保 User 模型导入
+from users.models import Department, User # 确保 User 模型导入
 from django.views import View
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
 from .filters import CourseFilter
+from .search import course_index
+from .grading import apply_grades, read_grade_file, read_grade_json, save_grades
+from .exports import csv_response, gradebook_rows, roster_rows
+from .gradebook import apply_final_grades
+from .similarity import suspicious_pairs
+from .downloads import serve_file, submissions_zip
+from .uploads import UploadError, complete_session, missing_parts, received_parts, start_session, write_part
+from .services import (
+    enroll_student, drop_enrollment, promote_waitlist, waitlist_position, clashing_courses,
+    ENROLLED, WAITLISTED, ALREADY_WAITLISTED, CLASH,
+)
 # from .forms import EnrollmentGradeModelFormSet
 
 
@@ -41,6 +58,19 @@ class CourseListView(LoginRequiredMixin, ListView): # All logged-in users can se
         context['filterset'] = self.filterset
         return context
     
+class CourseAutocompleteView(LoginRequiredMixin, View):
+    """课程代码/标题的自动补全 (JSON)，由进程内索引提供，不查询 Course 表。"""
+    def get(self, request):
+        try:
+            limit = int(request.GET.get('limit', 10))
+        except ValueError:
+            limit = 10
+        results = [
+            {'id': pk, 'code': code, 'title': title, 'url': reverse('courses:course_detail', args=[pk])}
+            for pk, code, title in course_index.suggest(request.GET.get('q', ''), limit)
+        ]
+        return JsonResponse({'results': results})
+
 class CourseCreateViewActual(LoginRequiredMixin, TeacherRequiredMixin, CreateView):
     model = Course
     form_class = CourseCreationForm # 指定用于创建课程的表单
@@ -92,36 +122,45 @@ class CourseCreateViewActual(LoginRequiredMixin, TeacherRequiredMixin, CreateVie
     #     return context
 
 class CourseDetailView(LoginRequiredMixin, DetailView):
+    """
+    课程详情。查询数固定，不随资料、作业或学生数量增长：课程连同院系和教师一次取出，
+    资料和作业各一次预取，选课状态一次，候补位置 / 选课学生名单各一次。
+    """
     model = Course
     template_name = 'courses/course_detail.html'
     context_object_name = 'course'
 
+    def get_queryset(self):
+        return Course.objects.select_related('department', 'instructor').prefetch_related(
+            Prefetch('materials', queryset=CourseMaterial.objects.order_by('-uploaded_at', '-pk')),
+            Prefetch('assignments', queryset=Assignment.objects.order_by('due_date', 'pk')),
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        course = self.get_object()
+        course = self.object # DetailView 已经取出，不再调用 get_object()
         user = self.request.user
 
-        # 检查当前用户是否已选修此课程 (如果是学生)
-        if user.is_authenticated and user.is_student: # 假设 User 模型有 is_student 属性
-            context['is_enrolled'] = Enrollment.objects.filter(student=user, course=course).exists()
-            # 如果允许退选，可以获取 enrollment_id
-            if context['is_enrolled']:
-                try:
-                    enrollment = Enrollment.objects.get(student=user, course=course)
-                    context['enrollment_id'] = enrollment.id
-                except Enrollment.DoesNotExist:
-                    pass # Should not happen if is_enrolled is True
-
-        # (稍后添加) 获取课程资料列表
-        # context['materials'] = course.materials.all() # 假设 related_name='materials'
+        # 模板直接遍历预取的列表
+        context['materials'] = course.materials.all()
+        context['assignments'] = course.assignments.all()
 
-        # (稍后添加) 获取作业列表
-        # context['assignments'] = course.assignments.all() # 假设 related_name='assignments'
+        # 检查当前用户是否已选修此课程 (如果是学生)；一次查询同时得到 enrollment_id
+        if user.is_authenticated and user.is_student: # 假设 User 模型有 is_student 属性
+            enrollment_id = Enrollment.objects.filter(student=user, course=course).values_list('pk', flat=True).first()
+            context['is_enrolled'] = enrollment_id is not None
+            if enrollment_id is not None:
+                context['enrollment_id'] = enrollment_id
+            else:
+                context['waitlist_position'] = waitlist_position(course, user)
 
         # 获取选课学生列表 (仅授课教师或管理员可见)
-        if user.is_teacher and course.instructor == user: # 假设 User 模型有 is_teacher 属性
-            context['enrolled_students'] = User.objects.filter(enrollments__course=course, role=User.ROLE_STUDENT)
-        
+        if user.is_teacher and course.instructor_id == user.pk: # 假设 User 模型有 is_teacher 属性
+            context['enrolled_students'] = list(
+                User.objects.filter(enrollments__course=course, role=User.ROLE_STUDENT)
+                .only('username', 'first_name', 'last_name').order_by('username')
+            )
+
         return context
 
 class CourseUpdateView(LoginRequiredMixin, TeacherRequiredMixin, UpdateView):
@@ -133,6 +172,12 @@ class CourseUpdateView(LoginRequiredMixin, TeacherRequiredMixin, UpdateView):
     def get_success_url(self):
         return reverse('courses:course_detail', kwargs={'pk': self.object.pk})
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        if 'capacity' in form.changed_data:
+            promote_waitlist(self.object.pk) # 扩容后按顺序递补候补学生
+        return response
+
     def test_func(self):
         # Override TeacherRequiredMixin's test_func if needed for more specific permission
         # e.g., only the course instructor or a superuser can edit
@@ -157,13 +202,20 @@ class EnrollCourseView(LoginRequiredMixin, StudentRequiredMixin, View):
         course = get_object_or_404(Course, id=course_id)
         student = request.user
 
-        # Check if already enrolled
-        if Enrollment.objects.filter(student=student, course=course).exists():
-            messages.warning(request, f"You are already enrolled in '{course.title}'.")
-        else:
-            # TODO: Add any other enrollment conditions (e.g., course capacity, prerequisites)
-            Enrollment.objects.create(student=student, course=course)
+        # 原子地占座；满员时加入候补名单，与已选课程时间冲突时拒绝
+        # TODO: Add any other enrollment conditions (e.g., prerequisites)
+        result = enroll_student(course, student)
+        if result == ENROLLED:
             messages.success(request, f"You have successfully enrolled in '{course.title}'.")
+        elif result == WAITLISTED:
+            messages.info(request, f"'{course.title}' is full. You have been added to the waitlist.")
+        elif result == CLASH:
+            clashes = ', '.join(f"'{other.title}'" for other in clashing_courses(course, student))
+            messages.error(request, f"'{course.title}' clashes with your timetable ({clashes}). You were not enrolled.")
+        elif result == ALREADY_WAITLISTED:
+            messages.warning(request, f"You are already on the waitlist for '{course.title}'.")
+        else:
+            messages.warning(request, f"You are already enrolled in '{course.title}'.")
         return redirect('courses:course_detail', pk=course_id)
 
 class DropCourseView(LoginRequiredMixin, StudentRequiredMixin, View):
@@ -173,48 +225,77 @@ class DropCourseView(LoginRequiredMixin, StudentRequiredMixin, View):
         course_title = enrollment.course.title
         
         # TODO: Add any conditions for dropping (e.g., deadline)
-        enrollment.delete()
+        drop_enrollment(enrollment) # 空出的座位自动递补给候补名单中的第一位
         messages.success(request, f"You have successfully dropped '{course_title}'.")
         return redirect('courses:course_detail', pk=course_id_for_redirect)
 
 class GradeEnrollmentsView(LoginRequiredMixin, TeacherRequiredMixin, View):
+    """
+    录入课程成绩，三种提交方式都只用一条 bulk_update 写入改变了的成绩：
+        - 页面上的表格 (formset)；
+        - 上传 CSV / XLSX 文件 (grades_file)；
+        - JSON 请求体 {"grades": [[学生, 成绩], ...]}，返回 JSON。
+    """
     template_name = 'courses/grade_enrollments.html'
 
+    def _formset(self, course, data=None):
+        queryset = Enrollment.objects.filter(course=course).select_related('student').order_by('student__username')
+        return EnrollmentGradeFormSet(data, instance=course, queryset=queryset)
+
+    def _render(self, request, course, formset=None, upload_form=None):
+        return render(request, self.template_name, {
+            'course': course,
+            'formset': formset or self._formset(course),
+            'upload_form': upload_form or GradeUploadForm(),
+        })
+
     def get(self, request, course_id):
         course = get_object_or_404(Course, id=course_id, instructor=request.user) # Ensure only instructor can grade
-        # Get enrollments for this course
-        # enrollments_qs = Enrollment.objects.filter(course=course).select_related('student')
-        # formset = EnrollmentGradeFormSet(instance=course)
-        formset = EnrollmentGradeFormSet(instance=course, queryset=Enrollment.objects.filter(course=course).select_related('student'))
-        return render(request, self.template_name, {'course': course, 'formset': formset})
+        return self._render(request, course)
 
     def post(self, request, course_id):
         course = get_object_or_404(Course, id=course_id, instructor=request.user)
-        # enrollments_qs = Enrollment.objects.filter(course=course).select_related('student')
-
-        # --- BEGIN DEBUG ---
-        enrollments_for_course = Enrollment.objects.filter(course=course)
-        print(f"Course: {course.title}")
-        if not enrollments_for_course.exists():
-            print("No enrollments found for this course.")
-        for enrollment in enrollments_for_course:
-            print(f"  Enrollment ID: {enrollment.id}, Student: {enrollment.student}, Student ID: {enrollment.student_id}, Grade: {enrollment.grade}")
-        # --- END DEBUG ---
-        
-        # formset = EnrollmentGradeFormSet(request.POST, request.FILES, instance=course)
-        formset = EnrollmentGradeFormSet(request.POST, request.FILES, instance=course, queryset=Enrollment.objects.filter(course=course).select_related('student'))
+        if request.content_type == 'application/json':
+            return self._post_json(request, course)
+        if 'grades_file' in request.FILES:
+            return self._post_upload(request, course)
 
+        formset = self._formset(course, request.POST)
         if formset.is_valid():
-            formset.save()
+            save_grades(formset.save(commit=False)) # 只包含成绩有改动的记录
             messages.success(request, f"Grades for '{course.title}' have been updated.")
             return redirect('courses:grade_enrollments', course_id=course.id)
-        else:
-            print("Formset errors:", formset.errors)
-            for form in formset:
-                print(f"Form {form.prefix} errors:", form.errors)
-            messages.error(request, "Please correct the errors below.")
-        
-        return render(request, self.template_name, {'course': course, 'formset': formset})
+        messages.error(request, "Please correct the errors below.")
+        return self._render(request, course, formset=formset)
+
+    def _post_upload(self, request, course):
+        upload_form = GradeUploadForm(request.POST, request.FILES)
+        if upload_form.is_valid():
+            try:
+                updated = apply_grades(course, read_grade_file(upload_form.cleaned_data['grades_file']))
+            except ValidationError as e:
+                for error in e.messages:
+                    upload_form.add_error('grades_file', error)
+            else:
+                messages.success(request, f"Grades for '{course.title}' have been updated ({updated} changed).")
+                return redirect('courses:grade_enrollments', course_id=course.id)
+        messages.error(request, "The grade file was not imported; no grades were changed.")
+        return self._render(request, course, upload_form=upload_form)
+
+    def _post_json(self, request, course):
+        try:
+            updated = apply_grades(course, read_grade_json(request.body))
+        except ValidationError as e:
+            return JsonResponse({'errors': e.messages}, status=400)
+        return JsonResponse({'updated': updated})
+
+class FinalGradesView(LoginRequiredMixin, TeacherRequiredMixin, View):
+    """按作业分数、权重和去掉最低分规则计算整门课的总评，写入选课成绩 (见 courses.gradebook)"""
+    def post(self, request, course_id):
+        course = get_object_or_404(Course, id=course_id, instructor=request.user)
+        updated = apply_final_grades(course)
+        messages.success(request, f"Final grades for '{course.title}' computed from assignment scores ({updated} changed).")
+        return redirect('courses:grade_enrollments', course_id=course.id)
 
 # Phase 4
 class UploadMaterialView(LoginRequiredMixin, TeacherRequiredMixin, CreateView):
@@ -347,7 +428,14 @@ class AssignmentDetailView(LoginRequiredMixin, DetailView):
         
         elif user.is_teacher and user == assignment.course.instructor:
             # Get all submissions for this assignment for the instructor to view
-            context['submissions'] = assignment.submissions.all().select_related('student').order_by('student__username')
+            submissions = list(assignment.submissions.all().select_related('student').order_by('student__username'))
+            context['submissions'] = submissions
+            # 查重报告：估计相似度较高的提交对 (courses.similarity)
+            by_id = {submission.pk: submission for submission in submissions}
+            context['similar_pairs'] = [
+                {'similarity': round(pair.similarity * 100), 'first': by_id[pair.first], 'second': by_id[pair.second]}
+                for pair in suspicious_pairs(assignment) if pair.first in by_id and pair.second in by_id
+            ]
         
         return context
 
@@ -411,4 +499,184 @@ class TeacherCourseManagementView(LoginRequiredMixin, TeacherRequiredMixin, List
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['page_title'] = "Manage My Courses"
-        return context
\ No newline at end of file
+        return context
+
+
+# 成绩册 / 花名册导出 (流式 CSV)
+EXPORTS = {'gradebook': gradebook_rows, 'roster': roster_rows}
+
+
+def _can_export_all(user):
+    # 教务 (职员) 和管理员可以导出任何课程和院系
+    return user.is_staff_member_role or user.is_admin
+
+
+class CourseExportView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """导出一门课程的成绩册或花名册，课程教师、职员和管理员可用"""
+    def test_func(self):
+        user = self.request.user
+        self.course = get_object_or_404(Course.objects.only('code', 'instructor_id'), pk=self.kwargs['pk'])
+        return _can_export_all(user) or self.course.instructor_id == user.pk
+
+    def get(self, request, pk, export):
+        if export not in EXPORTS:
+            raise Http404("Unknown export.")
+        rows = EXPORTS[export](Enrollment.objects.filter(course=self.course))
+        return csv_response(rows, f'{self.course.code}-{export}.csv')
+
+
+class DepartmentExportView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """导出一个院系所有课程的成绩册或花名册，职员和管理员可用"""
+    def test_func(self):
+        return _can_export_all(self.request.user)
+
+    def get(self, request, department_id, export):
+        if export not in EXPORTS:
+            raise Http404("Unknown export.")
+        department = get_object_or_404(Department, pk=department_id)
+        rows = EXPORTS[export](Enrollment.objects.filter(course__department=department))
+        return csv_response(rows, f'department-{department.pk}-{export}.csv')
+
+
+def _enrolled_in_course(user, course_ref='course_id'):
+    return Exists(Enrollment.objects.filter(course_id=OuterRef(course_ref), student_id=user.pk))
+
+
+class ProtectedFileView(LoginRequiredMixin, View):
+    """
+    下载课程资料、作业附件和作业提交 (发送方式见 courses.downloads)。一条查询同时取出文件和权限信息：
+    资料和作业附件对课程教师和选课学生开放，作业提交对提交者和课程教师开放，职员和管理员都可以下载。
+    """
+    def get(self, request, kind, pk):
+        user = request.user
+        if kind == 'material':
+            obj = CourseMaterial.objects.filter(pk=pk).only('file', 'title').annotate(
+                instructor_id=F('course__instructor_id'), enrolled=_enrolled_in_course(user)).first()
+            field_file, title = (obj.file, obj.title) if obj else (None, None)
+        elif kind == 'assignment':
+            obj = Assignment.objects.filter(pk=pk).only('assignment_file', 'title').annotate(
+                instructor_id=F('course__instructor_id'), enrolled=_enrolled_in_course(user)).first()
+            field_file, title = (obj.assignment_file, obj.title) if obj else (None, None)
+        elif kind == 'submission':
+            obj = Submission.objects.filter(pk=pk).only('submitted_file', 'student_id').annotate(
+                instructor_id=F('assignment__course__instructor_id'), title=F('assignment__title'),
+                student_username=F('student__username')).first()
+            if obj:
+                obj.enrolled = obj.student_id == user.pk # 只有提交者本人，不是所有选课学生
+                field_file, title = obj.submitted_file, f'{obj.student_username}-{obj.title}'
+        else:
+            raise Http404("Unknown file type.")
+        if obj is None or not field_file:
+            raise Http404("File not found.")
+        if not (obj.enrolled or obj.instructor_id == user.pk or _can_export_all(user)):
+            raise PermissionDenied
+        return serve_file(request, field_file, title + os.path.splitext(field_file.name)[1])
+
+
+class SubmissionsZipView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """把作业的全部提交打包成 ZIP 流式下载，课程教师、职员和管理员可用"""
+    def test_func(self):
+        user = self.request.user
+        self.assignment = get_object_or_404(
+            Assignment.objects.select_related('course').only('title', 'course__code', 'course__instructor_id'),
+            pk=self.kwargs['assignment_id'],
+        )
+        return _can_export_all(user) or self.assignment.course.instructor_id == user.pk
+
+    def get(self, request, assignment_id):
+        # 压缩包边生成边发送，没有 Content-Length
+        response = StreamingHttpResponse(submissions_zip(self.assignment), content_type='application/zip')
+        filename = f'{self.assignment.course.code}-{self.assignment.title}-submissions.zip'
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return response
+
+
+# 可续传的分片上传 (协议见 courses.uploads)
+class UploadSessionCreateView(LoginRequiredMixin, View):
+    """
+    创建上传会话。JSON 请求体：{"filename", "size", "sha256" (可选)}，再加上
+    {"assignment": id} (提交作业，规则同 SubmitAssignmentView) 或 {"course": id, "title", "description"} (上传课程资料，仅课程教师)。
+    """
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+            assignment_id = None if data.get('assignment') is None else int(data['assignment'])
+            course_id = None if data.get('course') is None else int(data['course'])
+        except (ValueError, TypeError, AttributeError):
+            return JsonResponse({'error': 'Expected a JSON object with an integer assignment or course.'}, status=400)
+        assignment = course = None
+        if assignment_id is not None:
+            assignment = get_object_or_404(Assignment, pk=assignment_id)
+            if not request.user.is_student:
+                return JsonResponse({'error': 'Only students can submit assignments.'}, status=403)
+            if Submission.objects.filter(assignment=assignment, student=request.user).exists():
+                return JsonResponse({'error': 'You have already submitted this assignment.'}, status=409)
+        elif course_id is not None:
+            course = get_object_or_404(Course, pk=course_id)
+            if not (request.user.is_teacher and course.instructor_id == request.user.pk):
+                return JsonResponse({'error': 'Only the course instructor can upload materials.'}, status=403)
+        else:
+            return JsonResponse({'error': 'Specify an assignment or a course.'}, status=400)
+        try:
+            session = start_session(
+                request.user, filename=data.get('filename'), size=data.get('size'), sha256=data.get('sha256'),
+                assignment=assignment, course=course,
+                title=str(data.get('title') or ''), description=str(data.get('description') or ''),
+            )
+        except UploadError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse(_session_status(session), status=201)
+
+
+def _session_status(session):
+    return {
+        'id': str(session.pk),
+        'status': session.status,
+        'size': session.size,
+        'part_size': session.part_size,
+        'parts': session.total_parts,
+        'received': received_parts(session),
+    }
+
+
+class UploadSessionMixin(LoginRequiredMixin):
+    """只有创建会话的用户可以访问；其他人得到 404，不暴露会话是否存在"""
+    def get_session(self):
+        return get_object_or_404(UploadSession, pk=self.kwargs['session_id'], user=self.request.user)
+
+
+class UploadSessionStatusView(UploadSessionMixin, View):
+    """查询会话状态，续传时据此跳过已收到的分片"""
+    def get(self, request, session_id):
+        return JsonResponse(_session_status(self.get_session()))
+
+
+class UploadPartView(UploadSessionMixin, View):
+    """
+    PUT 一个分片，请求体为分片的原始字节，可带 X-Part-SHA256 头。
+    直接从 request 流式读取，不经过 request.body，内存占用与分片大小无关。
+    """
+    def put(self, request, session_id, number):
+        session = self.get_session()
+        try:
+            checksum = write_part(session, number, request, sha256=request.headers.get('X-Part-SHA256'))
+        except UploadError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'part': number, 'sha256': checksum})
+
+
+class UploadCompleteView(UploadSessionMixin, View):
+    """所有分片到齐后完成上传，返回提交/资料所在页面的地址"""
+    def post(self, request, session_id):
+        session = self.get_session()
+        try:
+            target = complete_session(session)
+        except UploadError as e:
+            return JsonResponse({'error': str(e), 'missing': missing_parts(session)}, status=400)
+        if session.target == UploadSession.TARGET_SUBMISSION:
+            messages.success(request, f"Your submission for '{target.assignment.title}' has been received.")
+            redirect_url = reverse('courses:assignment_detail', kwargs={'assignment_id': target.assignment_id})
+        else:
+            messages.success(request, f"Material '{target.title}' uploaded successfully.")
+            redirect_url = reverse('courses:course_detail', kwargs={'pk': target.course_id})
+        return JsonResponse({'status': UploadSession.STATUS_COMPLETE, 'redirect': redirect_url})
@@ -1,10 +1,12 @@
 # equipment/filters.py
 import django_filters
+from campushive.reference_data import CachedModelChoiceFilter
 from .models import Equipment, EquipmentCategory
+from .reference_data import CATEGORY_CHOICES
 
 class EquipmentFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(lookup_expr='icontains', label='Search by Name') # 按名称搜索 (不区分大小写包含)
-    category = django_filters.ModelChoiceFilter(queryset=EquipmentCategory.objects.all(), label='Category') # 按分类筛选
+    category = CachedModelChoiceFilter(queryset=EquipmentCategory.objects.all(), reference=CATEGORY_CHOICES, label='Category') # 按分类筛选，选项来自缓存
     status = django_filters.ChoiceFilter(choices=Equipment.STATUS_CHOICES, label='Status') # 按状态筛选
 
     class Meta:
@@ -1,5 +1,7 @@
 # equipment/forms.py
+import re
 from django import forms
+from django.contrib.auth import get_user_model
 from .models import Equipment, EquipmentCategory
 from .models import BorrowingRecord
 from .models import RepairRequest
@@ -42,4 +44,62 @@ class RepairRequestForm(forms.ModelForm):
         fields = ['description']
         widgets = {
             'description': forms.Textarea(attrs={'rows': 4, 'placeholder': 'Please describe the issue in detail...'}),
-        }
\ No newline at end of file
+        }
+
+def _split_identifiers(text):
+    return [token for token in re.split(r'[\s,;]+', text or '') if token]
+
+class BatchBorrowForm(forms.Form):
+    borrower = forms.CharField(label='Borrower username', max_length=150)
+    due_date = forms.DateTimeField(
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'),
+        input_formats=['%Y-%m-%dT%H:%M']
+    )
+    items = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 8, 'placeholder': 'LP001\nLP002 x3\nPJ001'}),
+        help_text='One identifier per line (scanner friendly). Add "x<quantity>" for several units of the same item.'
+    )
+
+    def clean_borrower(self):
+        username = self.cleaned_data['borrower'].strip()
+        try:
+            return get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise forms.ValidationError(f'No user named "{username}".')
+
+    def clean_items(self):
+        # 每行 "标识符" 或 "标识符 x数量"，返回 [(identifier, quantity), ...]
+        items = []
+        for line_number, line in enumerate(self.cleaned_data['items'].splitlines(), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            match = re.fullmatch(r'(\S+?)(?:\s*[x\*]\s*(\d+))?', line, flags=re.IGNORECASE)
+            if not match or (match.group(2) is not None and int(match.group(2)) < 1):
+                raise forms.ValidationError(f'Line {line_number}: cannot read "{line}".')
+            items.append((match.group(1), int(match.group(2) or 1)))
+        if not items:
+            raise forms.ValidationError('Please enter at least one identifier.')
+        return items
+
+class BatchReturnForm(forms.Form):
+    identifiers = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 8}),
+        help_text='Scanned identifiers, separated by new lines, spaces or commas. Scan an item once per returned unit.'
+    )
+    borrower = forms.CharField(label='Only for borrower (optional)', max_length=150, required=False)
+
+    def clean_identifiers(self):
+        identifiers = _split_identifiers(self.cleaned_data['identifiers'])
+        if not identifiers:
+            raise forms.ValidationError('Please enter at least one identifier.')
+        return identifiers
+
+    def clean_borrower(self):
+        username = self.cleaned_data['borrower'].strip()
+        if not username:
+            return None
+        try:
+            return get_user_model().objects.get(username=username)
+        except get_user_model().DoesNotExist:
+            raise forms.ValidationError(f'No user named "{username}".')
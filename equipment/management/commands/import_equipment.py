@@ -2,89 +2,177 @@
 
 import csv
 import datetime
+import time
+from itertools import islice
 from django.core.management.base import BaseCommand, CommandError
-from equipment.models import Equipment, EquipmentCategory
+from django.db import transaction
+from django.db.models import Count
+from equipment.models import BorrowingRecord, Equipment, EquipmentCategory
+
+# CSV 中出现过的日期格式: 2021-03-10 以及 data_imports/equipment_items.csv 中的 2021/3/10
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d')
+
+# upsert 模式下会被写回的字段。已有设备的 quantity_available 和 status 不直接取 CSV 的值，
+# 而是按未归还的借用记录重新计算 (见 Command._recount_stock)
+UPDATE_FIELDS = ['name', 'category', 'description', 'quantity_total', 'quantity_available', 'status', 'purchase_date']
+
+
+def parse_purchase_date(value):
+    """按 DATE_FORMATS 依次尝试解析日期，全部失败时抛出 ValueError。"""
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(value)
+
 
 class Command(BaseCommand):
     help = 'Imports equipment items from a specified CSV file. Creates categories if they do not exist.'
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file_path', type=str, help='The full path to the CSV file to import.')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of CSV rows resolved and written per query batch (default: 1000).')
+        parser.add_argument('--update', action='store_true',
+                            help='Update existing equipment (matched by identifier) instead of skipping it.')
 
     def handle(self, *args, **options):
         file_path = options['csv_file_path']
+        chunk_size = options['chunk_size']
+        self.update_existing = options['update']
+        self.verbosity = options['verbosity']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be a positive integer.')
+
+        started = time.perf_counter()
+        # 分类名 -> id 的内存缓存，整个导入过程只查询一次
+        self.category_ids = dict(EquipmentCategory.objects.values_list('name', 'id'))
+        created_count = updated_count = skipped_count = rows_read = 0
 
         try:
             with open(file_path, mode='r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                
-                items_processed_count = 0
-                for row in reader:
-                    # 1. Get or Create EquipmentCategory
-                    category_name = row.get('category_name')
-                    equipment_category = None
-                    if category_name:
-                        try:
-                            # get_or_create will create the category if it doesn't exist
-                            equipment_category, created_cat = EquipmentCategory.objects.get_or_create(name=category_name)
-                            if created_cat:
-                                self.stdout.write(self.style.NOTICE(f'Created new EquipmentCategory: {category_name}'))
-                        except Exception as e:
-                            self.stdout.write(self.style.ERROR(f'Error getting/creating category {category_name}: {e}. Skipping equipment {row.get("name")}.'))
-                            continue
-                    
-                    # 2. Parse Purchase Date
-                    purchase_date = None
-                    purchase_date_str = row.get('purchase_date')
-                    if purchase_date_str:
-                        try:
-                            purchase_date = datetime.datetime.strptime(purchase_date_str, '%Y-%m-%d').date()
-                        except ValueError:
-                            self.stdout.write(self.style.ERROR(f'Invalid purchase_date format for {row.get("name")}: {purchase_date_str}. Skipping purchase date.'))
-                            
-                    # 3. Ensure quantity fields are integers
-                    try:
-                        quantity_total = int(row.get('quantity_total', 1))
-                        quantity_available = int(row.get('quantity_available', 1))
-                    except ValueError:
-                        self.stdout.write(self.style.ERROR(f'Invalid quantity_total or quantity_available for {row.get("name")}. Skipping row.'))
-                        continue
-
-                    # 4. Use identifier as the primary unique field for equipment
-                    identifier = row.get('identifier')
-                    if not identifier:
-                        self.stdout.write(self.style.ERROR(f'Identifier missing for equipment {row.get("name")}. Skipping row.'))
-                        continue
-
-                    # 5. Create or Get Equipment
-                    item, created = Equipment.objects.get_or_create(
-                        identifier=identifier, # Use identifier for get_or_create
-                        defaults={
-                            'name': row.get('name', 'Unnamed Equipment'),
-                            'category': equipment_category,
-                            'description': row.get('description', ''),
-                            'quantity_total': quantity_total,
-                            'quantity_available': quantity_available,
-                            'status': row.get('status', Equipment.STATUS_AVAILABLE), # Default to available if not provided
-                            'purchase_date': purchase_date,
-                        }
-                    )
-                    
-                    if created:
-                        items_processed_count += 1
-                        self.stdout.write(self.style.SUCCESS(f'Successfully created equipment: {item.name} ({item.identifier})'))
-                    else:
-                        # Optional: update existing item if fields are different
-                        # item.name = row.get('name', item.name)
-                        # item.category = equipment_category # Update category if it changed
-                        # ... other fields
-                        # item.save()
-                        self.stdout.write(self.style.WARNING(f'Equipment "{item.name}" with identifier "{item.identifier}" already exists.'))
+                items = self._iter_items(csv.DictReader(csvfile))
+                while True:
+                    chunk = list(islice(items, chunk_size))
+                    if not chunk:
+                        break
+                    created, updated, skipped = self._import_chunk(chunk)
+                    created_count += created
+                    updated_count += updated
+                    skipped_count += skipped
+                    rows_read += len(chunk)
 
         except FileNotFoundError:
             raise CommandError(f'File not found at: {file_path}')
         except Exception as e:
             raise CommandError(f'An error occurred: {e}')
 
-        self.stdout.write(self.style.SUCCESS(f'Finished importing. Total new equipment items created: {items_processed_count}'))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished importing. Total new equipment items created: {created_count}, '
+            f'updated: {updated_count}, skipped: {skipped_count} ({rows_read} valid rows in {elapsed:.2f}s)'
+        ))
+
+    def _iter_items(self, reader):
+        """逐行校验 CSV，产出 (identifier, 字段字典)。无效行直接跳过，不会整体读入内存。"""
+        for row in reader:
+            # 1. Use identifier as the primary unique field for equipment
+            identifier = (row.get('identifier') or '').strip()
+            if not identifier:
+                self.stdout.write(self.style.ERROR(f'Identifier missing for equipment {row.get("name")}. Skipping row.'))
+                continue
+
+            # 2. Ensure quantity fields are integers
+            try:
+                quantity_total = int(row.get('quantity_total') or 1)
+                quantity_available = int(row.get('quantity_available') or quantity_total)
+            except ValueError:
+                self.stdout.write(self.style.ERROR(f'Invalid quantity_total or quantity_available for {row.get("name")}. Skipping row.'))
+                continue
+
+            # 3. Parse Purchase Date
+            purchase_date = None
+            purchase_date_str = (row.get('purchase_date') or '').strip()
+            if purchase_date_str:
+                try:
+                    purchase_date = parse_purchase_date(purchase_date_str)
+                except ValueError:
+                    self.stdout.write(self.style.ERROR(f'Invalid purchase_date format for {row.get("name")}: {purchase_date_str}. Skipping purchase date.'))
+
+            yield identifier, {
+                'name': row.get('name') or 'Unnamed Equipment',
+                'category_id': self._category_id(row.get('category_name')),
+                'description': row.get('description', ''),
+                'quantity_total': quantity_total,
+                # 与 Equipment.save() 保持一致：可用数量不超过总数量 (bulk_* 不会调用 save())
+                'quantity_available': min(quantity_available, quantity_total),
+                'status': row.get('status') or Equipment.STATUS_AVAILABLE, # Default to available if not provided
+                'purchase_date': purchase_date,
+            }
+
+    def _category_id(self, category_name):
+        category_name = (category_name or '').strip()
+        if not category_name:
+            return None
+        if category_name not in self.category_ids:
+            # 只有第一次遇到新分类时才访问数据库
+            category, created_cat = EquipmentCategory.objects.get_or_create(name=category_name)
+            if created_cat:
+                self.stdout.write(self.style.NOTICE(f'Created new EquipmentCategory: {category_name}'))
+            self.category_ids[category_name] = category.id
+        return self.category_ids[category_name]
+
+    def _import_chunk(self, chunk):
+        """一个 identifier__in 查询 + 一次 bulk_create / bulk_update 完成整块的 upsert。"""
+        # 同一文件中重复的 identifier 以最后一行为准
+        items = dict(chunk)
+        with transaction.atomic():
+            # --update 时锁住本块已有的设备行，重新计算库存期间并发的借还会等待
+            queryset = Equipment.objects.select_for_update() if self.update_existing else Equipment.objects
+            existing = queryset.in_bulk(list(items), field_name='identifier')
+            to_create, to_update, skipped = self._split_chunk(items, existing)
+            skipped += len(chunk) - len(items)
+            self._recount_stock(to_update)
+            Equipment.objects.bulk_create(to_create)
+            Equipment.objects.bulk_update(to_update, UPDATE_FIELDS)
+
+        if self.verbosity >= 2: # 大文件时逐行输出本身就很慢
+            for item in to_create:
+                self.stdout.write(self.style.SUCCESS(f'Successfully created equipment: {item.name} ({item.identifier})'))
+        return len(to_create), len(to_update), skipped
+
+    def _split_chunk(self, items, existing):
+        """把本块分成要新建的、要更新的设备，以及跳过的行数。"""
+        to_create = []
+        to_update = []
+        skipped = 0
+        for identifier, fields in items.items():
+            item = existing.get(identifier)
+            if item is None:
+                to_create.append(Equipment(identifier=identifier, **fields))
+            elif self.update_existing:
+                for field, value in fields.items():
+                    setattr(item, field, value)
+                to_update.append(item)
+            else:
+                skipped += 1
+                if self.verbosity >= 2:
+                    self.stdout.write(self.style.WARNING(f'Equipment "{item.name}" with identifier "{item.identifier}" already exists.'))
+        return to_create, to_update, skipped
 
+    def _recount_stock(self, items):
+        """
+        已有设备的可用数量 = 总数量 - 未归还的借用记录数，一次分组查询完成。
+        状态随之在 available / borrowed 之间切换；CSV 标记为维修中的保持维修中。
+        """
+        if not items:
+            return
+        on_loan = dict(
+            BorrowingRecord.objects.filter(equipment__in=items, is_returned=False)
+            .order_by().values('equipment_id').annotate(count=Count('pk')).values_list('equipment_id', 'count')
+        )
+        for item in items:
+            item.quantity_available = max(item.quantity_total - on_loan.get(item.pk, 0), 0)
+            if item.status != Equipment.STATUS_REPAIR:
+                item.status = Equipment.STATUS_AVAILABLE if item.quantity_available else Equipment.STATUS_BORROWED
@@ -0,0 +1,9 @@
+# equipment/reference_data.py
+from campushive.reference_data import ReferenceList
+from .models import EquipmentCategory
+
+# 设备筛选表单的分类下拉选项
+CATEGORY_CHOICES = ReferenceList(
+    'equipment_categories', EquipmentCategory,
+    lambda: EquipmentCategory.objects.order_by('name').values_list('pk', 'name'),
+)
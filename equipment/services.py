@@ -0,0 +1,149 @@
+# equipment/services.py
+from collections import Counter, defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from .models import Equipment, BorrowingRecord
+
+
+class EquipmentUnavailable(Exception):
+    """设备不可借 (已借完、维修中或不存在)。"""
+
+
+def borrow_equipment(equipment, borrower, due_date):
+    """
+    借出一件设备并创建借用记录，二者在同一事务中完成。
+
+    库存用一条带条件的 UPDATE 扣减 ("仍可用且 quantity_available > 0 才减 1")，
+    由数据库保证并发借用时不会丢失更新，quantity_available 也不会变成负数；
+    条件不满足 (被别人抢先借完) 时抛出 EquipmentUnavailable。
+    """
+    with transaction.atomic():
+        claimed = Equipment.objects.filter(
+            pk=equipment.pk, status=Equipment.STATUS_AVAILABLE, quantity_available__gt=0,
+        ).update(
+            quantity_available=F('quantity_available') - 1,
+            # SET 中引用的是更新前的值：借走最后一件时状态变为已借出
+            status=Case(When(quantity_available=1, then=Value(Equipment.STATUS_BORROWED)), default=F('status')),
+        )
+        if not claimed:
+            raise EquipmentUnavailable(f"'{equipment.name}' is not available for borrowing.")
+        record = BorrowingRecord.objects.create(
+            equipment=equipment, borrower=borrower, due_date=due_date, is_returned=False,
+        )
+    return record
+
+
+def return_borrowing(record):
+    """
+    归还一条借用记录，返回 False 表示该记录已经归还过。
+
+    先用条件 UPDATE 把记录标记为已归还 (只有一个并发请求能成功)，再在同一事务中把库存加 1
+    (不超过 quantity_total)。不再需要重新统计未归还记录：只要有库存，已借出的设备就恢复为可用，
+    维修中的设备保持不变。
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        marked = BorrowingRecord.objects.filter(pk=record.pk, is_returned=False).update(is_returned=True, return_date=now)
+        if not marked:
+            return False
+        Equipment.objects.filter(pk=record.equipment_id).update(
+            quantity_available=Least(F('quantity_available') + 1, F('quantity_total')),
+            status=Case(When(status=Equipment.STATUS_BORROWED, then=Value(Equipment.STATUS_AVAILABLE)), default=F('status')),
+        )
+    record.is_returned = True
+    record.return_date = now
+    return True
+
+
+# returned: 每个标识符实际归还的记录数；not_borrowed: 扫描了但没有对应未归还记录的数量
+BatchReturnResult = namedtuple('BatchReturnResult', ['returned', 'not_borrowed'])
+
+
+def borrow_equipment_batch(items, borrower, due_date):
+    """
+    一次借出一车设备。items 为 (identifier, quantity) 列表，同一标识符可出现多次 (数量累加)。
+
+    整批在一个事务中完成：一次查询取出设备，每种设备一条带条件的 UPDATE 扣减库存，
+    借用记录 (每件一条) 用 bulk_create 一次写入。任何一种设备不存在或库存不足都会
+    抛出 EquipmentUnavailable，整批回滚，不会出现只借出一半的购物车。
+    """
+    quantities = Counter()
+    for identifier, quantity in items:
+        quantities[identifier] += quantity
+    if not quantities:
+        return []
+
+    with transaction.atomic():
+        equipment_by_identifier = Equipment.objects.in_bulk(list(quantities), field_name='identifier')
+        missing = sorted(set(quantities) - set(equipment_by_identifier))
+        if missing:
+            raise EquipmentUnavailable(f"Unknown equipment: {', '.join(missing)}.")
+
+        unavailable = []
+        for identifier, quantity in quantities.items():
+            claimed = Equipment.objects.filter(
+                pk=equipment_by_identifier[identifier].pk,
+                status=Equipment.STATUS_AVAILABLE,
+                quantity_available__gte=quantity,
+            ).update(
+                quantity_available=F('quantity_available') - quantity,
+                status=Case(When(quantity_available=quantity, then=Value(Equipment.STATUS_BORROWED)), default=F('status')),
+            )
+            if not claimed:
+                unavailable.append(identifier)
+        if unavailable:
+            # 抛出异常使整个事务回滚，已扣减的其他设备库存也一并恢复
+            raise EquipmentUnavailable(f"Not enough stock for: {', '.join(sorted(unavailable))}.")
+
+        records = BorrowingRecord.objects.bulk_create([
+            BorrowingRecord(equipment=equipment_by_identifier[identifier], borrower=borrower, due_date=due_date, is_returned=False)
+            for identifier, quantity in quantities.items()
+            for _ in range(quantity)
+        ])
+    return records
+
+
+def return_equipment_batch(identifiers, borrower=None):
+    """
+    按扫描到的标识符列表批量归还 (同一标识符扫描 n 次表示归还 n 件)，可选只归还某个借用人的记录。
+
+    每个标识符归还最早借出的未归还记录。一次查询锁定候选记录，一条 UPDATE 标记归还，
+    每种设备一条 UPDATE 恢复库存，全部在一个事务中完成。扫描了但没有未归还记录的标识符
+    不会报错，而是在结果的 not_borrowed 中列出，方便柜台人员核对。
+    """
+    scanned = Counter(identifiers)
+    if not scanned:
+        return BatchReturnResult({}, {})
+
+    now = timezone.now()
+    with transaction.atomic():
+        open_records = BorrowingRecord.objects.select_for_update(of=('self',)).filter(
+            equipment__identifier__in=list(scanned), is_returned=False,
+        ).order_by('borrow_date', 'pk').values_list('pk', 'equipment_id', 'equipment__identifier')
+        if borrower is not None:
+            open_records = open_records.filter(borrower=borrower)
+
+        to_return = []
+        returned = Counter()
+        returned_per_equipment = defaultdict(int)
+        for pk, equipment_id, identifier in open_records:
+            if returned[identifier] < scanned[identifier]:
+                to_return.append(pk)
+                returned[identifier] += 1
+                returned_per_equipment[equipment_id] += 1
+
+        if to_return:
+            BorrowingRecord.objects.filter(pk__in=to_return).update(is_returned=True, return_date=now)
+        for equipment_id, count in returned_per_equipment.items():
+            Equipment.objects.filter(pk=equipment_id).update(
+                quantity_available=Least(F('quantity_available') + count, F('quantity_total')),
+                status=Case(When(status=Equipment.STATUS_BORROWED, then=Value(Equipment.STATUS_AVAILABLE)), default=F('status')),
+            )
+
+    not_borrowed = {identifier: scanned[identifier] - returned[identifier]
+                    for identifier in scanned if scanned[identifier] > returned[identifier]}
+    return BatchReturnResult(dict(returned), not_borrowed)
@@ -1,11 +1,20 @@
 # equipment/tests.py
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 # Create your tests here.
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.urls import reverse
 from .models import EquipmentCategory, Equipment, BorrowingRecord
-from datetime import timedelta
+from .services import EquipmentUnavailable, borrow_equipment, return_borrowing, borrow_equipment_batch, return_equipment_batch
+from datetime import timedelta, date
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+import time
+from campushive.testing import temp_csv
+from django.core.cache import cache
+from .filters import EquipmentFilter
 User = get_user_model()
 
 class EquipmentCategoryModelTests(TestCase):
@@ -234,4 +243,219 @@ class BorrowEquipmentViewTests(TestCase):
             any(expected_message_part in str(m) for m in messages),
             f"Expected message part '{expected_message_part}' not found in {[str(m) for m in messages]}"
         )
-        
\ No newline at end of file
+        
+
+class ImportEquipmentCommandTests(TestCase):
+    """
+    测试 import_equipment 管理命令 (分块导入 + upsert)
+    """
+    CSV_HEADER = 'name,category_name,identifier,description,quantity_total,quantity_available,status,purchase_date\n'
+
+    def test_import_creates_items_and_categories(self):
+        path = temp_csv(self, self.CSV_HEADER, [
+            'MacBook Air M1,Laptop,LM002,Apple laptop,1,1,available,2021/3/10\n',
+            'ThinkPad E14,Laptop,LW001,Lenovo laptop,1,1,available,2022-01-05\n',
+            'Epson Projector,Projector,EPJ001,,2,5,available,\n',
+        ])
+        call_command('import_equipment', path, '--chunk-size', '2', stdout=StringIO())
+
+        self.assertEqual(Equipment.objects.count(), 3)
+        self.assertEqual(EquipmentCategory.objects.count(), 2)
+        self.assertEqual(Equipment.objects.get(identifier='LM002').purchase_date, date(2021, 3, 10))
+        self.assertEqual(Equipment.objects.get(identifier='LW001').purchase_date, date(2022, 1, 5))
+        projector = Equipment.objects.get(identifier='EPJ001')
+        self.assertEqual(projector.quantity_available, 2) # 不超过 quantity_total
+
+    def test_existing_items_skipped_without_update_flag(self):
+        Equipment.objects.create(name='Old name', identifier='LM002')
+        path = temp_csv(self, self.CSV_HEADER, ['MacBook Air M1,Laptop,LM002,Apple laptop,1,1,available,2021/3/10\n'])
+        call_command('import_equipment', path, stdout=StringIO())
+        self.assertEqual(Equipment.objects.get(identifier='LM002').name, 'Old name')
+
+    def test_update_flag_upserts_existing_items(self):
+        Equipment.objects.create(name='Old name', identifier='LM002', quantity_total=1, quantity_available=1)
+        path = temp_csv(self, self.CSV_HEADER, [
+            'MacBook Air M1,Laptop,LM002,Apple laptop,3,2,available,2021/3/10\n',
+            'MacBook Air M2,Laptop,LM011,Apple laptop,1,1,available,2022/7/20\n',
+        ])
+        out = StringIO()
+        call_command('import_equipment', path, '--update', stdout=out)
+
+        item = Equipment.objects.get(identifier='LM002')
+        self.assertEqual(item.name, 'MacBook Air M1')
+        self.assertEqual(item.quantity_total, 3)
+        self.assertEqual(item.category.name, 'Laptop')
+        self.assertTrue(Equipment.objects.filter(identifier='LM011').exists())
+        self.assertIn('updated: 1', out.getvalue())
+
+    def test_update_flag_recounts_stock_from_open_borrowings(self):
+        borrower = User.objects.create_user(email='import@example.com', username='import_user', password='password')
+        laptop = Equipment.objects.create(name='Laptop', identifier='LM002', quantity_total=3, quantity_available=1, status=Equipment.STATUS_AVAILABLE)
+        camera = Equipment.objects.create(name='Camera', identifier='CAM01', quantity_total=1, quantity_available=0, status=Equipment.STATUS_BORROWED)
+        due = timezone.now() + timedelta(days=7)
+        for item in (laptop, laptop, camera):
+            BorrowingRecord.objects.create(equipment=item, borrower=borrower, due_date=due)
+        BorrowingRecord.objects.create(equipment=laptop, borrower=borrower, due_date=due, is_returned=True)
+        path = temp_csv(self, self.CSV_HEADER, [
+            'MacBook Air M1,Laptop,LM002,Apple laptop,4,4,available,2021/3/10\n', # CSV 中的库存是导出时的旧值
+            'Camera,Camera,CAM01,,1,1,available,\n',
+        ])
+        call_command('import_equipment', path, '--update', stdout=StringIO())
+
+        laptop.refresh_from_db()
+        camera.refresh_from_db()
+        self.assertEqual((laptop.quantity_total, laptop.quantity_available, laptop.status), (4, 2, Equipment.STATUS_AVAILABLE))
+        self.assertEqual((camera.quantity_available, camera.status), (0, Equipment.STATUS_BORROWED))
+
+
+class BorrowServiceTests(TestCase):
+    """
+    测试借用/归还服务的库存维护
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.borrower = User.objects.create_user(email='svc@example.com', username='svc_user', password='password', role=User.ROLE_STUDENT)
+        cls.laptop = Equipment.objects.create(name='Laptop', identifier='SVC-LP', quantity_total=2, quantity_available=2)
+
+    def test_borrow_until_empty_then_refuse(self):
+        due = timezone.now() + timedelta(days=1)
+        borrow_equipment(self.laptop, self.borrower, due)
+        borrow_equipment(self.laptop, self.borrower, due)
+        with self.assertRaises(EquipmentUnavailable):
+            borrow_equipment(self.laptop, self.borrower, due)
+
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.quantity_available, 0)
+        self.assertEqual(self.laptop.status, Equipment.STATUS_BORROWED)
+        self.assertEqual(BorrowingRecord.objects.filter(equipment=self.laptop).count(), 2)
+
+    def test_return_is_applied_once(self):
+        record = borrow_equipment(self.laptop, self.borrower, timezone.now() + timedelta(days=1))
+        self.assertTrue(return_borrowing(record))
+        stale_copy = BorrowingRecord.objects.get(pk=record.pk)
+        stale_copy.is_returned = False # 模拟另一个请求读到的旧状态
+        self.assertFalse(return_borrowing(stale_copy))
+
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.quantity_available, 2)
+        self.assertEqual(self.laptop.status, Equipment.STATUS_AVAILABLE)
+
+    def test_return_keeps_repair_status(self):
+        record = borrow_equipment(self.laptop, self.borrower, timezone.now() + timedelta(days=1))
+        Equipment.objects.filter(pk=self.laptop.pk).update(status=Equipment.STATUS_REPAIR)
+        return_borrowing(record)
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.status, Equipment.STATUS_REPAIR)
+
+
+
+class BatchBorrowTests(TestCase):
+    """
+    测试整车批量借出/归还
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(email='desk@example.com', username='desk', password='password', role=User.ROLE_STAFF_MEMBER)
+        cls.student = User.objects.create_user(email='stu@example.com', username='stu', password='password', role=User.ROLE_STUDENT)
+        cls.laptops = Equipment.objects.create(name='Laptop', identifier='CART-LP', quantity_total=30, quantity_available=30)
+        cls.mouse = Equipment.objects.create(name='Mouse', identifier='CART-MS', quantity_total=1, quantity_available=1)
+        cls.due = timezone.now() + timedelta(days=1)
+
+    def test_batch_borrow_is_all_or_nothing(self):
+        with self.assertRaises(EquipmentUnavailable):
+            borrow_equipment_batch([('CART-LP', 10), ('CART-MS', 2)], self.student, self.due)
+        self.laptops.refresh_from_db()
+        self.assertEqual(self.laptops.quantity_available, 30)
+        self.assertFalse(BorrowingRecord.objects.exists())
+
+    def test_batch_borrow_query_count_independent_of_cart_size(self):
+        # in_bulk 1 + 每种设备 1 条 UPDATE + bulk_create 1 + savepoint/release 2，与件数无关
+        with self.assertNumQueries(6):
+            records = borrow_equipment_batch([('CART-LP', 25), ('CART-MS', 1)], self.student, self.due)
+        self.assertEqual(len(records), 26)
+        self.laptops.refresh_from_db()
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.laptops.quantity_available, 5)
+        self.assertEqual(self.mouse.status, Equipment.STATUS_BORROWED)
+
+    def test_batch_return_by_scanned_identifiers(self):
+        borrow_equipment_batch([('CART-LP', 3), ('CART-MS', 1)], self.student, self.due)
+        result = return_equipment_batch(['CART-LP', 'CART-LP', 'CART-MS', 'CART-MS', 'UNKNOWN'])
+        self.assertEqual(result.returned, {'CART-LP': 2, 'CART-MS': 1})
+        self.assertEqual(result.not_borrowed, {'CART-MS': 1, 'UNKNOWN': 1})
+
+        self.laptops.refresh_from_db()
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.laptops.quantity_available, 29)
+        self.assertEqual(self.mouse.quantity_available, 1)
+        self.assertEqual(self.mouse.status, Equipment.STATUS_AVAILABLE)
+        self.assertEqual(BorrowingRecord.objects.filter(is_returned=False).count(), 1)
+
+    def test_batch_borrow_view(self):
+        self.client.login(username='desk', password='password')
+        response = self.client.post(reverse('equipment:batch_borrow'), {
+            'borrower': 'stu', 'due_date': self.due.strftime('%Y-%m-%dT%H:%M'), 'items': 'CART-LP x3\nCART-MS\n',
+        })
+        self.assertRedirects(response, reverse('equipment:batch_borrow'))
+        self.assertEqual(BorrowingRecord.objects.filter(borrower=self.student).count(), 4)
+
+        response = self.client.post(reverse('equipment:batch_return'), {'identifiers': 'CART-LP, CART-MS'})
+        self.assertRedirects(response, reverse('equipment:batch_return'))
+        self.assertEqual(BorrowingRecord.objects.filter(is_returned=False).count(), 2)
+
+    def test_batch_views_require_staff(self):
+        self.client.login(username='stu', password='password')
+        self.assertEqual(self.client.get(reverse('equipment:batch_borrow')).status_code, 403)
+
+class BorrowConcurrencyTests(TransactionTestCase):
+    """
+    多线程同时借用同一设备：不能超借，库存不能变成负数
+    """
+    THREADS = 8
+    ATTEMPTS = 60 # 一个班 60 人同时借 20 台笔记本
+
+    def test_concurrent_borrows_never_overbook(self):
+        laptop = Equipment.objects.create(name='Laptop', identifier='CC-LP', quantity_total=20, quantity_available=20)
+        borrower = User.objects.create_user(email='cc@example.com', username='cc_user', password='password', role=User.ROLE_STUDENT)
+        due = timezone.now() + timedelta(days=1)
+
+        def attempt(_):
+            try:
+                for _ in range(200):
+                    try:
+                        borrow_equipment(laptop, borrower, due)
+                        return True
+                    except OperationalError:
+                        # SQLite 的共享内存测试库遇到并发写会直接报 "table is locked"，整个事务已回滚，重试即可
+                        time.sleep(0.005)
+                raise AssertionError('Too many lock retries.')
+            except EquipmentUnavailable:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            results = list(pool.map(attempt, range(self.ATTEMPTS)))
+
+        laptop.refresh_from_db()
+        self.assertEqual(results.count(True), 20)
+        self.assertEqual(laptop.quantity_available, 0)
+        self.assertEqual(laptop.status, Equipment.STATUS_BORROWED)
+        self.assertEqual(BorrowingRecord.objects.filter(equipment=laptop).count(), 20)
+
+
+class EquipmentFilterCacheTests(TestCase):
+    """
+    测试设备筛选表单的分类下拉选项缓存
+    """
+    def setUp(self):
+        cache.clear()
+
+    def test_category_choices_are_cached_and_invalidated(self):
+        EquipmentCategory.objects.create(name='Cameras')
+        str(EquipmentFilter({}).form)
+        with self.assertNumQueries(0):
+            self.assertIn('Cameras', str(EquipmentFilter({}).form))
+        with self.captureOnCommitCallbacks(execute=True):
+            EquipmentCategory.objects.create(name='Projectors')
+        self.assertIn('Projectors', str(EquipmentFilter({}).form))
@@ -4,6 +4,7 @@ from .views import EquipmentListView, EquipmentDetailView
 from .views import EquipmentCreateView, EquipmentUpdateView, EquipmentDeleteView
 from .views import BorrowEquipmentView
 from .views import ReturnEquipmentView
+from .views import BatchBorrowView, BatchReturnView
 from .views import MyBorrowingsView
 from .views import CreateRepairRequestView
 from .views import RepairRequestListView, RepairRequestDetailView, UpdateRepairRequestStatusView
@@ -20,6 +21,8 @@ urlpatterns = [
     path('<int:equipment_id>/borrow/', BorrowEquipmentView.as_view(), name='borrow_equipment'),
     # path('borrowing/<int:borrowing_record_id>/return/', ReturnEquipmentView.as_view(), name='return_equipment'),
     path('borrowing/<int:record_id>/return/', ReturnEquipmentView.as_view(), name='return_equipment_record'),
+    path('batch/borrow/', BatchBorrowView.as_view(), name='batch_borrow'),
+    path('batch/return/', BatchReturnView.as_view(), name='batch_return'),
     path('my-borrowings/', MyBorrowingsView.as_view(), name='my_borrowings'),
     path('<int:equipment_id>/report-issue/', CreateRepairRequestView.as_view(), name='create_repair_request'),
     path('repair-requests/', RepairRequestListView.as_view(), name='repair_request_list'),
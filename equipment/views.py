@@ -6,7 +6,8 @@ from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy, reverse
 from django.utils import timezone
 from .models import Equipment, BorrowingRecord, RepairRequest
-from .forms import EquipmentForm, BorrowEquipmentForm, RepairRequestForm
+from .forms import EquipmentForm, BorrowEquipmentForm, RepairRequestForm, BatchBorrowForm, BatchReturnForm
+from .services import EquipmentUnavailable, borrow_equipment, return_borrowing, borrow_equipment_batch, return_equipment_batch
 from users.mixins import StaffRequiredMixin
 from django.contrib import messages
 from datetime import timedelta
@@ -102,17 +103,12 @@ class BorrowEquipmentView(LoginRequiredMixin, View): # Changed to View for more
 
         form = self.form_class(request.POST)
         if form.is_valid():
-            borrowing_record = form.save(commit=False)
-            borrowing_record.equipment = equipment
-            borrowing_record.borrower = request.user
-            borrowing_record.is_returned = False # Explicitly set
-            borrowing_record.save()
-
-            # Update equipment status and quantity
-            equipment.quantity_available -= 1
-            if equipment.quantity_available == 0 and equipment.status != Equipment.STATUS_REPAIR:
-                equipment.status = Equipment.STATUS_BORROWED  
-            equipment.save()
+            # 库存扣减和借用记录在同一事务中完成，并发借用时由数据库保证不会超借
+            try:
+                borrowing_record = borrow_equipment(equipment, request.user, form.cleaned_data['due_date'])
+            except EquipmentUnavailable:
+                messages.error(request, f"'{equipment.name}' is not available for borrowing (state changed).")
+                return redirect('equipment:equipment_detail', pk=equipment_id)
 
             messages.success(request, f"You have successfully borrowed '{equipment.name}'. Due by {borrowing_record.due_date.strftime('%Y-%m-%d %H:%M')}.")
             return redirect('equipment:my_borrowings') # Redirect to user's borrowing list
@@ -142,36 +138,11 @@ class ReturnEquipmentView(LoginRequiredMixin, View):
             # return redirect('equipment:equipment_detail', pk=equipment.pk)
             raise PermissionDenied("You do not have permission to return this item.") # 这样会直接返回 403
         
-        if borrowing_record.is_returned:
-            messages.warning(request, "This item has already been marked as returned.")
+        # 标记归还与库存加 1 在同一事务中完成；并发重复提交时只有一次生效
+        if return_borrowing(borrowing_record):
+            messages.success(request, f"'{equipment.name}' (borrowed by {borrowing_record.borrower.username}) has been marked as returned.")
         else:
-            borrowing_record.is_returned = True
-            borrowing_record.return_date = timezone.now()
-            # borrowing_record.save()
-
-            equipment.quantity_available = min(equipment.quantity_total, equipment.quantity_available + 1)
-            # 更新设备状态
-            # 检查是否还有其他未归还的相同设备的借用记录
-            active_borrows_for_this_equipment_type = BorrowingRecord.objects.filter(
-                equipment=equipment,
-                is_returned=False
-            ).exclude(pk=borrowing_record.pk).count() # 排除当前正在归还的这条记录
-            
-            if equipment.status == Equipment.STATUS_REPAIR:
-                # 如果设备正在维修中，归还不应改变其维修状态，除非你有特定逻辑
-                pass
-            elif active_borrows_for_this_equipment_type == 0:
-                # 如果这是该设备类型最后一条被归还的记录，则设备状态变回可用
-                equipment.status = Equipment.STATUS_AVAILABLE
-            # 如果你希望只要 quantity_available > 0 且不是维修中，就变为 AVAILABLE，可以添加以下逻辑：
-            # elif equipment.quantity_available > 0 and equipment.status != Equipment.STATUS_REPAIR:
-            #    equipment.status = Equipment.STATUS_AVAILABLE
-            try:
-                equipment.save()
-                borrowing_record.save() # 在 equipment 保存成功后再保存
-                messages.success(request, f"'{equipment.name}' (borrowed by {borrowing_record.borrower.username}) has been marked as returned.")
-            except Exception as e:
-                messages.error(request, f"An error occurred while trying to return the equipment: {e}")
+            messages.warning(request, "This item has already been marked as returned.")
         
         return redirect('equipment:equipment_detail', pk=equipment.pk)
     
@@ -182,6 +153,49 @@ class ReturnEquipmentView(LoginRequiredMixin, View):
         messages.info(request, "To return equipment, please use the 'Return' button on the equipment detail page or borrowings list.")
         return redirect('equipment:equipment_detail', pk=borrowing_record.equipment.pk)
 
+class BatchBorrowView(LoginRequiredMixin, StaffRequiredMixin, View):
+    """柜台批量借出 (例如给一个班发一车笔记本)：整车要么全部借出，要么一件都不借。"""
+    form_class = BatchBorrowForm
+    template_name = 'equipment/batch_borrow_form.html'
+
+    def get(self, request):
+        default_due_date = timezone.now() + timedelta(days=7)
+        form = self.form_class(initial={'due_date': default_due_date.strftime('%Y-%m-%dT%H:%M')})
+        return render(request, self.template_name, {'form': form})
+
+    def post(self, request):
+        form = self.form_class(request.POST)
+        if form.is_valid():
+            borrower = form.cleaned_data['borrower']
+            try:
+                records = borrow_equipment_batch(form.cleaned_data['items'], borrower, form.cleaned_data['due_date'])
+            except EquipmentUnavailable as e:
+                form.add_error('items', str(e))
+            else:
+                messages.success(request, f"{len(records)} item(s) checked out to {borrower.username}.")
+                return redirect('equipment:batch_borrow')
+        return render(request, self.template_name, {'form': form})
+
+class BatchReturnView(LoginRequiredMixin, StaffRequiredMixin, View):
+    """柜台批量归还：扫描一串标识符，一次事务全部归还。"""
+    form_class = BatchReturnForm
+    template_name = 'equipment/batch_return_form.html'
+
+    def get(self, request):
+        return render(request, self.template_name, {'form': self.form_class()})
+
+    def post(self, request):
+        form = self.form_class(request.POST)
+        if form.is_valid():
+            result = return_equipment_batch(form.cleaned_data['identifiers'], borrower=form.cleaned_data['borrower'])
+            if result.returned:
+                messages.success(request, f"{sum(result.returned.values())} item(s) checked in.")
+            if result.not_borrowed:
+                not_borrowed = ', '.join(f"{identifier} x{count}" for identifier, count in sorted(result.not_borrowed.items()))
+                messages.warning(request, f"No open borrowing found for: {not_borrowed}.")
+            return redirect('equipment:batch_return')
+        return render(request, self.template_name, {'form': form})
+
 class MyBorrowingsView(LoginRequiredMixin, ListView):
     model = BorrowingRecord
     template_name = 'equipment/my_borrowings.html'
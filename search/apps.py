@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class SearchConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'search'
+
+    def ready(self):
+        # 注册课程、作业、课程资料、设备保存/删除时维护搜索索引的信号
+        from . import signals  # noqa: F401
@@ -0,0 +1,122 @@
+# search/backends.py
+"""
+按数据库选择全文检索实现：
+    - SQLite：FTS5 外部内容表 search_document_fts (迁移 0001 创建，触发器与 search_searchdocument 同步)，bm25 排序；
+    - PostgreSQL：document_vector() 表达式上的 GIN 索引，ts_rank 排序；
+    - 其他数据库：退回 icontains，不排序。
+查询中的每个词都按前缀匹配，并且都必须出现 (AND)。标题的权重高于正文。
+传入 course_ids 时作业和课程资料只返回这些课程中的 (在数据库中过滤，LIMIT 之前)。
+"""
+from collections import namedtuple
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import SearchDocument
+
+FTS_TABLE = 'search_document_fts'
+PG_CONFIG = 'simple' # 课程内容中英文混杂，不做词干处理
+TITLE_WEIGHT = 5.0
+WORD_RE = re.compile(r'\w+')
+# 摘要中高亮的起止标记 (私用区字符，转义 HTML 后再换成 <mark>)
+MARK_START, MARK_END = '\ue000', '\ue001'
+
+SearchHit = namedtuple('SearchHit', ['document', 'rank', 'snippet'])
+
+
+def query_terms(query):
+    return WORD_RE.findall((query or '').lower())[:10]
+
+
+def document_vector():
+    """
+    PostgreSQL 的 tsvector 表达式；迁移 0001 中的 GIN 索引使用同一个表达式 (迁移里是一份拷贝)，查询才能用上索引。
+    修改时要新增迁移重建索引。
+    """
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector('title', weight='A', config=PG_CONFIG) + SearchVector('body', weight='B', config=PG_CONFIG)
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def search(query, kinds=None, limit=20, course_ids=None):
+    """
+    返回按相关度排序的 SearchHit 列表 (最多 limit 条)。kinds 可限定对象类型；
+    course_ids 不为 None 时，作业和课程资料只返回所属课程在其中的。
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    if course_ids is not None:
+        course_ids = list(course_ids)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(terms, kinds, limit, course_ids)
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(terms, kinds, limit, course_ids)
+    return _search_fallback(terms, kinds, limit, course_ids)
+
+
+def _course_filter(course_ids):
+    return ~Q(kind__in=SearchDocument.COURSE_KINDS) | Q(course_id__in=course_ids)
+
+
+def _search_sqlite(terms, kinds, limit, course_ids):
+    match = ' AND '.join(f'"{term}"*' for term in terms)
+    params = [MARK_START, MARK_END, match]
+    kind_filter = ''
+    if kinds:
+        kind_filter = f"AND d.kind IN ({', '.join(['%s'] * len(kinds))})"
+        params.extend(kinds)
+    if course_ids is not None:
+        kind_filter += f" AND (d.kind NOT IN ({', '.join(['%s'] * len(SearchDocument.COURSE_KINDS))})"
+        params.extend(SearchDocument.COURSE_KINDS)
+        if course_ids:
+            kind_filter += f" OR d.course_id IN ({', '.join(['%s'] * len(course_ids))})"
+            params.extend(course_ids)
+        kind_filter += ')'
+    params.append(limit)
+    sql = f"""
+        SELECT d.id, bm25({FTS_TABLE}, {TITLE_WEIGHT}, 1.0) AS rank,
+               snippet({FTS_TABLE}, -1, %s, %s, '…', 16)
+        FROM {FTS_TABLE} JOIN search_searchdocument d ON d.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s {kind_filter}
+        ORDER BY rank
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    documents = SearchDocument.objects.defer('body').in_bulk([row[0] for row in rows])
+    # bm25 越小越相关，取负数使 rank 越大越相关
+    return [SearchHit(documents[pk], -rank, highlight(snippet)) for pk, rank, snippet in rows if pk in documents]
+
+
+def _search_postgresql(terms, kinds, limit, course_ids):
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+    search_query = SearchQuery(' & '.join(f'{term}:*' for term in terms), config=PG_CONFIG, search_type='raw')
+    documents = SearchDocument.objects.annotate(search=document_vector()).filter(search=search_query)
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+    if course_ids is not None:
+        documents = documents.filter(_course_filter(course_ids))
+    documents = documents.annotate(
+        rank=SearchRank(document_vector(), search_query),
+        snippet=SearchHeadline('body', search_query, config=PG_CONFIG, start_sel=MARK_START, stop_sel=MARK_END, max_words=30),
+    ).defer('body').order_by('-rank', 'pk')[:limit]
+    return [SearchHit(document, document.rank, highlight(document.snippet)) for document in documents]
+
+
+def _search_fallback(terms, kinds, limit, course_ids):
+    documents = SearchDocument.objects.defer('body')
+    for term in terms:
+        documents = documents.filter(Q(title__icontains=term) | Q(body__icontains=term))
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+    if course_ids is not None:
+        documents = documents.filter(_course_filter(course_ids))
+    return [SearchHit(document, 0, '') for document in documents.order_by('kind', 'title')[:limit]]
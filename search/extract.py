@@ -0,0 +1,84 @@
+# search/extract.py
+"""
+从上传的课程资料 (以及作业提交，用于查重) 中提取文本。支持纯文本类文件、PDF (需要安装 pypdf) 和 Word .docx，
+其他格式 (图片、旧版 .doc 等) 返回空字符串，只按标题和描述检索。
+"""
+import os
+import zipfile
+from xml.etree import ElementTree
+
+TEXT_EXTENSIONS = {'.txt', '.md', '.rst', '.csv', '.tsv', '.json', '.html', '.htm', '.xml', '.tex', '.py', '.java', '.c', '.cpp', '.sql'}
+MAX_EXTRACT_CHARS = 200_000 # 只索引前 20 万个字符，避免超大文件撑大索引
+MAX_PDF_PAGES = 200
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def extract_text(field_file):
+    """返回 FileField 文件中的文本；文件不存在、格式不支持或解析失败时返回空字符串，不抛出异常。"""
+    if not field_file:
+        return ''
+    extension = os.path.splitext(field_file.name)[1].lower()
+    try:
+        if extension == '.pdf':
+            return _pdf_text(field_file)
+        if extension == '.docx':
+            return _docx_text(field_file)
+        if extension in TEXT_EXTENSIONS:
+            return _plain_text(field_file)
+    except (OSError, ValueError):
+        pass
+    return ''
+
+
+def _plain_text(field_file):
+    with field_file.open('rb') as f:
+        raw = f.read(MAX_EXTRACT_CHARS * 4) # UTF-8 每个字符最多 4 字节
+    for encoding in ('utf-8-sig', 'gb18030'):
+        try:
+            return raw.decode(encoding)[:MAX_EXTRACT_CHARS]
+        except UnicodeDecodeError:
+            continue
+    return raw.decode('utf-8', errors='ignore')[:MAX_EXTRACT_CHARS]
+
+
+def _pdf_text(field_file):
+    try:
+        from pypdf import PdfReader
+        from pypdf.errors import PyPdfError
+    except ImportError: # pypdf 未安装时不索引 PDF 内容
+        return ''
+    parts = []
+    length = 0
+    try:
+        with field_file.open('rb') as f:
+            for page in PdfReader(f).pages[:MAX_PDF_PAGES]:
+                text = page.extract_text() or ''
+                parts.append(text)
+                length += len(text)
+                if length >= MAX_EXTRACT_CHARS:
+                    break
+    except PyPdfError:
+        return ''
+    return '\n'.join(parts)[:MAX_EXTRACT_CHARS]
+
+
+def _docx_text(field_file):
+    # .docx 是 zip 包，正文在 word/document.xml 中：每个 <w:p> 段落由若干 <w:t> 文本组成。逐个元素解析，不整个读入
+    parts = []
+    length = 0
+    try:
+        with field_file.open('rb') as f, zipfile.ZipFile(f) as archive, archive.open('word/document.xml') as document:
+            runs = []
+            for _event, element in ElementTree.iterparse(document):
+                if element.tag == WORD_NAMESPACE + 't':
+                    runs.append(element.text or '')
+                elif element.tag == WORD_NAMESPACE + 'p':
+                    parts.append(''.join(runs))
+                    length += len(parts[-1]) + 1
+                    runs = []
+                    element.clear()
+                    if length >= MAX_EXTRACT_CHARS:
+                        break
+    except (KeyError, zipfile.BadZipFile, ElementTree.ParseError): # 不是合法的 .docx
+        return ''
+    return '\n'.join(parts)[:MAX_EXTRACT_CHARS]
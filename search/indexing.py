@@ -0,0 +1,133 @@
+# search/indexing.py
+"""
+被索引的对象及其索引文档的生成方式，以及增量/整体索引。
+
+每种对象对应一个 SearchSource：queryset() 给出需要索引的全部对象 (整体重建时使用)，
+document(obj) 返回 (title, body, url)，course_field 是对象所属课程的字段 (作业、课程资料，搜索时按权限过滤)，
+file_field 是需要提取文本并入正文的文件字段。search.signals 根据 MODEL_KINDS 找到对象对应的类型。
+
+保存对象后的增量索引在请求中执行，只提取不超过 INLINE_EXTRACT_MAX_BYTES 的文件；更大的文件 (大 PDF 解析
+可能要几秒) 先只索引标题和描述并标记 pending_file，由 index_pending_files 命令 (定期运行) 补上文件内容。
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.urls import reverse
+
+from courses.models import Assignment, Course, CourseMaterial
+from equipment.models import Equipment
+from .extract import extract_text
+from .models import SearchDocument
+
+SearchSource = namedtuple('SearchSource', ['kind', 'model', 'queryset', 'document', 'course_field', 'file_field'], defaults=[None, None])
+INLINE_EXTRACT_MAX_BYTES = 256 * 1024
+
+
+def _course_document(course):
+    return course.title, f'{course.code}\n{course.description}', reverse('courses:course_detail', args=[course.pk])
+
+
+def _assignment_document(assignment):
+    return (assignment.title, assignment.description,
+            reverse('courses:assignment_detail', kwargs={'assignment_id': assignment.pk}))
+
+
+def _material_document(material):
+    # 课程资料没有单独的详情页，链接到所属课程；文件内容由 _build_document 并入正文
+    return material.title, material.description, reverse('courses:course_detail', args=[material.course_id])
+
+
+def _equipment_document(equipment):
+    return (equipment.name, f'{equipment.identifier}\n{equipment.description}',
+            reverse('equipment:equipment_detail', args=[equipment.pk]))
+
+
+SOURCES = {
+    SearchDocument.KIND_COURSE: SearchSource(
+        SearchDocument.KIND_COURSE, Course,
+        lambda: Course.objects.only('code', 'title', 'description'), _course_document),
+    SearchDocument.KIND_ASSIGNMENT: SearchSource(
+        SearchDocument.KIND_ASSIGNMENT, Assignment,
+        lambda: Assignment.objects.only('course_id', 'title', 'description'), _assignment_document, 'course_id'),
+    SearchDocument.KIND_MATERIAL: SearchSource(
+        SearchDocument.KIND_MATERIAL, CourseMaterial,
+        lambda: CourseMaterial.objects.only('course_id', 'title', 'description', 'file'), _material_document, 'course_id', 'file'),
+    SearchDocument.KIND_EQUIPMENT: SearchSource(
+        SearchDocument.KIND_EQUIPMENT, Equipment,
+        lambda: Equipment.objects.only('name', 'identifier', 'description'), _equipment_document),
+}
+MODEL_KINDS = {source.model: kind for kind, source in SOURCES.items()}
+
+
+def _file_size(field_file):
+    try:
+        return field_file.size
+    except (OSError, ValueError):
+        return 0
+
+
+def _build_document(kind, obj, defer_large_files=False):
+    source = SOURCES[kind]
+    title, body, url = source.document(obj)
+    course_id = getattr(obj, source.course_field) if source.course_field else None
+    field_file = getattr(obj, source.file_field) if source.file_field else None
+    pending = bool(defer_large_files and field_file and _file_size(field_file) > INLINE_EXTRACT_MAX_BYTES)
+    if field_file and not pending:
+        body = '\n'.join(part for part in (body, extract_text(field_file)) if part)
+    return SearchDocument(kind=kind, object_id=obj.pk, title=(title or '')[:255], body=body or '', url=url,
+                          course_id=course_id, pending_file=pending)
+
+
+def index_object(obj, defer_large_files=True):
+    """新增或更新一个对象的索引文档。默认 (在请求中) 大文件的内容留给 index_pending_files 提取。"""
+    document = _build_document(MODEL_KINDS[type(obj)], obj, defer_large_files)
+    SearchDocument.objects.update_or_create(
+        kind=document.kind, object_id=document.object_id,
+        defaults={'title': document.title, 'body': document.body, 'url': document.url,
+                  'course_id': document.course_id, 'pending_file': document.pending_file},
+    )
+
+
+def index_pending_files(limit=None):
+    """提取标记为 pending_file 的文档的文件内容并更新索引 (最多 limit 个)。返回处理的文档数。"""
+    count = 0
+    for kind, source in SOURCES.items():
+        if not source.file_field or (limit is not None and count >= limit):
+            continue
+        pending = SearchDocument.objects.filter(kind=kind, pending_file=True).order_by('pk').values_list('object_id', flat=True)
+        object_ids = list(pending if limit is None else pending[:limit - count])
+        found = set()
+        for obj in source.queryset().filter(pk__in=object_ids).iterator(chunk_size=100):
+            index_object(obj, defer_large_files=False)
+            found.add(obj.pk)
+        # 对象已经删除 (删除信号的 on_commit 没有执行到) 的文档
+        SearchDocument.objects.filter(kind=kind, object_id__in=set(object_ids) - found).delete()
+        count += len(object_ids)
+    return count
+
+
+def remove_object(model, pk):
+    SearchDocument.objects.filter(kind=MODEL_KINDS[model], object_id=pk).delete()
+
+
+def rebuild_index(kinds=None, batch_size=500):
+    """
+    整体重建 (某几种对象的) 索引：先删除旧文档，再按批 bulk_create。返回每种对象写入的文档数。
+    SQLite 的 FTS5 表由触发器同步，PostgreSQL 的 GIN 索引由数据库维护，都不需要额外处理。
+    """
+    counts = {}
+    for kind in kinds or SOURCES:
+        source = SOURCES[kind]
+        with transaction.atomic():
+            SearchDocument.objects.filter(kind=kind).delete()
+            batch = []
+            count = 0
+            for obj in source.queryset().order_by('pk').iterator(chunk_size=batch_size):
+                batch.append(_build_document(kind, obj))
+                if len(batch) >= batch_size:
+                    SearchDocument.objects.bulk_create(batch)
+                    count += len(batch)
+                    batch = []
+            SearchDocument.objects.bulk_create(batch)
+            counts[kind] = count + len(batch)
+    return counts
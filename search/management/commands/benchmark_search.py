@@ -0,0 +1,101 @@
+# search/management/commands/benchmark_search.py
+
+import itertools
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from courses.models import Assignment, Course, CourseMaterial
+from equipment.models import Equipment
+from search.backends import query_terms, search
+from search.indexing import rebuild_index
+
+# 与全文检索覆盖相同字段的 icontains 查询 (现有筛选器/后台搜索框的做法)
+ICONTAINS_FIELDS = [
+    (Course, ['code', 'title', 'description']),
+    (Assignment, ['title', 'description']),
+    (CourseMaterial, ['title', 'description']),
+    (Equipment, ['name', 'identifier', 'description']),
+]
+DEFAULT_QUERIES = ['algebra', 'data struct', 'intro programming', 'microscope', 'lab safety report']
+KEYWORDS = ('introduction advanced calculus linear algebra physics chemistry biology history literature programming '
+              'data structures algorithms networks databases statistics economics philosophy design theory analysis '
+              'laboratory safety report microscope projector camera tripod essay seminar project').split()
+
+
+def icontains_search(query, limit=20):
+    """现有列表页的做法：每个模型一条 COUNT (分页) 加一条排序后的分页查询。"""
+    results = []
+    terms = query_terms(query)
+    for model, fields in ICONTAINS_FIELDS:
+        condition = Q()
+        for term in terms:
+            term_condition = Q()
+            for field in fields:
+                term_condition |= Q(**{f'{field}__icontains': term})
+            condition &= term_condition
+        matches = model.objects.filter(condition)
+        matches.count()
+        results.extend(matches.order_by('pk').values_list('pk', flat=True)[:limit])
+    return results
+
+
+class Command(BaseCommand):
+    help = ('Compares full-text search latency with the icontains queries it replaces. '
+            'With --synthetic N, N synthetic courses/assignments/equipment are created inside a transaction '
+            'that is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', help=f'Queries to run (default: {", ".join(DEFAULT_QUERIES)}).')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query (default: 20).')
+        parser.add_argument('--synthetic', type=int, default=0, help='Number of synthetic rows per model to add.')
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or DEFAULT_QUERIES
+        with transaction.atomic():
+            if options['synthetic']:
+                self._create_synthetic(options['synthetic'])
+                rebuild_index()
+            self.stdout.write(f'{connection.vendor}, {Course.objects.count()} courses, repeat={options["repeat"]}')
+            self.stdout.write(f'{"query":<22}{"full-text ms":>14}{"icontains ms":>14}{"hits":>8}')
+            for query in queries:
+                fts = self._median_ms(lambda: search(query), options['repeat'])
+                like = self._median_ms(lambda: icontains_search(query), options['repeat'])
+                self.stdout.write(f'{query:<22}{fts:>14.2f}{like:>14.2f}{len(search(query)):>8}')
+            transaction.set_rollback(True) # 不保留合成数据
+
+    def _median_ms(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def _create_synthetic(self, count):
+        rng = random.Random(42)
+        # 近似自然语言的 Zipf 分布：5000 个生成词，关键词分散在不同的频率档位
+        syllables = ['ka', 'lo', 'mi', 'ne', 'ru', 'ta', 'shi', 'po', 'ven', 'dor', 'ix', 'an']
+        vocabulary = list(dict.fromkeys(
+            ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(6000)
+        ))[:5000]
+        for keyword in KEYWORDS:
+            vocabulary.insert(rng.randrange(20, len(vocabulary)), keyword)
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+        def text(words):
+            return ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=words))
+
+        courses = Course.objects.bulk_create([
+            Course(code=f'BENCH{i:06d}', title=text(3).title(), description=text(60)) for i in range(count)
+        ], batch_size=1000)
+        Assignment.objects.bulk_create([
+            Assignment(course=rng.choice(courses), title=text(3), description=text(80), due_date=timezone.now())
+            for _ in range(count)
+        ], batch_size=1000)
+        Equipment.objects.bulk_create([
+            Equipment(name=text(2).title(), identifier=f'BENCH-EQ-{i:06d}', description=text(30)) for i in range(count)
+        ], batch_size=1000)
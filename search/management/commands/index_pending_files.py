@@ -0,0 +1,16 @@
+# search/management/commands/index_pending_files.py
+
+from django.core.management.base import BaseCommand
+from search.indexing import index_pending_files
+
+
+class Command(BaseCommand):
+    help = ('Extracts the text of large uploaded files that were indexed without their content when saved, '
+            'and adds it to the search index. Run periodically, e.g. from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help='Process at most this many documents in this run.')
+
+    def handle(self, *args, **options):
+        count = index_pending_files(options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed the file content of {count} document(s).'))
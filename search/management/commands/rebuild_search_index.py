@@ -0,0 +1,20 @@
+# search/management/commands/rebuild_search_index.py
+
+from django.core.management.base import BaseCommand
+from search.indexing import SOURCES, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index (courses, assignments, course materials and equipment).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', dest='kinds', choices=sorted(SOURCES),
+                            help='Only rebuild documents of this kind (may be repeated).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of documents written per bulk insert (default: 500).')
+
+    def handle(self, *args, **options):
+        counts = rebuild_index(options['kinds'], batch_size=options['batch_size'])
+        for kind, count in counts.items():
+            self.stdout.write(f'{kind}: {count} document(s)')
+        self.stdout.write(self.style.SUCCESS(f'Indexed {sum(counts.values())} document(s).'))
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+FTS_TABLE = 'search_document_fts'
+PG_INDEX = 'search_document_vector_idx'
+
+SQLITE_SETUP = [
+    # 外部内容 FTS5 表：只保存倒排索引，正文仍在 search_searchdocument 中，由下面的触发器同步
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, body, content='search_searchdocument', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER search_document_ai AFTER INSERT ON search_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    f"""CREATE TRIGGER search_document_ad AFTER DELETE ON search_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    f"""CREATE TRIGGER search_document_au AFTER UPDATE ON search_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+SQLITE_TEARDOWN = [
+    'DROP TRIGGER IF EXISTS search_document_ai',
+    'DROP TRIGGER IF EXISTS search_document_ad',
+    'DROP TRIGGER IF EXISTS search_document_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def _pg_index():
+    # 与 search.backends.document_vector() 相同的表达式 (迁移不导入应用代码；修改表达式时新增迁移重建索引)
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+    vector = SearchVector('title', weight='A', config='simple') + SearchVector('body', weight='B', config='simple')
+    return GinIndex(vector, name=PG_INDEX)
+
+
+def create_fulltext_index(apps, schema_editor):
+    # 全文索引依赖数据库，其他数据库不建索引 (search.backends 退回 icontains)
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_SETUP:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('search', 'SearchDocument'), _pg_index())
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in SQLITE_TEARDOWN:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('search', 'SearchDocument'), _pg_index())
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Course'), ('assignment', 'Assignment'), ('material', 'Course Material'), ('equipment', 'Equipment')], max_length=20, verbose_name='Kind')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Object ID')),
+                ('title', models.CharField(max_length=255, verbose_name='Title')),
+                ('body', models.TextField(blank=True, verbose_name='Body')),
+                ('url', models.CharField(max_length=255, verbose_name='URL')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Search Document',
+                'verbose_name_plural': 'Search Documents',
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:09
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_course_ids(apps, schema_editor):
+    # 已有的作业、课程资料索引文档补上所属课程
+    SearchDocument = apps.get_model('search', 'SearchDocument')
+    for kind, model in (('assignment', 'Assignment'), ('material', 'CourseMaterial')):
+        objects = apps.get_model('courses', model).objects.filter(pk=OuterRef('object_id'))
+        SearchDocument.objects.filter(kind=kind).update(course_id=Subquery(objects.values('course_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('courses', '0011_submission_signatures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchdocument',
+            name='course_id',
+            field=models.PositiveBigIntegerField(blank=True, db_index=True, null=True, verbose_name='Course ID'),
+        ),
+        migrations.RunPython(fill_course_ids, migrations.RunPython.noop),
+    ]
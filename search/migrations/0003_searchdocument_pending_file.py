@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+FTS_TABLE = 'search_document_fts'
+# SQLite 加 NOT NULL 列时 Django 重建 search_searchdocument (建新表、复制、改名)，0001 中的同步触发器随旧表一起被删除，
+# 这里重新创建。重建时行的 id 不变，FTS5 外部内容表中的索引仍然有效
+SQLITE_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS search_document_ai',
+    'DROP TRIGGER IF EXISTS search_document_ad',
+    'DROP TRIGGER IF EXISTS search_document_au',
+    f"""CREATE TRIGGER search_document_ai AFTER INSERT ON search_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    f"""CREATE TRIGGER search_document_ad AFTER DELETE ON search_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    f"""CREATE TRIGGER search_document_au AFTER UPDATE ON search_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+
+def restore_sqlite_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_searchdocument_course_id'),
+    ]
+
+    operations = [
+        # 回滚时删除列同样会重建表，在最后一步 (即这里) 恢复触发器
+        migrations.RunPython(migrations.RunPython.noop, restore_sqlite_triggers),
+        migrations.AddField(
+            model_name='searchdocument',
+            name='pending_file',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='File Text Pending'),
+        ),
+        migrations.RunPython(restore_sqlite_triggers, migrations.RunPython.noop),
+    ]
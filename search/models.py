@@ -0,0 +1,37 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class SearchDocument(models.Model):
+    """
+    全站搜索的索引文档，每个被索引的对象 (课程、作业、课程资料、设备) 一行，内容由 search.indexing 生成。
+    全文索引建在这张表上：SQLite 为 FTS5 外部内容表 (由触发器同步)，PostgreSQL 为 tsvector 表达式上的 GIN 索引，
+    见 search.backends 和迁移 0001。由 search.signals 在对象保存/删除时增量维护；rebuild_search_index 可整体重建。
+    """
+    KIND_COURSE = 'course'
+    KIND_ASSIGNMENT = 'assignment'
+    KIND_MATERIAL = 'material'
+    KIND_EQUIPMENT = 'equipment'
+    KIND_CHOICES = [
+        (KIND_COURSE, _('Course')),
+        (KIND_ASSIGNMENT, _('Assignment')),
+        (KIND_MATERIAL, _('Course Material')),
+        (KIND_EQUIPMENT, _('Equipment')),
+    ]
+    COURSE_KINDS = (KIND_ASSIGNMENT, KIND_MATERIAL) # 只对课程教师和选课学生可见的类型
+    kind = models.CharField(_('Kind'), max_length=20, choices=KIND_CHOICES) # 对象类型
+    object_id = models.PositiveBigIntegerField(_('Object ID')) # 对象主键
+    title = models.CharField(_('Title'), max_length=255)
+    body = models.TextField(_('Body'), blank=True) # 描述、资料文件中提取的文本等
+    url = models.CharField(_('URL'), max_length=255)
+    course_id = models.PositiveBigIntegerField(_('Course ID'), null=True, blank=True, db_index=True) # 作业、课程资料所属的课程，搜索时按权限过滤
+    pending_file = models.BooleanField(_('File Text Pending'), default=False, db_index=True) # 大文件的内容还没有提取，见 index_pending_files
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Search Document') # 搜索索引文档
+        verbose_name_plural = _('Search Documents')
+        unique_together = ('kind', 'object_id')
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
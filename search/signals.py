@@ -0,0 +1,22 @@
+# search/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from .indexing import MODEL_KINDS, index_object, remove_object
+
+
+def update_search_document(sender, instance, raw=False, **kwargs):
+    # 提交后再更新索引 (课程资料需要读取上传的文件)，回滚的修改不会进入索引
+    if raw: # loaddata 时不维护，之后运行 rebuild_search_index
+        return
+    transaction.on_commit(lambda: index_object(instance))
+
+
+def delete_search_document(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: remove_object(sender, pk))
+
+
+for model in MODEL_KINDS:
+    post_save.connect(update_search_document, sender=model, dispatch_uid=f'search_index_{model._meta.label_lower}')
+    post_delete.connect(delete_search_document, sender=model, dispatch_uid=f'search_remove_{model._meta.label_lower}')
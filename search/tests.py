@@ -0,0 +1,130 @@
+# search/tests.py
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from io import StringIO
+import io
+import zipfile
+from campushive.testing import TemporaryMediaMixin
+from courses.models import Assignment, Course, CourseMaterial, Enrollment
+from equipment.models import Equipment
+from .backends import search
+from .extract import extract_text
+from .indexing import INLINE_EXTRACT_MAX_BYTES
+from .models import SearchDocument
+
+User = get_user_model()
+
+
+class SearchIndexTests(TemporaryMediaMixin, TestCase):
+    """
+    测试全文索引的增量维护、排序和搜索页面
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='search@example.com', username='searcher', password='password', role=User.ROLE_STUDENT)
+
+    def _titles(self, query, **kwargs):
+        return [hit.document.title for hit in search(query, **kwargs)]
+
+    def test_objects_are_indexed_on_save_and_removed_on_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = Course.objects.create(code='FTS101', title='Organic Chemistry', description='Reactions of carbon compounds.')
+            Assignment.objects.create(course=course, title='Lab report', description='Describe the titration experiment.', due_date=timezone.now())
+            Equipment.objects.create(name='Digital Microscope', identifier='EQ-FTS-1', description='Ideal for chemistry labs.')
+        self.assertEqual(self._titles('titration'), ['Lab report'])
+        self.assertEqual(self._titles('microsc'), ['Digital Microscope']) # 前缀匹配
+        self.assertEqual(self._titles('carbon compounds'), ['Organic Chemistry'])
+        self.assertEqual(self._titles('carbon titration'), []) # 每个词都必须出现
+
+        with self.captureOnCommitCallbacks(execute=True):
+            course.title = 'Inorganic Chemistry'
+            course.save()
+        self.assertEqual(self._titles('inorganic'), ['Inorganic Chemistry'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            course.delete() # 作业随课程级联删除
+        self.assertEqual(self._titles('titration'), [])
+        self.assertEqual(self._titles('chemistry'), ['Digital Microscope'])
+
+    def test_title_matches_rank_above_body_matches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(code='FTS201', title='Statistics for Biology', description='Probability and inference.')
+            Course.objects.create(code='FTS202', title='Field Ecology', description='Uses statistics to analyse samples.')
+        self.assertEqual(self._titles('statistics'), ['Statistics for Biology', 'Field Ecology'])
+        self.assertEqual(self._titles('statistics', kinds=[SearchDocument.KIND_EQUIPMENT]), [])
+
+    def test_material_file_text_is_indexed(self):
+        course = Course.objects.create(code='FTS301', title='Databases')
+        upload = SimpleUploadedFile('notes.txt', 'Normalisation removes redundancy from relational schemas.'.encode('utf-8'))
+        with self.captureOnCommitCallbacks(execute=True):
+            material = CourseMaterial.objects.create(course=course, title='Week 3 notes', file=upload)
+        self.assertEqual(self._titles('redundancy'), ['Week 3 notes'])
+        self.assertIn('redundancy', extract_text(material.file))
+        self.assertEqual(extract_text(SimpleUploadedFile('photo.png', b'\x89PNG')), '')
+
+    def test_large_file_text_is_extracted_outside_the_request(self):
+        course = Course.objects.create(code='FTS302', title='Compilers')
+        text = 'Lexical analysis splits source into tokens. ' + 'filler ' * (INLINE_EXTRACT_MAX_BYTES // 7)
+        with self.captureOnCommitCallbacks(execute=True):
+            CourseMaterial.objects.create(course=course, title='Lexer handout', file=SimpleUploadedFile('lexer.txt', text.encode()))
+        self.assertEqual(self._titles('lexical'), []) # 保存时只索引标题和描述
+        self.assertEqual(self._titles('lexer'), ['Lexer handout'])
+        self.assertTrue(SearchDocument.objects.get(title='Lexer handout').pending_file)
+
+        call_command('index_pending_files', stdout=StringIO())
+        self.assertEqual(self._titles('lexical'), ['Lexer handout'])
+        self.assertFalse(SearchDocument.objects.filter(pending_file=True).exists())
+
+    def test_docx_text_is_extracted(self):
+        document = (
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+            '<w:p><w:r><w:t>Relational </w:t></w:r><w:r><w:t>algebra</w:t></w:r></w:p>'
+            '<w:p><w:r><w:t>关系代数</w:t></w:r></w:p></w:body></w:document>'
+        )
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('word/document.xml', document)
+        self.assertEqual(extract_text(SimpleUploadedFile('essay.docx', buffer.getvalue())), 'Relational algebra\n关系代数')
+        self.assertEqual(extract_text(SimpleUploadedFile('broken.docx', b'not a zip')), '')
+
+    def test_search_page_highlights_matches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Equipment.objects.create(name='Tripod', identifier='EQ-FTS-2', description='Aluminium tripod <b>for</b> cameras.')
+        self.client.login(username='searcher', password='password')
+        response = self.client.get(reverse('search:search'), {'q': 'cameras'})
+        self.assertContains(response, '<mark>cameras</mark>')
+        self.assertContains(response, '&lt;b&gt;for&lt;/b&gt;') # 正文中的 HTML 被转义
+        self.assertContains(response, reverse('equipment:equipment_detail', args=[Equipment.objects.get().pk]))
+
+    def test_course_content_is_limited_to_course_members(self):
+        teacher = User.objects.create_user(email='search_t@example.com', username='search_t', password='password', role=User.ROLE_TEACHER)
+        staff = User.objects.create_user(email='search_st@example.com', username='search_st', password='password', role=User.ROLE_STAFF_MEMBER)
+        upload = SimpleUploadedFile('exam.txt', b'Exam answer: the modulus is prime.')
+        with self.captureOnCommitCallbacks(execute=True):
+            course = Course.objects.create(code='FTS501', title='Cryptography', instructor=teacher)
+            CourseMaterial.objects.create(course=course, title='Exam key', file=upload)
+            Assignment.objects.create(course=course, title='Modulus exercise', due_date=timezone.now())
+
+        def titles(username):
+            self.client.login(username=username, password='password')
+            response = self.client.get(reverse('search:search'), {'q': 'modulus'})
+            return sorted(hit.document.title for hit in response.context['hits'])
+
+        self.assertEqual(titles('searcher'), []) # 没有选课的学生看不到资料内容
+        self.assertEqual(titles('search_t'), ['Exam key', 'Modulus exercise'])
+        self.assertEqual(titles('search_st'), ['Exam key', 'Modulus exercise'])
+        Enrollment.objects.create(course=course, student=self.user)
+        self.assertEqual(titles('searcher'), ['Exam key', 'Modulus exercise'])
+        self.assertEqual(self._titles('cryptography', course_ids=[]), ['Cryptography']) # 课程本身对所有人可见
+
+    def test_rebuild_command_indexes_existing_rows(self):
+        Course.objects.create(code='FTS401', title='Astronomy')
+        Equipment.objects.create(name='Telescope', identifier='EQ-FTS-3')
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self._titles('astronomy'), ['Astronomy'])
+        self.assertEqual(self._titles('telescope'), ['Telescope'])
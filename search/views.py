@@ -0,0 +1,37 @@
+# search/views.py
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import Q
+from django.views.generic import TemplateView
+from courses.models import Course
+from .backends import search
+from .models import SearchDocument
+
+MAX_RESULTS = 50
+
+
+def visible_course_ids(user):
+    """用户能看到作业和课程资料的课程 (任课或已选)；职员和管理员不受限制，返回 None。"""
+    if user.is_staff_member_role or user.is_admin:
+        return None
+    return Course.objects.filter(Q(instructor=user) | Q(enrollments__student=user)).values_list('pk', flat=True).distinct()
+
+
+class SearchView(LoginRequiredMixin, TemplateView):
+    """
+    全站搜索：课程、作业、课程资料 (含文件内容) 和设备，按相关度排序。
+    作业和课程资料 (摘要中有文件内容) 只对课程教师、选课学生、职员和管理员显示。
+    """
+    template_name = 'search/search_results.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        kind = self.request.GET.get('kind', '')
+        kinds = [kind] if kind in dict(SearchDocument.KIND_CHOICES) else None
+        context.update({
+            'query': query,
+            'kind': kind if kinds else '',
+            'kind_choices': SearchDocument.KIND_CHOICES,
+            'hits': search(query, kinds=kinds, limit=MAX_RESULTS, course_ids=visible_course_ids(self.request.user)) if query else [],
+        })
+        return context
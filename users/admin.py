@@ -43,17 +43,10 @@ class UserAdmin(BaseUserAdmin):
 
 @admin.register(Department) # 注册 Department 模型
 class DepartmentAdmin(admin.ModelAdmin):
-    list_display = ('name', 'head', 'get_employee_count') # 列表页显示的字段
+    list_display = ('name', 'head', 'employee_count') # 列表页显示的字段 (员工数为冗余存储字段)
     search_fields = ('name', 'head__username') # 可搜索的字段
     autocomplete_fields = ['head'] # 为 'head' 字段启用自动完成搜索框，方便选择用户
-    def get_employee_count(self, obj):
-        # 自定义方法，用于在列表页显示部门员工数量
-        if hasattr(obj, 'employees'): # 更安全的检查
-            return obj.employees.count()
-        elif hasattr(obj, 'employeeprofile_set'):
-            return obj.employeeprofile_set.count()
-        return 0
-    get_employee_count.short_description = _('Number of Employees') # 列的显示名称
+    list_select_related = ('head',)
 
 @admin.register(StudentProfile) # 注册 StudentProfile 模型
 class StudentProfileAdmin(admin.ModelAdmin):
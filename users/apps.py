@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        # 注册学生/员工资料变动时维护班级人数、部门人数的信号
+        from . import signals  # noqa: F401
+        # 注册参考数据缓存 (筛选表单下拉选项) 的失效信号
+        from . import reference_data  # noqa: F401
@@ -1,50 +1,215 @@
 # users/management/commands/import_users.py
 
 import csv
+import datetime
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand, CommandError
-from users.models import User  # 确保从你的 users app 导入 User 模型
+from django.db import transaction
+from django.utils import timezone
+from campushive.counters import adjust_count
+from users.models import User, Department, StudentProfile, EmployeeProfile  # 确保从你的 users app 导入模型
+
+# 需要创建 EmployeeProfile 的角色
+EMPLOYEE_ROLES = (User.ROLE_TEACHER, User.ROLE_STAFF_MEMBER, User.ROLE_ADMIN)
+# 一块中的新用户少于这个数时在本进程中哈希：启动进程池 (每个子进程还要 django.setup) 比哈希几百个密码还慢
+POOL_MIN_ROWS = 200
+
+
+def _init_hash_worker():
+    # spawn 模式下子进程不会继承已初始化的 Django，需要重新 setup 才能读取 PASSWORD_HASHERS
+    django.setup()
+
+
+def _chunks(iterable, size):
+    """把可迭代对象按 size 切成列表块，避免一次性把整个 CSV 读入内存。"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 
 class Command(BaseCommand):
-    help = 'Imports users from a specified CSV file.'
+    help = 'Imports users (and their student/employee profiles) from a specified CSV file in batches.'
 
     def add_arguments(self, parser):
         # 定义一个命令行参数，用于接收 CSV 文件的路径
         parser.add_argument('csv_file_path', type=str, help='The full path to the CSV file to import.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows written per bulk_create / transaction (default: 1000).')
+        parser.add_argument('--workers', type=int, default=None,
+                            help=f'Processes used to hash passwords (default: CPU count, 1 disables the process pool). '
+                                 f'Batches with fewer than {POOL_MIN_ROWS} new users are always hashed in-process.')
 
     def handle(self, *args, **options):
         file_path = options['csv_file_path']
+        batch_size = options['batch_size']
+        workers = options['workers'] or os.cpu_count() or 1
+        self.verbosity = options['verbosity']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be a positive integer.')
+
+        started = time.perf_counter()
+        # 每张表只查询一次，之后在内存中判重，代替逐行 get_or_create
+        self.existing_usernames = set(User.objects.values_list('username', flat=True))
+        self.existing_student_ids = set(StudentProfile.objects.values_list('student_id_number', flat=True))
+        self.existing_employee_ids = set(EmployeeProfile.objects.values_list('employee_id_number', flat=True))
+        self.department_ids = dict(Department.objects.values_list('name', 'id'))
+
+        rows_read = users_created_count = profiles_created_count = skipped_count = 0
+        # PBKDF2 哈希是 CPU 密集型操作，大批量时放到进程池里并行计算 (第一次需要时才启动)
+        executor = None
 
         try:
             with open(file_path, mode='r', encoding='utf-8') as csvfile:
                 reader = csv.DictReader(csvfile)
-                
-                users_created_count = 0
-                for row in reader:
-                    # 使用 get_or_create 避免重复创建用户
-                    # 它会尝试获取一个用户，如果不存在，则创建它
-                    user, created = User.objects.get_or_create(
-                        username=row['username'],
-                        defaults={
-                            'email': row['email'],
-                            'first_name': row['first_name'],
-                            'last_name': row['last_name'],
-                            'role': row['role'],
-                            # 注意：我们使用 set_password 来正确地哈希密码
-                            # 'password': row['password'] 这样做是错误的！
-                        }
-                    )
-                    
-                    if created:
-                        user.set_password(row['password']) # 对新创建的用户设置密码
-                        user.save()
-                        users_created_count += 1
-                        self.stdout.write(self.style.SUCCESS(f'Successfully created user: {user.username}'))
+
+                for chunk in _chunks(reader, batch_size):
+                    rows_read += len(chunk)
+                    new_rows = self._filter_new_rows(chunk)
+                    skipped_count += len(chunk) - len(new_rows)
+                    if not new_rows:
+                        continue
+
+                    passwords = [row.get('password') or None for row in new_rows]
+                    if workers > 1 and len(passwords) >= POOL_MIN_ROWS:
+                        if executor is None:
+                            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_hash_worker)
+                        chunksize = max(1, len(passwords) // (workers * 4))
+                        hashed_passwords = list(executor.map(make_password, passwords, chunksize=chunksize))
                     else:
-                        self.stdout.write(self.style.WARNING(f'User {user.username} already exists. Skipping.'))
+                        hashed_passwords = [make_password(password) for password in passwords]
+
+                    users_created, profiles_created = self._write_chunk(new_rows, hashed_passwords)
+                    users_created_count += users_created
+                    profiles_created_count += profiles_created
+                    self.stdout.write(f'Processed {rows_read} rows ({users_created_count} users created so far)...')
 
         except FileNotFoundError:
             raise CommandError(f'File not found at: {file_path}')
+        except KeyError as e:
+            raise CommandError(f'Missing required CSV column: {e}')
         except Exception as e:
             raise CommandError(f'An error occurred: {e}')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        elapsed = time.perf_counter() - started
+        rate = rows_read / elapsed if elapsed > 0 else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished importing. Total new users created: {users_created_count}, '
+            f'profiles created: {profiles_created_count}, skipped: {skipped_count} '
+            f'({rows_read} rows in {elapsed:.2f}s, {rate:.1f} rows/sec)'
+        ))
+
+    def _filter_new_rows(self, chunk):
+        """去掉已存在 (或在本文件中重复) 的用户名。"""
+        new_rows = []
+        for row in chunk:
+            username = (row['username'] or '').strip()
+            if not username:
+                self.stdout.write(self.style.ERROR('Row without username. Skipping.'))
+                continue
+            if username in self.existing_usernames:
+                if self.verbosity >= 2:
+                    self.stdout.write(self.style.WARNING(f'User {username} already exists. Skipping.'))
+                continue
+            self.existing_usernames.add(username)
+            row['username'] = username
+            new_rows.append(row)
+        return new_rows
+
+    def _write_chunk(self, rows, hashed_passwords):
+        """在一个事务中批量写入一块用户及其 Profile，返回 (用户数, Profile 数)。"""
+        users = []
+        for row, password in zip(rows, hashed_passwords):
+            user = User(
+                username=row['username'],
+                email=row.get('email', ''),
+                first_name=row.get('first_name', ''),
+                last_name=row.get('last_name', ''),
+                role=row.get('role') or User.ROLE_STUDENT,
+                password=password,
+            )
+            user.sync_role_flags() # bulk_create 不会调用 save()
+            users.append(user)
+
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            if any(user.pk is None for user in users):
+                # 不支持 RETURNING 的数据库 (例如 MySQL) 不会回填主键，按用户名补查一次
+                user_ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id'))
+                for user in users:
+                    user.pk = user_ids[user.username]
+
+            self._ensure_departments(rows)
+            student_profiles, employee_profiles = self._build_profiles(rows, users)
+            StudentProfile.objects.bulk_create(student_profiles)
+            EmployeeProfile.objects.bulk_create(employee_profiles)
+            # bulk_create 不触发信号，按部门汇总后每个部门一条 UPDATE 维护员工数
+            for department_id, count in Counter(p.department_id for p in employee_profiles).items():
+                adjust_count(Department, department_id, 'employee_count', count)
 
-        self.stdout.write(self.style.SUCCESS(f'Finished importing. Total new users created: {users_created_count}'))
\ No newline at end of file
+        return len(users), len(student_profiles) + len(employee_profiles)
+
+    def _ensure_departments(self, rows):
+        """批量创建 CSV 中出现但数据库中还没有的部门。"""
+        missing = {
+            (row.get('department_name') or '').strip() for row in rows
+        } - set(self.department_ids) - {''}
+        if not missing:
+            return
+        Department.objects.bulk_create([Department(name=name) for name in missing], ignore_conflicts=True)
+        self.department_ids.update(Department.objects.filter(name__in=missing).values_list('name', 'id'))
+        for name in sorted(missing):
+            self.stdout.write(self.style.NOTICE(f'Created new Department: {name}'))
+
+    def _build_profiles(self, rows, users):
+        student_profiles = []
+        employee_profiles = []
+        today = timezone.now().date()
+        for row, user in zip(rows, users):
+            student_id = (row.get('student_id_number') or '').strip()
+            employee_id = (row.get('employee_id_number') or '').strip()
+
+            if user.role == User.ROLE_STUDENT and student_id:
+                if student_id in self.existing_student_ids:
+                    self.stdout.write(self.style.WARNING(f'Student ID {student_id} already in use. No profile for {user.username}.'))
+                    continue
+                self.existing_student_ids.add(student_id)
+                student_profiles.append(StudentProfile(
+                    user_id=user.pk,
+                    student_id_number=student_id,
+                    enrollment_date=self._parse_date(row.get('enrollment_date'), user.username) or today,
+                ))
+            elif user.role in EMPLOYEE_ROLES and employee_id:
+                if employee_id in self.existing_employee_ids:
+                    self.stdout.write(self.style.WARNING(f'Employee ID {employee_id} already in use. No profile for {user.username}.'))
+                    continue
+                self.existing_employee_ids.add(employee_id)
+                department_name = (row.get('department_name') or '').strip()
+                employee_profiles.append(EmployeeProfile(
+                    user_id=user.pk,
+                    employee_id_number=employee_id,
+                    department_id=self.department_ids.get(department_name),
+                ))
+        return student_profiles, employee_profiles
+
+    def _parse_date(self, value, username):
+        if not value:
+            return None
+        try:
+            return datetime.date.fromisoformat(value.strip())
+        except ValueError:
+            self.stdout.write(self.style.ERROR(f'Invalid enrollment_date for {username}: {value}. Using today.'))
+            return None
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_employee_count(apps, schema_editor):
+    Department = apps.get_model('users', 'Department')
+    EmployeeProfile = apps.get_model('users', 'EmployeeProfile')
+    counts = EmployeeProfile.objects.filter(department=OuterRef('pk')).order_by().values('department').annotate(n=Count('pk')).values('n')
+    Department.objects.update(employee_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_studentprofile_assigned_class'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='employee_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Number of Employees'),
+        ),
+        migrations.RunPython(backfill_employee_count, migrations.RunPython.noop),
+    ]
@@ -63,8 +63,9 @@ class User(AbstractUser):
 
     objects = UserManager()
 
-    def save(self, *args, **kwargs):
-        # 根据 role 设置 AbstractUser 的 is_staff 字段
+    def sync_role_flags(self):
+        """根据 role 设置 AbstractUser 的 is_staff / is_superuser 字段。
+        bulk_create 不会调用 save()，批量导入时需要手动调用此方法。"""
         # if self.role in [User.ROLE_ADMIN, User.ROLE_STAFF_MEMBER, User.ROLE_TEACHER]: # 假设 Admin, Staff, Teacher 可以访问 admin
         #     self.is_staff = True
         # else: # 例如 Student
@@ -79,6 +80,9 @@ class User(AbstractUser):
         else: # Student
             self.is_staff = False
             self.is_superuser = False
+
+    def save(self, *args, **kwargs):
+        self.sync_role_flags()
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -113,6 +117,8 @@ class Department(models.Model):
         related_name='headed_department',
         verbose_name=_('Department Head') # 部门主管
     )
+    # 冗余存储的部门员工数，由 users.signals 在 EmployeeProfile 变动时增量维护
+    employee_count = models.PositiveIntegerField(_('Number of Employees'), default=0, editable=False)
 
     def __str__(self):
         return self.name
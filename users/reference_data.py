@@ -0,0 +1,11 @@
+# users/reference_data.py
+"""用户相关的参考数据缓存 (通用的 ReferenceList 等见 campushive.reference_data)。"""
+from campushive.reference_data import ReferenceList
+
+from .models import Department
+
+
+DEPARTMENT_CHOICES = ReferenceList(
+    'departments', Department,
+    lambda: Department.objects.order_by('name').values_list('pk', 'name'),
+)
@@ -0,0 +1,39 @@
+# users/signals.py
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from campushive.counters import adjust_count, move_count
+from courses.models import Class
+from .models import Department, EmployeeProfile, StudentProfile
+
+
+@receiver(pre_save, sender=StudentProfile)
+@receiver(pre_save, sender=EmployeeProfile)
+def remember_previous_group(sender, instance, raw=False, **kwargs):
+    # 修改班级/部门时需要同时调整原来那一方的人数
+    field = 'assigned_class_id' if sender is StudentProfile else 'department_id'
+    instance._previous_group_id = None
+    if not raw and instance.pk is not None:
+        instance._previous_group_id = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=StudentProfile)
+def update_student_count_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        move_count(Class, 'student_count', getattr(instance, '_previous_group_id', None), instance.assigned_class_id)
+
+
+@receiver(post_save, sender=EmployeeProfile)
+def update_employee_count_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        move_count(Department, 'employee_count', getattr(instance, '_previous_group_id', None), instance.department_id)
+
+
+@receiver(post_delete, sender=StudentProfile)
+def update_student_count_on_delete(sender, instance, **kwargs):
+    adjust_count(Class, instance.assigned_class_id, 'student_count', -1)
+
+
+@receiver(post_delete, sender=EmployeeProfile)
+def update_employee_count_on_delete(sender, instance, **kwargs):
+    adjust_count(Department, instance.department_id, 'employee_count', -1)
@@ -4,9 +4,17 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from .models import Department, StudentProfile, EmployeeProfile
+from courses.models import Course, Enrollment
 from .forms import CustomUserCreationForm, CustomLoginForm # Import your forms
 from django.contrib.auth.forms import AuthenticationForm # For comparing CustomLoginForm
 from django.urls import reverse
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from io import StringIO
+from campushive.testing import temp_csv
+from django.core.cache import cache
+from courses.filters import CourseFilter
+from .reference_data import DEPARTMENT_CHOICES
 
 
 User = get_user_model() # 获取当前项目使用的 User 模型
@@ -297,4 +305,131 @@ class UserProfileViewTests(TestCase):
         response = self.client.get(reverse('users:user_profile'))
         self.assertEqual(response.status_code, 302) # Redirects to login
         expected_redirect_url = f"{reverse('users:login')}?next={reverse('users:user_profile')}"
-        self.assertRedirects(response, expected_redirect_url)
\ No newline at end of file
+        self.assertRedirects(response, expected_redirect_url)
+
+class ImportUsersCommandTests(TestCase):
+    """
+    测试 import_users 管理命令 (批量导入)
+    """
+    CSV_HEADER = 'username,password,email,first_name,last_name,role,student_id_number,enrollment_date,employee_id_number,department_name\n'
+
+    def test_import_creates_users_and_profiles(self):
+        path = temp_csv(self, self.CSV_HEADER, [
+            'alice,pw12345,alice@example.com,Alice,Smith,student,s001,2024-09-01,,\n',
+            'bob,pw12345,bob@example.com,Bob,Lee,teacher,,,t001,PYP Math\n',
+            'carol,pw12345,carol@example.com,Carol,Wu,student,s002,,,\n',
+        ])
+        out = StringIO()
+        call_command('import_users', path, '--workers', '1', '--batch-size', '2', stdout=out)
+
+        self.assertEqual(User.objects.count(), 3)
+        alice = User.objects.get(username='alice')
+        self.assertTrue(alice.check_password('pw12345'))
+        self.assertFalse(alice.is_staff)
+        self.assertEqual(alice.student_profile.student_id_number, 's001')
+        self.assertEqual(str(alice.student_profile.enrollment_date), '2024-09-01')
+
+        bob = User.objects.get(username='bob')
+        self.assertTrue(bob.is_staff) # sync_role_flags 在 bulk_create 之前被调用
+        self.assertEqual(bob.employee_profile.employee_id_number, 't001')
+        self.assertEqual(bob.employee_profile.department.name, 'PYP Math')
+        self.assertEqual(bob.employee_profile.department.employee_count, 1) # bulk_create 后单独维护的计数
+
+        # 缺少 enrollment_date 时使用今天
+        self.assertIsNotNone(User.objects.get(username='carol').student_profile.enrollment_date)
+        self.assertIn('rows/sec', out.getvalue())
+
+    def test_import_skips_existing_and_duplicate_usernames(self):
+        User.objects.create_user(email='alice@example.com', username='alice', password='old-password')
+        path = temp_csv(self, self.CSV_HEADER, [
+            'alice,pw12345,alice@example.com,Alice,Smith,student,s001,2024-09-01,,\n',
+            'dave,pw12345,dave@example.com,Dave,Ng,student,s003,2024-09-01,,\n',
+            'dave,pw12345,dave@example.com,Dave,Ng,student,s004,2024-09-01,,\n',
+        ])
+        call_command('import_users', path, stdout=StringIO()) # 默认：行数少，不启动进程池
+
+        self.assertEqual(User.objects.filter(username='dave').count(), 1)
+        self.assertTrue(User.objects.get(username='alice').check_password('old-password'))
+        self.assertFalse(StudentProfile.objects.filter(student_id_number='s001').exists())
+
+    def test_import_missing_file_raises_command_error(self):
+        with self.assertRaises(CommandError):
+            call_command('import_users', '/nonexistent/users.csv', '--workers', '1', stdout=StringIO())
+
+
+
+class StudentScheduleViewTests(TestCase):
+    """
+    测试学生周课表 (由 ScheduleSlot 生成网格)
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(email='sched@example.com', username='sched_stu', password='password', role=User.ROLE_STUDENT)
+        teacher = User.objects.create_user(email='sched_t@example.com', username='sched_t', password='password', role=User.ROLE_TEACHER)
+        for code, text in (('SCH201', 'Mon 10:00-12:00, Room A101'), ('SCH202', 'Wed 14:00-15:30'), ('SCH203', 'To be announced')):
+            course = Course.objects.create(code=code, title=code, instructor=teacher, schedule_information=text)
+            Enrollment.objects.create(student=cls.student, course=course)
+
+    def test_schedule_grid(self):
+        self.client.login(username='sched_stu', password='password')
+        response = self.client.get(reverse('users:student_schedule'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['weekdays'], ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'])
+        rows = response.context['schedule_rows']
+        self.assertEqual([hour.hour for hour, _ in rows], list(range(10, 16)))
+        ten_o_clock = rows[0][1]
+        self.assertEqual([slot.course.code for slot in ten_o_clock[0]], ['SCH201'])
+        self.assertContains(response, 'Room A101')
+
+
+class ReferenceDataCacheTests(TestCase):
+    """
+    测试筛选表单下拉选项的缓存、失效以及授课教师的远程搜索
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.departments = [Department.objects.create(name=name) for name in ('Physics', 'Biology')]
+        cls.teachers = [
+            User.objects.create_user(email=f'ref_t{i}@example.com', username=f'ref_t{i}', password='password', role=User.ROLE_TEACHER)
+            for i in range(30)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_course_filter_renders_from_cache_without_loading_teachers(self):
+        str(CourseFilter({}).form) # 第一次加载部门列表
+        with self.assertNumQueries(0):
+            html = str(CourseFilter({}).form)
+        self.assertIn('Biology', html)
+        self.assertNotIn('ref_t5', html) # 教师不再全部渲染进下拉框
+
+        # 选中教师时：校验提交值一次，渲染选中项一次，与教师总数无关
+        with self.assertNumQueries(2):
+            html = str(CourseFilter({'instructor': self.teachers[5].pk}).form)
+        self.assertIn('ref_t5', html)
+
+    def test_cache_is_invalidated_when_departments_change(self):
+        self.assertEqual([label for _, label in DEPARTMENT_CHOICES.choices()], ['Biology', 'Physics'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Department.objects.create(name='Chemistry')
+        self.assertEqual([label for _, label in DEPARTMENT_CHOICES.choices()], ['Biology', 'Chemistry', 'Physics'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.departments[0].delete()
+        self.assertEqual([label for _, label in DEPARTMENT_CHOICES.choices()], ['Biology', 'Chemistry'])
+
+    def test_filter_still_validates_submitted_values(self):
+        course = Course.objects.create(code='REF101', title='Optics', department=self.departments[0], instructor=self.teachers[1])
+        Course.objects.create(code='REF102', title='Botany', department=self.departments[1])
+        filterset = CourseFilter({'department': self.departments[0].pk, 'instructor': self.teachers[1].pk}, queryset=Course.objects.all())
+        self.assertEqual(list(filterset.qs), [course])
+        self.assertFalse(CourseFilter({'department': 999999}, queryset=Course.objects.all()).is_valid())
+
+    def test_teacher_lookup_returns_matching_teachers(self):
+        User.objects.create_user(email='ref_s@example.com', username='ref_student', password='password', role=User.ROLE_STUDENT)
+        self.client.login(username='ref_t0', password='password')
+        response = self.client.get(reverse('users:teacher_lookup'), {'q': 'ref_t1'})
+        texts = [item['text'] for item in response.json()['results']]
+        self.assertEqual(texts, ['ref_t1'] + [f'ref_t1{i}' for i in range(10)])
+        response = self.client.get(reverse('users:teacher_lookup'), {'q': 'ref_s'})
+        self.assertEqual(response.json()['results'], [])
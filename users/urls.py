@@ -2,7 +2,8 @@
 from django.urls import path
 from .views import SignUpView
 from .views import StudentDashboardView
-from .views import StudentScheduleView, UserProfileView
+from .views import StudentScheduleView, StudentTranscriptView, UserProfileView
+from .views import TeacherLookupView
 from django.contrib.auth import views as auth_views
 from .forms import CustomLoginForm # 导入自定义登录表单
 
@@ -16,6 +17,8 @@ urlpatterns = [
         authentication_form=CustomLoginForm      # 指定使用自定义表单
     ), name='login'),
     path('my-schedule/', StudentScheduleView.as_view(), name='student_schedule'),
+    path('my-transcript/', StudentTranscriptView.as_view(), name='student_transcript'),
     path('profile/', UserProfileView.as_view(), name='user_profile'),
+    path('teachers/lookup/', TeacherLookupView.as_view(), name='teacher_lookup'),
 ]
 
@@ -1,4 +1,5 @@
 # users/views.py
+from datetime import time
 from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
 from django.views.generic.edit import CreateView
@@ -7,10 +8,14 @@ from django.views.generic import TemplateView
 from django.contrib.auth.views import LoginView, LogoutView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth import login # To log in the user immediately after registration
+from django.db.models import Q
+from django.http import JsonResponse
+from django.views import View
 # from .forms import SignUpForm, UserProfileForm
 from .forms import CustomUserCreationForm
-from .models import User, Department
-from courses.models import Enrollment
+from .models import User, Department, StudentProfile
+from courses.models import Enrollment, ScheduleSlot
+from courses.services import cohort_gpas, student_transcript
 from .mixins import StudentRequiredMixin, TeacherRequiredMixin
 
 
@@ -45,9 +50,53 @@ class StudentScheduleView(LoginRequiredMixin, StudentRequiredMixin, ListView): #
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['page_title'] = "My Schedule"
-        # 你可能还需要传递额外的数据来帮助渲染课表，比如一周的天数、时间段等
+        # 课表网格：一次查询取出该学生所有已选课程的上课时间段 (走 enrollment 唯一索引 + slot 的 course 索引)
+        slots = list(
+            ScheduleSlot.objects.filter(course__enrollments__student=self.request.user)
+            .select_related('course', 'venue')
+            .order_by('weekday', 'start_time')
+        )
+        context['weekdays'], context['schedule_rows'] = build_week_grid(slots)
+        context['scheduled_course_ids'] = {slot.course_id for slot in slots}
         return context
 
+
+class StudentTranscriptView(LoginRequiredMixin, StudentRequiredMixin, TemplateView):
+    template_name = 'users/student_transcript.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['page_title'] = "My Transcript"
+        context['enrollments'], context['summary'] = student_transcript(self.request.user)
+        # 所在班级的平均 GPA (由各学生的汇总值直接求和，不重新遍历选课记录)
+        profile = StudentProfile.objects.filter(user=self.request.user).select_related('assigned_class').first()
+        if profile and profile.assigned_class:
+            context['cohort'] = profile.assigned_class
+            context['cohort_summary'] = cohort_gpas([profile.assigned_class_id]).get(profile.assigned_class_id)
+        return context
+
+
+def build_week_grid(slots):
+    """
+    把时间段排成按小时分行、按星期分列的网格，返回 (表头, 行)。
+    每行为 (整点时间, [该星期在这一小时内进行的时间段列表, ...])；没有周末课程时不显示周六、周日。
+    """
+    if not slots:
+        return [], []
+    days = list(range(7)) if any(slot.weekday >= 5 for slot in slots) else list(range(5))
+    first_hour = min(slot.start_time.hour for slot in slots)
+    last_hour = max(slot.end_time.hour + (1 if slot.end_time.minute else 0) for slot in slots)
+    rows = []
+    for hour in range(first_hour, last_hour):
+        row_start, row_end = time(hour), time(hour + 1) if hour < 23 else time.max
+        cells = [
+            [slot for slot in slots if slot.weekday == day and slot.start_time < row_end and slot.end_time > row_start]
+            for day in days
+        ]
+        rows.append((row_start, cells))
+    labels = dict(ScheduleSlot.WEEKDAY_CHOICES)
+    return [labels[day] for day in days], rows
+
 class UserProfileView(LoginRequiredMixin, DetailView):
     model = User  # 我们要显示 User 模型的信息
     template_name = 'users/user_profile.html'  # 指定模板文件
@@ -57,4 +106,18 @@ class UserProfileView(LoginRequiredMixin, DetailView):
         这个方法返回视图将要显示的对象。
         在这里，我们希望显示当前登录用户的个人资料。
         """
-        return self.request.user
\ No newline at end of file
+        return self.request.user
+
+
+class TeacherLookupView(LoginRequiredMixin, View):
+    """授课教师筛选框的远程搜索接口：按用户名或姓名前缀返回最多 20 位教师 (JSON)。"""
+    limit = 20
+
+    def get(self, request):
+        q = request.GET.get('q', '').strip()
+        if not q:
+            return JsonResponse({'results': []})
+        teachers = User.objects.filter(role=User.ROLE_TEACHER).filter(
+            Q(username__istartswith=q) | Q(first_name__istartswith=q) | Q(last_name__istartswith=q)
+        ).order_by('username')[:self.limit]
+        return JsonResponse({'results': [{'id': teacher.pk, 'text': str(teacher)} for teacher in teachers]})
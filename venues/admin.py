@@ -4,8 +4,9 @@ from .models import Venue, VenueBooking
 
 @admin.register(Venue)
 class VenueAdmin(admin.ModelAdmin):
-    list_display = ('name',) # 场所列表页显示名称
-    search_fields = ('name',) # 允许按名称搜索
+    list_display = ('name', 'capacity', 'location', 'has_projector', 'has_whiteboard') # 场所列表页显示字段
+    list_filter = ('has_projector', 'has_whiteboard') # 允许按设备属性筛选
+    search_fields = ('name', 'location') # 允许按名称/位置搜索
     # list_display = ('venue', 'booking_period_display', 'booked_by_name', 'created_at') # 使用新属性
     # # ...
     # fieldsets = (
@@ -25,7 +26,7 @@ class VenueBookingAdmin(admin.ModelAdmin):
     fieldsets = (
         (None, {
             # 'fields': ('venue', 'booking_period', 'booked_by_name')
-            'fields': ('venue', ('start_time', 'end_time'), 'booked_by_name')
+            'fields': ('venue', ('start_time', 'end_time'), 'recurrence_rule', 'booked_by_name')
         }),
         ('Additional Information', {
             'fields': ('notes',),
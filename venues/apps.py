@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class VenuesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'venues'
+
+    def ready(self):
+        # 注册 VenueBooking 保存/删除时维护忙闲位图的信号
+        from . import signals  # noqa: F401
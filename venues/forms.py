@@ -0,0 +1,25 @@
+# venues/forms.py
+from datetime import timedelta
+from django import forms
+
+
+class VenueAvailabilityForm(forms.Form):
+    # 查询参数均来自 GET，例如 ?start=2025-09-01T10:00&end=2025-09-01T12:00&min_capacity=100&projector=true
+    MAX_WINDOW = timedelta(days=31) # 限制查询窗口，避免一次读取过多天的位图
+
+    start = forms.DateTimeField(label="Start time")
+    end = forms.DateTimeField(label="End time")
+    min_capacity = forms.IntegerField(label="Minimum capacity", min_value=1, required=False)
+    projector = forms.NullBooleanField(label="Has projector", required=False)
+    whiteboard = forms.NullBooleanField(label="Has whiteboard", required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get('start')
+        end = cleaned_data.get('end')
+        if start and end:
+            if start >= end:
+                raise forms.ValidationError("End time must be later than start time.")
+            if end - start > self.MAX_WINDOW:
+                raise forms.ValidationError(f"The search window cannot exceed {self.MAX_WINDOW.days} days.")
+        return cleaned_data
@@ -0,0 +1,92 @@
+# venues/management/commands/import_venue_bookings.py
+
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from venues.models import Venue, VenueBooking
+from venues.services import booking_dates, find_booking_conflicts, refresh_occupancy
+
+
+class Command(BaseCommand):
+    help = ('Validates and imports a batch of venue bookings from a CSV file '
+            '(columns: venue,start_time,end_time,booked_by_name,notes and optional recurrence_rule).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file_path', type=str, help='The full path to the CSV file to import.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report conflicts, do not create any booking.')
+        parser.add_argument('--skip-conflicts', action='store_true',
+                            help='Create the non-conflicting bookings instead of aborting the whole batch.')
+
+    def handle(self, *args, **options):
+        file_path = options['csv_file_path']
+
+        try:
+            with open(file_path, mode='r', encoding='utf-8') as csvfile:
+                rows = list(csv.DictReader(csvfile))
+        except FileNotFoundError:
+            raise CommandError(f'File not found at: {file_path}')
+
+        bookings = self._build_bookings(rows)
+        # 整批只查询一次已有预订
+        conflicts = find_booking_conflicts(bookings)
+        for conflict in conflicts:
+            self.stdout.write(self.style.WARNING(
+                f'Conflict: {conflict.booking} overlaps {conflict.conflicts_with}'
+            ))
+
+        if conflicts and not options['skip_conflicts'] and not options['dry_run']:
+            raise CommandError(f'{len(conflicts)} conflict(s) found. Nothing imported (use --skip-conflicts to import the rest).')
+
+        conflicting = {id(conflict.booking) for conflict in conflicts}
+        to_create = [booking for booking in bookings if id(booking) not in conflicting]
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Dry run: {len(to_create)} booking(s) can be created, {len(conflicting)} conflict.'))
+            return
+
+        with transaction.atomic():
+            # find_booking_conflicts 已经为每条预订计算过 series_end_time
+            VenueBooking.objects.bulk_create(to_create)
+            # bulk_create 不会触发 post_save，按场所汇总后统一刷新忙闲位图
+            dates_by_venue = {}
+            for booking in to_create:
+                dates_by_venue.setdefault(booking.venue_id, set()).update(booking_dates(booking))
+            for venue_id, dates in dates_by_venue.items():
+                refresh_occupancy(venue_id, dates)
+        self.stdout.write(self.style.SUCCESS(f'Finished importing. Total new bookings created: {len(to_create)}'))
+
+    def _build_bookings(self, rows):
+        venues = Venue.objects.in_bulk({(row.get('venue') or '').strip() for row in rows}, field_name='name')
+        bookings = []
+        for line_number, row in enumerate(rows, start=2): # 第 1 行是表头
+            venue = venues.get((row.get('venue') or '').strip())
+            if venue is None:
+                raise CommandError(f'Line {line_number}: unknown venue "{row.get("venue")}".')
+            start_time = self._parse_datetime(row.get('start_time'), line_number)
+            end_time = self._parse_datetime(row.get('end_time'), line_number)
+            if start_time >= end_time:
+                raise CommandError(f'Line {line_number}: end time must be later than start time.')
+            booking = VenueBooking(
+                venue=venue,
+                start_time=start_time,
+                end_time=end_time,
+                recurrence_rule=(row.get('recurrence_rule') or '').strip(),
+                booked_by_name=(row.get('booked_by_name') or '').strip(),
+                notes=row.get('notes') or None,
+            )
+            try:
+                booking.sync_series_end() # 同时检查 RRULE 格式和发生次数上限
+            except ValueError as e:
+                raise CommandError(f'Line {line_number}: {e}')
+            bookings.append(booking)
+        return bookings
+
+    def _parse_datetime(self, value, line_number):
+        parsed = parse_datetime((value or '').strip())
+        if parsed is None:
+            raise CommandError(f'Line {line_number}: invalid datetime "{value}" (expected e.g. 2025-09-01 14:00).')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
@@ -1,43 +1,53 @@
 # venues/management/commands/import_venues.py
 
 import csv
+from itertools import islice
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from venues.models import Venue  # 从 venues app 导入 Venue 模型
 
+# 以 name 为键 upsert 时会被 CSV 覆盖的字段
+UPDATE_FIELDS = ['capacity', 'location', 'has_projector', 'has_whiteboard']
+
+
+def parse_bool(value):
+    # 对于布尔值，需要将 CSV 中的字符串 'True'/'False' 转换为 Python 的布尔值
+    return (value or '').strip().lower() in ('true', '1', 'yes', 'y')
+
+
 class Command(BaseCommand):
-    help = 'Imports venues from a specified CSV file.'
+    help = 'Imports venues (with capacity/location/equipment attributes) from a specified CSV file.'
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file_path', type=str, help='The full path to the CSV file to import.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of venues upserted per query (default: 500).')
 
     def handle(self, *args, **options):
         file_path = options['csv_file_path']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be a positive integer.')
 
+        venues_processed_count = 0
         try:
             with open(file_path, mode='r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                
-                venues_created_count = 0
-                for row in reader:
-                    # 对于布尔值，需要将 CSV 中的字符串 'True'/'False' 转换为 Python 的布尔值
-                    has_projector_bool = row['has_projector'].lower() == 'true'
-                    has_whiteboard_bool = row['has_whiteboard'].lower() == 'true'
-
-                    venue, created = Venue.objects.get_or_create(
-                        name=row['name'],
-                        defaults={
-                            'capacity': int(row['capacity']), # 容量通常是整数，需要转换
-                            'location': row['location'],
-                            'has_projector': has_projector_bool,
-                            'has_whiteboard': has_whiteboard_bool,
-                        }
-                    )
-                    
-                    if created:
-                        venues_created_count += 1
-                        self.stdout.write(self.style.SUCCESS(f'Successfully created venue: {venue.name}'))
-                    else:
-                        self.stdout.write(self.style.WARNING(f'Venue "{venue.name}" already exists. Skipping.'))
+                venues = self._iter_venues(csv.DictReader(csvfile))
+                while True:
+                    batch = list(islice(venues, batch_size))
+                    if not batch:
+                        break
+                    # 同一批中重复的 name 以最后一行为准 (ON CONFLICT 不能在一条语句里更新同一行两次)
+                    batch = list({venue.name: venue for venue in batch}.values())
+                    with transaction.atomic():
+                        # INSERT ... ON CONFLICT (name) DO UPDATE，一批只需一条语句
+                        Venue.objects.bulk_create(
+                            batch,
+                            update_conflicts=True,
+                            unique_fields=['name'],
+                            update_fields=UPDATE_FIELDS,
+                        )
+                    venues_processed_count += len(batch)
 
         except FileNotFoundError:
             raise CommandError(f'File not found at: {file_path}')
@@ -46,4 +56,18 @@ class Command(BaseCommand):
         except Exception as e:
             raise CommandError(f'An error occurred: {e}')
 
-        self.stdout.write(self.style.SUCCESS(f'Finished importing. Total new venues created: {venues_created_count}'))
+        self.stdout.write(self.style.SUCCESS(f'Finished importing. Total venues created or updated: {venues_processed_count}'))
+
+    def _iter_venues(self, reader):
+        for row in reader:
+            name = (row.get('name') or '').strip()
+            if not name:
+                self.stdout.write(self.style.ERROR('Row without venue name. Skipping.'))
+                continue
+            yield Venue(
+                name=name,
+                capacity=int(row.get('capacity') or 0), # 容量通常是整数，需要转换
+                location=(row.get('location') or '').strip(),
+                has_projector=parse_bool(row.get('has_projector')),
+                has_whiteboard=parse_bool(row.get('has_whiteboard')),
+            )
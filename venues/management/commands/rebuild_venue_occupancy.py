@@ -0,0 +1,33 @@
+# venues/management/commands/rebuild_venue_occupancy.py
+
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from venues.models import VenueBooking, VenueOccupancy
+from venues.services import day_masks, encode_bitmap
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the per-venue, per-day free/busy bitmaps from all one-off venue bookings '
+            '(recurring bookings are expanded at query time).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Number of bitmap rows inserted per query (default: 2000).')
+
+    def handle(self, *args, **options):
+        bitmaps = defaultdict(int)
+        bookings = VenueBooking.objects.filter(recurrence_rule='').values_list('venue_id', 'start_time', 'end_time')
+        for venue_id, start_time, end_time in bookings.iterator(chunk_size=5000):
+            for day, mask in day_masks(start_time, end_time):
+                bitmaps[venue_id, day] |= mask
+
+        with transaction.atomic():
+            VenueOccupancy.objects.all().delete()
+            VenueOccupancy.objects.bulk_create(
+                (VenueOccupancy(venue_id=venue_id, date=day, bitmap=encode_bitmap(bitmap))
+                 for (venue_id, day), bitmap in bitmaps.items()),
+                batch_size=options['batch_size'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(bitmaps)} venue occupancy rows.'))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venues', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venue',
+            name='capacity',
+            field=models.PositiveIntegerField(default=0, verbose_name='Capacity'),
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='has_projector',
+            field=models.BooleanField(default=False, verbose_name='Has projector'),
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='has_whiteboard',
+            field=models.BooleanField(default=False, verbose_name='Has whiteboard'),
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='location',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Location'),
+        ),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(fields=['capacity'], name='venue_capacity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(fields=['has_projector', 'capacity'], name='venue_projector_capacity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(fields=['has_whiteboard', 'capacity'], name='venue_whiteboard_capacity_idx'),
+        ),
+    ]
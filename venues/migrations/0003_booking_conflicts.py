@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+# PostgreSQL 上用 GiST 排他约束保证同一场所的预订时间段不重叠 (并发写入也无法绕过)。
+# 需要 btree_gist 扩展才能在同一个 GiST 索引里同时比较 venue_id (=) 和时间范围 (&&)。
+# SQLite 等其他数据库没有等价约束，依靠 VenueBooking.clean() + 复合索引上的重叠查询。
+EXCLUSION_CONSTRAINT_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS btree_gist',
+    'ALTER TABLE venues_venuebooking ADD CONSTRAINT venuebooking_no_overlap '
+    "EXCLUDE USING gist (venue_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&)",
+]
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in EXCLUSION_CONSTRAINT_SQL:
+        schema_editor.execute(statement)
+
+
+def remove_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE venues_venuebooking DROP CONSTRAINT IF EXISTS venuebooking_no_overlap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venues', '0002_venue_attributes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venuebooking',
+            index=models.Index(fields=['venue', 'start_time', 'end_time'], name='booking_venue_period_idx'),
+        ),
+        migrations.RunPython(add_exclusion_constraint, remove_exclusion_constraint),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venues', '0003_booking_conflicts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VenueOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('bitmap', models.BinaryField(max_length=12, verbose_name='Busy slots bitmap')),
+                ('venue', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='venues.venue', verbose_name='Venue')),
+            ],
+            options={
+                'verbose_name': 'Venue occupancy',
+                'verbose_name_plural': 'Venue occupancy',
+                'indexes': [models.Index(fields=['date', 'venue'], name='occupancy_date_venue_idx')],
+                'unique_together': {('venue', 'date')},
+            },
+        ),
+    ]
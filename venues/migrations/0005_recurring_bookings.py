@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:42
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_series_end_time(apps, schema_editor):
+    # 已有预订都是单次预订，系列结束时间就是 end_time
+    VenueBooking = apps.get_model('venues', 'VenueBooking')
+    VenueBooking.objects.filter(series_end_time__isnull=True).update(series_end_time=F('end_time'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('venues', '0004_venueoccupancy'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='venuebooking',
+            name='booking_venue_period_idx',
+        ),
+        migrations.AddField(
+            model_name='venuebooking',
+            name='recurrence_rule',
+            field=models.CharField(blank=True, help_text='Optional, e.g. FREQ=WEEKLY;BYDAY=WE;UNTIL=20251220 (every Wednesday until 2025-12-20). Leave empty for a one-off booking.', max_length=255, verbose_name='Recurrence rule'),
+        ),
+        migrations.AddField(
+            model_name='venuebooking',
+            name='series_end_time',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Series end time'),
+        ),
+        migrations.RunPython(fill_series_end_time, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='venuebooking',
+            index=models.Index(fields=['venue', 'start_time', 'series_end_time'], name='booking_venue_series_idx'),
+        ),
+    ]
@@ -2,21 +2,56 @@
 from django.db import models
 from django.conf import settings # 用于关联 User 模型
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .recurrence import iter_occurrences, parse_rrule
+
+class VenueQuerySet(models.QuerySet):
+    def matching(self, min_capacity=None, has_projector=None, has_whiteboard=None):
+        """按容量/设备属性筛选场所，None 表示不限制该条件。"""
+        queryset = self
+        if min_capacity:
+            queryset = queryset.filter(capacity__gte=min_capacity)
+        if has_projector is not None:
+            queryset = queryset.filter(has_projector=has_projector)
+        if has_whiteboard is not None:
+            queryset = queryset.filter(has_whiteboard=has_whiteboard)
+        return queryset
 
 class Venue(models.Model):
     name = models.CharField(max_length=255, unique=True, verbose_name="Venue name")
+    capacity = models.PositiveIntegerField(default=0, verbose_name="Capacity")
+    location = models.CharField(max_length=255, blank=True, verbose_name="Location")
+    has_projector = models.BooleanField(default=False, verbose_name="Has projector")
+    has_whiteboard = models.BooleanField(default=False, verbose_name="Has whiteboard")
     # 可以根据需要添加其他字段，如：
-    # location_details = models.CharField(max_length=255, blank=True, null=True, verbose_name="位置详情")
-    # capacity = models.PositiveIntegerField(blank=True, null=True, verbose_name="容量")
     # description = models.TextField(blank=True, null=True, verbose_name="描述")
+
+    objects = VenueQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Venue"
         verbose_name_plural = verbose_name
         ordering = ['name']
+        # 常见查询："有投影仪且容量 >= N 的房间"，布尔条件在前、容量范围在后
+        indexes = [
+            models.Index(fields=['capacity'], name='venue_capacity_idx'),
+            models.Index(fields=['has_projector', 'capacity'], name='venue_projector_capacity_idx'),
+            models.Index(fields=['has_whiteboard', 'capacity'], name='venue_whiteboard_capacity_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+class VenueBookingQuerySet(models.QuerySet):
+    def overlapping(self, venue, start_time, end_time):
+        """
+        整个系列 [首次开始, 最后一次结束) 与 [start_time, end_time) 有重叠的预订。按半开区间处理，
+        首尾相接 (10:00-12:00 与 12:00-14:00) 不算冲突。该条件由 (venue, start_time, series_end_time) 复合索引支持。
+        对循环预订这只是候选集合，具体哪几次发生落在窗口内要再用 booking.occurrences() 展开。
+        """
+        return self.filter(venue=venue, start_time__lt=end_time, series_end_time__gt=start_time)
+
 class VenueBooking(models.Model):
     """
     场所预订记录模型
@@ -29,10 +64,20 @@ class VenueBooking(models.Model):
     start_time = models.DateTimeField(verbose_name="Start time")
     end_time = models.DateTimeField(verbose_name="End time")
     booked_by_name = models.CharField(max_length=100, verbose_name="Booking user name")
+    # 循环预订 (例如 "每周三下午")：start_time/end_time 是第一次发生，其余发生按规则在查询时惰性展开
+    recurrence_rule = models.CharField(
+        max_length=255, blank=True, verbose_name="Recurrence rule",
+        help_text="Optional, e.g. FREQ=WEEKLY;BYDAY=WE;UNTIL=20251220 (every Wednesday until 2025-12-20). "
+                  "Leave empty for a one-off booking.",
+    )
+    # 最后一次发生的结束时间 (非循环预订等于 end_time)，用于按时间窗口筛选候选预订
+    series_end_time = models.DateTimeField(null=True, editable=False, verbose_name="Series end time")
     notes = models.TextField(blank=True, null=True, verbose_name="Comment")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Creation time")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Updating time")
 
+    objects = VenueBookingQuerySet.as_manager()
+
     # @property
     def booking_period_display(self): # 用于在 list_display 中显示
         if self.start_time and self.end_time:
@@ -43,9 +88,53 @@ class VenueBooking(models.Model):
     # booking_period_display.short_description = "预订时间段"
     booking_period_display.short_description = "Booking Period"
 
+    def occurrences(self, window_start=None, window_end=None):
+        """惰性产出与 [window_start, window_end) 相交的每次发生 (start, end)；不传窗口则产出整个系列。"""
+        if not self.recurrence_rule:
+            if (window_start is None or self.end_time > window_start) and (window_end is None or self.start_time < window_end):
+                yield self.start_time, self.end_time
+            return
+        yield from iter_occurrences(parse_rrule(self.recurrence_rule), self.start_time, self.end_time, window_start, window_end)
+
+    def sync_series_end(self):
+        """
+        根据规则重新计算 series_end_time。save() 会自动调用；bulk_create 不经过 save()，需要先手动调用。
+        规则超过 MAX_OCCURRENCES 次时抛出 ValueError。
+        """
+        last_end = self.end_time
+        for _, last_end in self.occurrences():
+            pass
+        self.series_end_time = last_end
+
+    def save(self, *args, **kwargs):
+        self.sync_series_end()
+        super().save(*args, **kwargs)
+
     def clean(self): # 添加简单的验证
         if self.start_time and self.end_time and self.start_time >= self.end_time:
             raise ValidationError("End time must be later than start time.")
+        if self.recurrence_rule:
+            try:
+                rule = parse_rrule(self.recurrence_rule)
+            except ValueError as e:
+                raise ValidationError({'recurrence_rule': str(e)})
+            if rule.byday and self.start_time and timezone.localtime(self.start_time).weekday() not in rule.byday:
+                raise ValidationError({'recurrence_rule': "BYDAY must include the weekday of the start time."})
+            if self.start_time and self.end_time:
+                try:
+                    self.sync_series_end() # UNTIL 规则只有展开后才知道次数
+                except ValueError as e:
+                    raise ValidationError({'recurrence_rule': str(e)})
+        if self.venue_id and self.start_time and self.end_time:
+            # 防止同一场所被重复预订 (PostgreSQL 上另有排他约束兜底并发写入)
+            from .services import find_booking_conflicts # services 依赖本模块，延迟导入
+            conflicts = find_booking_conflicts([self])
+            if conflicts:
+                conflict = min(conflicts, key=lambda c: c.start_time)
+                period = f"{timezone.localtime(conflict.start_time):%Y-%m-%d %H:%M} - {timezone.localtime(conflict.end_time):%Y-%m-%d %H:%M}"
+                raise ValidationError(
+                    f"{self.venue} is already booked from {period} by {conflict.conflicts_with.booked_by_name}."
+                )
         super().clean()
     
     # 预订人，可以直接记录姓名，或者关联到系统用户
@@ -68,6 +157,32 @@ class VenueBooking(models.Model):
         verbose_name = "Venue booking record"
         verbose_name_plural = verbose_name
         ordering = ['-created_at', 'venue'] # 通常按创建时间倒序
+        indexes = [
+            # 冲突检测 / 空闲查询都按 venue 过滤后比较时间区间
+            models.Index(fields=['venue', 'start_time', 'series_end_time'], name='booking_venue_series_idx'),
+        ]
     def __str__(self):
         # return f"{self.venue.name} - {self.booking_period} - by {self.booked_by_name}"
         return f"{self.venue.name} - {self.booking_period_display()} - by {self.booked_by_name}"
+
+class VenueOccupancy(models.Model):
+    """
+    场所每天的忙闲位图：一天 96 格 (15 分钟一格)，第 i 位为 1 表示本地时间 [i*15min, (i+1)*15min) 有预订。
+    只包含单次预订，由 venues.signals 在 VenueBooking 保存/删除时增量维护，供空闲场所查询使用；没有行表示当天没有单次预订。
+    循环预订不写入位图，venues.services.free_venues 在查询窗口内展开。
+    """
+    venue = models.ForeignKey(Venue, on_delete=models.CASCADE, related_name='occupancy', verbose_name="Venue")
+    date = models.DateField(verbose_name="Date")
+    bitmap = models.BinaryField(max_length=12, verbose_name="Busy slots bitmap")
+
+    class Meta:
+        verbose_name = "Venue occupancy"
+        verbose_name_plural = verbose_name
+        unique_together = ('venue', 'date')
+        indexes = [
+            # 空闲查询按日期取出所有场所的位图
+            models.Index(fields=['date', 'venue'], name='occupancy_date_venue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.venue} - {self.date}"
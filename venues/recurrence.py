@@ -0,0 +1,125 @@
+# venues/recurrence.py
+"""
+简化版 RFC 5545 RRULE，用于循环预订 (例如 "每周三下午")。
+支持 FREQ=DAILY/WEEKLY、INTERVAL、BYDAY (仅 WEEKLY)、COUNT、UNTIL，
+例如 "FREQ=WEEKLY;BYDAY=WE;UNTIL=20251220" 表示每周三一次，直到 2025-12-20。
+"""
+from collections import namedtuple
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.utils import timezone
+
+WEEKDAY_CODES = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+FREQ_DAILY = 'DAILY'
+FREQ_WEEKLY = 'WEEKLY'
+MAX_OCCURRENCES = 1000 # 一个系列最多的发生次数，超过的规则直接拒绝而不是截断
+
+RecurrenceRule = namedtuple('RecurrenceRule', ['freq', 'interval', 'byday', 'count', 'until'])
+
+
+def parse_rrule(text):
+    """
+    解析 RRULE 字符串，格式不支持或不完整时抛出 ValueError。规则必须用 COUNT 或 UNTIL 限定结束。
+    COUNT 超过 MAX_OCCURRENCES 在这里拒绝；UNTIL 要结合第一次发生才知道次数，由 iter_occurrences 展开到上限时拒绝。
+    """
+    text = text.strip()
+    if text.upper().startswith('RRULE:'):
+        text = text[len('RRULE:'):]
+    parts = {}
+    for item in text.split(';'):
+        if not item.strip():
+            continue
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f'Invalid RRULE part "{item}".')
+        parts[key.strip().upper()] = value.strip().upper()
+
+    freq = parts.pop('FREQ', None)
+    if freq not in (FREQ_DAILY, FREQ_WEEKLY):
+        raise ValueError('FREQ must be DAILY or WEEKLY.')
+    try:
+        interval = int(parts.pop('INTERVAL', '1'))
+        count = int(parts.pop('COUNT')) if 'COUNT' in parts else None
+    except ValueError:
+        raise ValueError('INTERVAL and COUNT must be integers.')
+    if interval < 1 or (count is not None and count < 1):
+        raise ValueError('INTERVAL and COUNT must be positive.')
+    if count is not None and count > MAX_OCCURRENCES:
+        raise ValueError(f'COUNT cannot exceed {MAX_OCCURRENCES}.')
+
+    byday = ()
+    if 'BYDAY' in parts:
+        if freq != FREQ_WEEKLY:
+            raise ValueError('BYDAY is only supported with FREQ=WEEKLY.')
+        codes = [code.strip() for code in parts.pop('BYDAY').split(',')]
+        unknown = [code for code in codes if code not in WEEKDAY_CODES]
+        if unknown:
+            raise ValueError(f'Unknown BYDAY value(s): {", ".join(unknown)}.')
+        byday = tuple(sorted({WEEKDAY_CODES.index(code) for code in codes}))
+
+    until = _parse_until(parts.pop('UNTIL')) if 'UNTIL' in parts else None
+    if parts:
+        raise ValueError(f'Unsupported RRULE part(s): {", ".join(sorted(parts))}.')
+    if count is None and until is None:
+        raise ValueError('The rule must end with COUNT or UNTIL.')
+    if count is not None and until is not None:
+        raise ValueError('COUNT and UNTIL cannot be used together.')
+    return RecurrenceRule(freq, interval, byday, count, until)
+
+
+def _parse_until(value):
+    """UNTIL=20251220 (本地时间当天结束) 或 UNTIL=20251220T120000Z (UTC)，返回 aware datetime。"""
+    try:
+        if 'T' not in value:
+            day = datetime.strptime(value, '%Y%m%d').date()
+            return timezone.make_aware(datetime.combine(day, time.max))
+        if value.endswith('Z'):
+            return datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=dt_timezone.utc)
+        return timezone.make_aware(datetime.strptime(value, '%Y%m%dT%H%M%S'))
+    except ValueError:
+        raise ValueError(f'Invalid UNTIL value "{value}".')
+
+
+def iter_occurrences(rule, first_start, first_end, window_start=None, window_end=None):
+    """
+    惰性产出每次发生的 (start, end)，只产出与 [window_start, window_end) 相交的部分。
+    first_start 即第一次发生 (RFC 5545 的 DTSTART)；按本地墙上时间重复，所以夏令时切换后仍是同一钟点。
+    窗口之前的整周期直接跳过，不会从系列开头逐个展开。
+    系列超过 MAX_OCCURRENCES 次时 (例如 UNTIL 写到了几年以后)，展开到上限处抛出 ValueError，不会悄悄截断。
+    """
+    duration = first_end - first_start
+    local_first = timezone.localtime(first_start).replace(tzinfo=None)
+    if rule.freq == FREQ_DAILY:
+        period = timedelta(days=rule.interval)
+        anchor = local_first
+        offsets = [timedelta(0)]
+    else:
+        period = timedelta(weeks=rule.interval)
+        anchor = local_first - timedelta(days=local_first.weekday()) # 第一次发生所在周的周一 (同一钟点)
+        offsets = [timedelta(days=day) for day in (rule.byday or (local_first.weekday(),))]
+    # 第一个周期中早于 first_start 的日子不算发生，也不计入 COUNT
+    skipped = sum(1 for offset in offsets if anchor + offset < local_first)
+
+    period_index = 0
+    if window_start is not None:
+        behind = timezone.localtime(window_start).replace(tzinfo=None) - duration - anchor
+        period_index = max(0, int(behind / period) - 1)
+
+    while True:
+        period_anchor = anchor + period_index * period
+        for position, offset in enumerate(offsets):
+            index = period_index * len(offsets) + position - skipped # 第几次发生 (从 0 开始)
+            if index < 0:
+                continue
+            if rule.count is not None and index >= rule.count:
+                return
+            start = timezone.make_aware(period_anchor + offset)
+            if rule.until is not None and start > rule.until:
+                return
+            if window_end is not None and start >= window_end:
+                return
+            if index >= MAX_OCCURRENCES:
+                raise ValueError(f'The rule produces more than {MAX_OCCURRENCES} occurrences.')
+            end = start + duration
+            if window_start is None or end > window_start:
+                yield start, end
+        period_index += 1
@@ -0,0 +1,194 @@
+# venues/services.py
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+from functools import reduce
+import math
+import operator
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Venue, VenueBooking, VenueOccupancy
+
+# booking: 待检查的预订；conflicts_with: 与之冲突的已有预订 (或同一批中的另一条待检查预订)；
+# start_time/end_time: conflicts_with 中发生冲突的那一次 (循环预订时不一定是第一次)
+BookingConflict = namedtuple('BookingConflict', ['booking', 'conflicts_with', 'start_time', 'end_time'])
+
+
+def find_booking_conflicts(proposed):
+    """
+    批量检查一组 (未保存的) VenueBooking 与数据库中已有预订以及彼此之间的时间冲突。
+
+    无论 proposed 有多少条，只执行一次查询：每个场所取出系列范围覆盖本批时间范围的已有预订，
+    然后在内存中按开始时间做一次扫描线比较。循环预订只在本批的时间窗口内展开，
+    不会展开整个学期。每对冲突预订只报告一次 (最早冲突的那次发生)。返回 BookingConflict 列表。
+    """
+    by_venue = defaultdict(list)
+    for booking in proposed:
+        booking.sync_series_end()
+        by_venue[booking.venue_id].append(booking)
+    if not by_venue:
+        return []
+
+    # 每个场所一个 (venue, 时间窗口) 条件，用 OR 合并成一条 SQL
+    windows = {
+        venue_id: (min(b.start_time for b in bookings), max(b.series_end_time for b in bookings))
+        for venue_id, bookings in by_venue.items()
+    }
+    conditions = [
+        Q(venue_id=venue_id, start_time__lt=window_end, series_end_time__gt=window_start)
+        for venue_id, (window_start, window_end) in windows.items()
+    ]
+    existing = VenueBooking.objects.filter(reduce(operator.or_, conditions))
+    proposed_pks = [b.pk for b in proposed if b.pk]
+    if proposed_pks: # 修改已有预订时，不与自己的旧版本比较
+        existing = existing.exclude(pk__in=proposed_pks)
+
+    existing_by_venue = defaultdict(list)
+    for booking in existing.select_related('venue'):
+        existing_by_venue[booking.venue_id].append(booking)
+
+    conflicts = []
+    for venue_id, bookings in by_venue.items():
+        conflicts.extend(_sweep(bookings, existing_by_venue[venue_id], *windows[venue_id]))
+    return conflicts
+
+
+def _sweep(proposed, existing, window_start, window_end):
+    """同一场所内的扫描线：把窗口内的每次发生按开始时间排序，只和仍未结束的区间比较。"""
+    events = sorted(
+        [(start, end, True, b) for b in proposed for start, end in b.occurrences(window_start, window_end)]
+        + [(start, end, False, b) for b in existing for start, end in b.occurrences(window_start, window_end)],
+        key=lambda event: event[0],
+    )
+    conflicts = []
+    reported = set()
+    active = []
+    for start, end, is_proposed, booking in events:
+        active = [item for item in active if item[1] > start]
+        for other_start, other_end, other_is_proposed, other in active:
+            if other is booking:
+                continue
+            if is_proposed:
+                conflict = BookingConflict(booking, other, other_start, other_end)
+            elif other_is_proposed:
+                conflict = BookingConflict(other, booking, start, end)
+            else:
+                continue
+            key = (id(conflict.booking), id(conflict.conflicts_with))
+            if key not in reported:
+                reported.add(key)
+                conflicts.append(conflict)
+        active.append((start, end, is_proposed, booking))
+    return conflicts
+
+
+# ---- 忙闲位图 ----
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES # 96
+BITMAP_BYTES = (SLOTS_PER_DAY + 7) // 8 # 12
+
+
+def encode_bitmap(value):
+    return value.to_bytes(BITMAP_BYTES, 'big')
+
+
+def decode_bitmap(raw):
+    return int.from_bytes(raw, 'big') if raw else 0
+
+
+def day_bounds(day):
+    """本地时区中某一天的 [开始, 结束) (aware datetime)。"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
+
+
+def day_masks(start_time, end_time):
+    """
+    把 [start_time, end_time) 拆成按本地日期的 (date, mask)。
+    只要与某个 15 分钟格有交集就置位，所以位图是"保守"的：可能把相邻空档视为忙，但不会漏掉冲突。
+    """
+    if start_time >= end_time:
+        return
+    day = timezone.localtime(start_time).date()
+    last_day = timezone.localtime(end_time - timedelta(microseconds=1)).date()
+    slot = timedelta(minutes=SLOT_MINUTES)
+    while day <= last_day:
+        day_start, day_end = day_bounds(day)
+        first = int((max(start_time, day_start) - day_start) // slot)
+        last = min(SLOTS_PER_DAY, math.ceil((min(end_time, day_end) - day_start) / slot))
+        if last > first:
+            yield day, ((1 << (last - first)) - 1) << first
+        day += timedelta(days=1)
+
+
+def period_dates(start_time, end_time):
+    return {day for day, _ in day_masks(start_time, end_time)}
+
+
+def booking_dates(booking):
+    """
+    一条预订的位图涉及的本地日期。只有单次预订写入位图；循环预订不按日期展开 (一个学期就是上百行)，
+    由 free_venues 在查询窗口内展开，所以返回空集合。
+    """
+    if booking.recurrence_rule:
+        return set()
+    return period_dates(booking.start_time, booking.end_time)
+
+
+def refresh_occupancy(venue_id, dates):
+    """
+    重新计算一个场所在若干天的位图 (只包含单次预订)。无论涉及多少天，都只读取一次这些天内的预订。
+    先锁住场所行，使同一场所的并发刷新串行执行，避免互相覆盖。
+    只保存有预订的日期，全空的日期删除对应行 (场所级联删除时也不会留下孤立行)。
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return
+    range_start = day_bounds(dates[0])[0]
+    range_end = day_bounds(dates[-1])[1]
+    with transaction.atomic():
+        list(Venue.objects.select_for_update().filter(pk=venue_id).values_list('pk', flat=True))
+        bitmaps = dict.fromkeys(dates, 0)
+        bookings = VenueBooking.objects.overlapping(venue_id, range_start, range_end).filter(recurrence_rule='')
+        for start_time, end_time in bookings.values_list('start_time', 'end_time'):
+            for day, mask in day_masks(start_time, end_time):
+                if day in bitmaps:
+                    bitmaps[day] |= mask
+
+        empty_days = [day for day, bitmap in bitmaps.items() if not bitmap]
+        if empty_days:
+            VenueOccupancy.objects.filter(venue_id=venue_id, date__in=empty_days).delete()
+        VenueOccupancy.objects.bulk_create(
+            [VenueOccupancy(venue_id=venue_id, date=day, bitmap=encode_bitmap(bitmap))
+             for day, bitmap in bitmaps.items() if bitmap],
+            update_conflicts=True,
+            unique_fields=['venue', 'date'],
+            update_fields=['bitmap'],
+        )
+
+
+def free_venues(start_time, end_time, venues=None):
+    """
+    返回在 [start_time, end_time) 内空闲的场所 (QuerySet)。
+    单次预订：读取窗口内各天的位图 (每个场所每天一个 96 位整数)，与查询掩码做一次按位与，没有位图行的场所当天视为全空。
+    循环预订：用 (venue, start_time, series_end_time) 索引取出系列范围覆盖窗口的预订，只展开窗口内的发生，
+    按同样的 15 分钟格比较。两条查询，与场所数和学期长度无关。
+    """
+    venues = Venue.objects.all() if venues is None else venues
+    masks = dict(day_masks(start_time, end_time))
+    occupancy = VenueOccupancy.objects.filter(date__in=list(masks), venue__in=venues).values_list('venue_id', 'date', 'bitmap')
+    busy = {venue_id for venue_id, day, raw in occupancy if decode_bitmap(raw) & masks[day]}
+    recurring = VenueBooking.objects.filter(
+        venue__in=venues, start_time__lt=end_time, series_end_time__gt=start_time,
+    ).exclude(recurrence_rule='').exclude(venue_id__in=busy).only('venue_id', 'start_time', 'end_time', 'recurrence_rule')
+    for booking in recurring:
+        if booking.venue_id in busy:
+            continue
+        for occurrence_start, occurrence_end in booking.occurrences(start_time, end_time):
+            if any(mask & masks.get(day, 0) for day, mask in day_masks(occurrence_start, occurrence_end)):
+                busy.add(booking.venue_id)
+                break
+    return venues.exclude(pk__in=busy)
@@ -0,0 +1,31 @@
+# venues/signals.py
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import VenueBooking
+from .services import booking_dates, refresh_occupancy
+
+TRACKED_FIELDS = ('venue_id', 'start_time', 'end_time', 'recurrence_rule')
+
+
+@receiver(pre_save, sender=VenueBooking)
+def remember_previous_period(sender, instance, raw=False, **kwargs):
+    # 修改预订时需要同时刷新旧时间段 (可能换了场所、日期或循环规则) 的位图
+    instance._previous_period = None
+    if instance.pk and not raw:
+        instance._previous_period = VenueBooking.objects.filter(pk=instance.pk).only(*TRACKED_FIELDS).first()
+
+
+@receiver(post_save, sender=VenueBooking)
+def update_occupancy_on_save(sender, instance, raw=False, **kwargs):
+    if raw: # loaddata 时不维护，之后运行 rebuild_venue_occupancy
+        return
+    refresh_occupancy(instance.venue_id, booking_dates(instance))
+    previous = getattr(instance, '_previous_period', None)
+    if previous and any(getattr(previous, field) != getattr(instance, field) for field in TRACKED_FIELDS):
+        refresh_occupancy(previous.venue_id, booking_dates(previous))
+
+
+@receiver(post_delete, sender=VenueBooking)
+def update_occupancy_on_delete(sender, instance, **kwargs):
+    refresh_occupancy(instance.venue_id, booking_dates(instance))
@@ -1,3 +1,280 @@
+# venues/tests.py
 from django.test import TestCase
-
 # Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from django.urls import reverse
+from datetime import date, datetime, timedelta
+from io import StringIO
+from campushive.testing import temp_csv
+from users.models import User
+from .models import Venue, VenueBooking, VenueOccupancy
+from .recurrence import MAX_OCCURRENCES, iter_occurrences, parse_rrule
+from .services import decode_bitmap, find_booking_conflicts, free_venues
+
+
+class ImportVenuesCommandTests(TestCase):
+    """
+    测试 import_venues 管理命令 (按 name 批量 upsert)
+    """
+    CSV_HEADER = 'name,capacity,location,has_projector,has_whiteboard\n'
+
+    def test_import_loads_attributes(self):
+        path = temp_csv(self, self.CSV_HEADER, [
+            'Conference Room 301,50,Main Building 3rd Floor,True,True\n',
+            'Lecture Hall A,200,Science Building 1st Floor,True,False\n',
+        ])
+        call_command('import_venues', path, stdout=StringIO())
+
+        hall = Venue.objects.get(name='Lecture Hall A')
+        self.assertEqual(hall.capacity, 200)
+        self.assertEqual(hall.location, 'Science Building 1st Floor')
+        self.assertTrue(hall.has_projector)
+        self.assertFalse(hall.has_whiteboard)
+
+    def test_import_updates_existing_venue_by_name(self):
+        Venue.objects.create(name='Lecture Hall A', capacity=10)
+        path = temp_csv(self, self.CSV_HEADER, ['Lecture Hall A,200,Science Building 1st Floor,True,False\n'])
+        call_command('import_venues', path, '--batch-size', '1', stdout=StringIO())
+
+        self.assertEqual(Venue.objects.count(), 1)
+        self.assertEqual(Venue.objects.get(name='Lecture Hall A').capacity, 200)
+
+    def test_matching_filters_by_attributes(self):
+        Venue.objects.create(name='Hall', capacity=200, has_projector=True)
+        Venue.objects.create(name='Small Room', capacity=10, has_projector=True)
+        Venue.objects.create(name='Gym', capacity=300, has_projector=False)
+
+        names = list(Venue.objects.matching(min_capacity=100, has_projector=True).values_list('name', flat=True))
+        self.assertEqual(names, ['Hall'])
+
+
+class VenueBookingConflictTests(TestCase):
+    """
+    测试场所预订的时间冲突检测
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Venue.objects.create(name='Room 101', capacity=40)
+        cls.hall = Venue.objects.create(name='Hall', capacity=300)
+        cls.day = timezone.make_aware(datetime(2025, 9, 1))
+        cls.existing = VenueBooking.objects.create(
+            venue=cls.room, start_time=cls.day + timedelta(hours=10), end_time=cls.day + timedelta(hours=12),
+            booked_by_name='Exam Office',
+        )
+
+    def _booking(self, venue, start_hour, end_hour):
+        return VenueBooking(
+            venue=venue, start_time=self.day + timedelta(hours=start_hour),
+            end_time=self.day + timedelta(hours=end_hour), booked_by_name='Tester',
+        )
+
+    def test_clean_rejects_overlapping_booking(self):
+        with self.assertRaises(ValidationError):
+            self._booking(self.room, 11, 13).full_clean()
+
+    def test_clean_allows_adjacent_booking_and_other_venue(self):
+        self._booking(self.room, 12, 14).full_clean()
+        self._booking(self.hall, 10, 12).full_clean()
+
+    def test_clean_allows_editing_existing_booking(self):
+        self.existing.end_time = self.day + timedelta(hours=13)
+        self.existing.full_clean()
+
+    def test_find_booking_conflicts_uses_one_query(self):
+        proposed = [
+            self._booking(self.room, 9, 11),   # 与已有预订冲突
+            self._booking(self.room, 12, 13),  # 无冲突
+            self._booking(self.hall, 8, 10),   # 与下一条 (同一批) 冲突
+            self._booking(self.hall, 9, 11),
+        ]
+        with self.assertNumQueries(1):
+            conflicts = find_booking_conflicts(proposed)
+
+        hour = lambda value: timezone.localtime(value).hour
+        pairs = {(hour(c.booking.start_time), hour(c.conflicts_with.start_time), c.booking.venue_id) for c in conflicts}
+        self.assertEqual(pairs, {(9, 10, self.room.id), (9, 8, self.hall.id)})
+
+    def test_import_venue_bookings_aborts_on_conflict(self):
+        path = temp_csv(self, 'venue,start_time,end_time,booked_by_name,notes\n', [
+            'Room 101,2025-09-01 11:00,2025-09-01 13:00,Club,\n',
+            'Hall,2025-09-01 11:00,2025-09-01 13:00,Club,\n',
+        ])
+
+        with self.assertRaises(CommandError):
+            call_command('import_venue_bookings', path, stdout=StringIO())
+        self.assertEqual(VenueBooking.objects.count(), 1)
+
+        call_command('import_venue_bookings', path, '--skip-conflicts', stdout=StringIO())
+        self.assertEqual(VenueBooking.objects.filter(venue=self.hall).count(), 1)
+        self.assertEqual(VenueBooking.objects.filter(venue=self.room).count(), 1)
+
+
+class VenueAvailabilityTests(TestCase):
+    """
+    测试忙闲位图的增量维护与空闲场所查询接口
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='desk@example.com', username='desk', password='password', role=User.ROLE_STAFF_MEMBER)
+        cls.room = Venue.objects.create(name='Room 101', capacity=40, has_projector=True)
+        cls.hall = Venue.objects.create(name='Hall', capacity=300, has_projector=True)
+        cls.gym = Venue.objects.create(name='Gym', capacity=500, has_projector=False)
+        cls.day = timezone.make_aware(datetime(2025, 9, 1))
+
+    def _book(self, venue, start_hour, end_hour):
+        return VenueBooking.objects.create(
+            venue=venue, start_time=self.day + timedelta(hours=start_hour),
+            end_time=self.day + timedelta(hours=end_hour), booked_by_name='Tester',
+        )
+
+    def test_bitmap_maintained_on_save_update_and_delete(self):
+        booking = self._book(self.room, 10, 11)
+        row = VenueOccupancy.objects.get(venue=self.room, date=date(2025, 9, 1))
+        self.assertEqual(decode_bitmap(row.bitmap), 0b1111 << 40) # 10:00 = 第 40 格
+
+        booking.venue = self.hall
+        booking.save()
+        self.assertFalse(VenueOccupancy.objects.filter(venue=self.room).exists())
+        self.assertTrue(VenueOccupancy.objects.filter(venue=self.hall).exists())
+
+        booking.delete()
+        self.assertFalse(VenueOccupancy.objects.exists())
+
+    def test_deleting_venue_cascades_cleanly(self):
+        self._book(self.gym, 10, 11)
+        self.gym.delete()
+        self.assertFalse(VenueOccupancy.objects.exists())
+
+    def test_bitmap_for_booking_spanning_midnight(self):
+        self._book(self.room, 23, 25)
+        self.assertEqual(VenueOccupancy.objects.filter(venue=self.room).count(), 2)
+
+    def test_free_venues_query_count_independent_of_venue_count(self):
+        self._book(self.room, 10, 12)
+        for i in range(20):
+            Venue.objects.create(name=f'Extra {i}', capacity=20)
+        with self.assertNumQueries(3): # 位图、循环预订候选、场所
+            names = {v.name for v in free_venues(self.day + timedelta(hours=11), self.day + timedelta(hours=13))}
+        self.assertNotIn('Room 101', names)
+        self.assertIn('Hall', names)
+        self.assertEqual(len(names), 22)
+
+    def test_availability_endpoint_filters_by_attributes(self):
+        self._book(self.hall, 9, 10)
+        self.client.login(username='desk', password='password')
+        response = self.client.get(reverse('venues:venue_availability'), {
+            'start': '2025-09-01T09:30', 'end': '2025-09-01T11:00', 'min_capacity': 30, 'projector': 'true',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([v['name'] for v in response.json()['venues']], ['Room 101'])
+
+    def test_availability_endpoint_rejects_invalid_window(self):
+        self.client.login(username='desk', password='password')
+        response = self.client.get(reverse('venues:venue_availability'), {
+            'start': '2025-09-01T12:00', 'end': '2025-09-01T11:00',
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_rebuild_command_matches_incremental_bitmaps(self):
+        self._book(self.room, 10, 12)
+        self._book(self.gym, 8, 9)
+        expected = set(VenueOccupancy.objects.values_list('venue_id', 'date', 'bitmap'))
+        VenueOccupancy.objects.all().delete()
+        call_command('rebuild_venue_occupancy', stdout=StringIO())
+        self.assertEqual(set(VenueOccupancy.objects.values_list('venue_id', 'date', 'bitmap')), expected)
+
+
+class RecurringBookingTests(TestCase):
+    """
+    测试循环预订 (RRULE) 的惰性展开、冲突检测与忙闲位图
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Venue.objects.create(name='Room 101', capacity=40)
+        cls.hall = Venue.objects.create(name='Hall', capacity=300)
+        cls.wednesday = timezone.make_aware(datetime(2025, 9, 3)) # 学期第一个周三
+        # 每周三 14:00-16:00，共 16 周
+        cls.seminar = VenueBooking.objects.create(
+            venue=cls.room, start_time=cls.wednesday + timedelta(hours=14), end_time=cls.wednesday + timedelta(hours=16),
+            recurrence_rule='FREQ=WEEKLY;BYDAY=WE;COUNT=16', booked_by_name='Seminar',
+        )
+
+    def _booking(self, venue, start, hours, rule=''):
+        return VenueBooking(venue=venue, start_time=start, end_time=start + timedelta(hours=hours),
+                            recurrence_rule=rule, booked_by_name='Tester')
+
+    def test_parse_rrule_rejects_unbounded_and_unknown_rules(self):
+        for text in ('FREQ=WEEKLY;BYDAY=WE', 'FREQ=MONTHLY;COUNT=3', 'FREQ=WEEKLY;BYDAY=XX;COUNT=2',
+                     'FREQ=DAILY;COUNT=2;UNTIL=20251220', 'FREQ=WEEKLY;COUNT=2;BYMONTH=9'):
+            with self.assertRaises(ValueError):
+                parse_rrule(text)
+
+    def test_rules_longer_than_the_limit_are_rejected_not_truncated(self):
+        with self.assertRaises(ValueError):
+            parse_rrule(f'FREQ=DAILY;COUNT={MAX_OCCURRENCES + 1}')
+        parse_rrule(f'FREQ=DAILY;COUNT={MAX_OCCURRENCES}')
+        booking = self._booking(self.hall, self.wednesday + timedelta(hours=9), 1, 'FREQ=DAILY;UNTIL=20301231')
+        with self.assertRaises(ValidationError) as ctx:
+            booking.full_clean()
+        self.assertIn('recurrence_rule', ctx.exception.message_dict)
+
+    def test_iter_occurrences_only_expands_the_window(self):
+        rule = parse_rrule('FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20251220')
+        first = timezone.make_aware(datetime(2025, 9, 3, 14)) # 周三开始，当周的周一不算
+        window_start = timezone.make_aware(datetime(2025, 11, 1))
+        window_end = timezone.make_aware(datetime(2025, 11, 8))
+        starts = [timezone.localtime(start) for start, _ in iter_occurrences(rule, first, first + timedelta(hours=2), window_start, window_end)]
+        self.assertEqual([(s.month, s.day, s.hour) for s in starts], [(11, 3, 14), (11, 5, 14)])
+
+        all_starts = [start for start, _ in iter_occurrences(rule, first, first + timedelta(hours=2))]
+        self.assertEqual(all_starts[0], first)
+        self.assertEqual(timezone.localtime(all_starts[-1]).date(), date(2025, 12, 17))
+
+    def test_series_end_time_is_last_occurrence(self):
+        self.assertEqual(self.seminar.series_end_time, self.wednesday + timedelta(weeks=15, hours=16))
+
+    def test_clean_rejects_booking_clashing_with_later_occurrence(self):
+        clash = self._booking(self.room, self.wednesday + timedelta(weeks=6, hours=15), 2)
+        with self.assertRaises(ValidationError):
+            clash.full_clean()
+        self._booking(self.room, self.wednesday + timedelta(weeks=16, hours=15), 2).full_clean() # 系列结束之后
+        self._booking(self.room, self.wednesday + timedelta(days=1, hours=15), 2).full_clean() # 周四
+
+    def test_clean_rejects_rule_not_matching_start_weekday(self):
+        booking = self._booking(self.hall, self.wednesday + timedelta(hours=9), 1, 'FREQ=WEEKLY;BYDAY=TU;COUNT=4')
+        with self.assertRaises(ValidationError):
+            booking.full_clean()
+
+    def test_recurring_conflicts_reported_once_per_pair(self):
+        proposed = [self._booking(self.room, self.wednesday + timedelta(hours=15), 1, 'FREQ=WEEKLY;COUNT=10')]
+        with self.assertNumQueries(1):
+            conflicts = find_booking_conflicts(proposed)
+        self.assertEqual(len(conflicts), 1)
+        self.assertEqual(conflicts[0].conflicts_with, self.seminar)
+
+    def test_free_venues_expands_recurring_bookings_in_the_window_only(self):
+        self.assertFalse(VenueOccupancy.objects.filter(venue=self.room).exists()) # 循环预订不写逐日位图
+        week_ten = self.wednesday + timedelta(weeks=10)
+        free = set(free_venues(week_ten + timedelta(hours=14), week_ten + timedelta(hours=15)).values_list('name', flat=True))
+        self.assertEqual(free, {'Hall'})
+        free = set(free_venues(week_ten + timedelta(days=1, hours=14), week_ten + timedelta(days=1, hours=15)).values_list('name', flat=True))
+        self.assertEqual(free, {'Hall', 'Room 101'}) # 周四
+
+        self.seminar.recurrence_rule = 'FREQ=WEEKLY;BYDAY=WE;COUNT=4'
+        self.seminar.save()
+        self.assertFalse(VenueOccupancy.objects.filter(venue=self.room).exists())
+        free = set(free_venues(week_ten + timedelta(hours=14), week_ten + timedelta(hours=15)).values_list('name', flat=True))
+        self.assertEqual(free, {'Hall', 'Room 101'})
+
+    def test_turning_a_single_booking_into_a_series_clears_its_bitmap(self):
+        booking = self._booking(self.hall, self.wednesday + timedelta(hours=9), 1)
+        booking.save()
+        self.assertEqual(VenueOccupancy.objects.filter(venue=self.hall).count(), 1)
+        booking.recurrence_rule = 'FREQ=DAILY;COUNT=30'
+        booking.save()
+        self.assertFalse(VenueOccupancy.objects.filter(venue=self.hall).exists())
+        later = self.wednesday + timedelta(days=20, hours=9)
+        self.assertNotIn('Hall', set(free_venues(later, later + timedelta(minutes=30)).values_list('name', flat=True)))
@@ -0,0 +1,9 @@
+# venues/urls.py
+from django.urls import path
+from .views import VenueAvailabilityView
+
+app_name = 'venues'
+
+urlpatterns = [
+    path('availability/', VenueAvailabilityView.as_view(), name='venue_availability'),
+]
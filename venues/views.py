@@ -1,3 +1,29 @@
-from django.shortcuts import render
+# venues/views.py
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import JsonResponse
+from django.views import View
+from .forms import VenueAvailabilityForm
+from .models import Venue
+from .services import free_venues
 
-# Create your views here.
+
+class VenueAvailabilityView(LoginRequiredMixin, View):
+    """返回指定时间段内空闲 (并满足容量/设备条件) 的场所，JSON 格式。"""
+
+    def get(self, request):
+        form = VenueAvailabilityForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+
+        data = form.cleaned_data
+        candidates = Venue.objects.matching(
+            min_capacity=data['min_capacity'],
+            has_projector=data['projector'],
+            has_whiteboard=data['whiteboard'],
+        )
+        venues = free_venues(data['start'], data['end'], candidates).order_by('name')
+        return JsonResponse({
+            'start': data['start'].isoformat(),
+            'end': data['end'].isoformat(),
+            'venues': list(venues.values('id', 'name', 'capacity', 'location', 'has_projector', 'has_whiteboard')),
+        })